@@ -1,14 +1,238 @@
+import os
+import queue
+import asyncio
 import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
 
 DB_NAME = "market.db"
 
-def get_db():
-    conn = sqlite3.connect(DB_NAME, timeout=30.0)
+# --- POOL DE CONNEXIONS ---
+# Connexions ouvertes et configurées une seule fois (PRAGMAs, row_factory), puis réutilisées :
+# on évite l'ouverture du fichier et les PRAGMAs à chaque requête, et le cache de requêtes
+# préparées de sqlite3 reste chaud d'un appel à l'autre.
+
+# Connexions conservées au repos (au-delà, les connexions de débordement sont fermées au retour)
+POOL_SIZE = 16
+# Requêtes préparées gardées en cache par connexion
+STATEMENT_CACHE_SIZE = 256
+
+def _connect():
+    # check_same_thread=False : une connexion sert successivement plusieurs threads (jamais en même temps)
+    conn = sqlite3.connect(DB_NAME, timeout=30.0, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
     conn.row_factory = sqlite3.Row
     return conn
 
+class ConnectionPool:
+
+    def __init__(self, size: int = POOL_SIZE):
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size) # LIFO : la connexion la plus chaude d'abord
+        self._pid = os.getpid()
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # Processus forké : les connexions du parent ne doivent pas être partagées
+            self._idle = queue.LifoQueue(maxsize=self.size)
+            self._pid = os.getpid()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return _connect()
+
+    def release(self, conn: sqlite3.Connection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+pool = ConnectionPool()
+
+# --- ACTIONS APRÈS COMMIT ---
+# État en mémoire dérivé de la base (registre des tickers d'intérêt...) : appliqué une fois la
+# transaction commitée, jamais pour une transaction (ou un SAVEPOINT du thread écrivain) annulée.
+_after_commit: Dict[int, List[Callable]] = {}
+
+def after_commit(conn: sqlite3.Connection, fn: Callable):
+    _after_commit.setdefault(id(conn), []).append(fn)
+
+def _run_after_commit(hooks: List[Callable]):
+    for fn in hooks:
+        try:
+            fn()
+        except Exception as e:
+            print(f"[DB] Erreur après commit: {e}")
+
+@contextmanager
+def get_db(immediate: bool = False):
+    """
+    Connexion du pool pour la durée du bloc `with` : commit en sortie normale, rollback sur
+    exception, puis retour au pool. Une connexion dans un état inattendu est fermée.
+    immediate=True : BEGIN IMMEDIATE, le verrou d'écriture est pris dès l'entrée (lecture puis
+    écriture sans qu'un autre écrivain, d'un autre processus compris, s'intercale).
+    """
+    conn = pool.acquire()
+    try:
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.commit()
+    except BaseException:
+        _after_commit.pop(id(conn), None)
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            raise
+        pool.release(conn)
+        raise
+    else:
+        hooks = _after_commit.pop(id(conn), ()) # Avant le retour au pool (la connexion peut repartir aussitôt)
+        pool.release(conn)
+        _run_after_commit(hooks)
+
+# --- FAÇADE ASYNCHRONE ---
+# La boucle asyncio (worker, WebSockets) ne doit jamais attendre SQLite (verrou WAL jusqu'à 30 s).
+# Lectures : petit pool de threads dédié. Écritures : un unique thread écrivain qui vide sa file
+# par lots (BEGIN IMMEDIATE), chaque tâche dans un SAVEPOINT (un échec n'annule que la sienne), un seul commit par lot.
+# Les fonctions soumises reçoivent la connexion en premier argument et ne committent pas elles-mêmes.
+# Depuis du code async : await db.aread(fn, ...) / await db.awrite(fn, ...)
+# Depuis une route synchrone : db.read(fn, ...).result() / db.write(fn, ...).result()
+# db.write_grouped(fn, item) : les éléments d'un même lot soumis avec la même fonction sont passés
+# ensemble à fn(conn, items) -> [(résultat, erreur)], dans un seul SAVEPOINT (ex: ordres au marché).
+
+READ_WORKERS = 4
+# Tâches d'écriture max par commit
+WRITE_BATCH_MAX = 64
+
+class Database:
+
+    def __init__(self):
+        self._readers = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="db-read")
+        self._writes = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+
+    # --- LECTURES ---
+    def read(self, fn: Callable, *args) -> Future:
+        return self._readers.submit(self._run_read, fn, args)
+
+    @staticmethod
+    def _run_read(fn: Callable, args) -> Any:
+        with get_db() as conn:
+            return fn(conn, *args)
+
+    async def aread(self, fn: Callable, *args) -> Any:
+        return await asyncio.wrap_future(self.read(fn, *args))
+
+    # --- ÉCRITURES ---
+    def write(self, fn: Callable, *args) -> Future:
+        """Résolue une fois le lot contenant la tâche commité (ou avec l'exception de la tâche)."""
+        return self._submit(fn, args, False)
+
+    async def awrite(self, fn: Callable, *args) -> Any:
+        return await asyncio.wrap_future(self.write(fn, *args))
+
+    def write_grouped(self, fn: Callable, item: Any) -> Future:
+        """Comme write, mais fn reçoit en une fois tous les éléments du lot soumis avec elle."""
+        return self._submit(fn, (item,), True)
+
+    def _submit(self, fn: Callable, args, grouped: bool) -> Future:
+        self._ensure_writer()
+        future = Future()
+        self._writes.put((fn, args, future, grouped))
+        return future
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < WRITE_BATCH_MAX and batch[-1] is not None:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            jobs = [job for job in batch if job is not None]
+            if jobs:
+                self._commit_batch(jobs)
+            if stop:
+                return
+
+    @staticmethod
+    def _steps(jobs):
+        """Tâches du lot -> [(exécution, futures)] : les tâches groupées d'une même fonction n'en font qu'une."""
+        steps, groups = [], {}
+        for fn, args, future, grouped in jobs:
+            if not future.set_running_or_notify_cancel():
+                continue
+            if not grouped:
+                steps.append((lambda conn, fn=fn, args=args: [(fn(conn, *args), None)], [future]))
+            elif fn in groups:
+                items, futures = groups[fn]
+                items.append(args[0])
+                futures.append(future)
+            else:
+                items, futures = groups[fn] = ([args[0]], [future])
+                steps.append((lambda conn, fn=fn, items=items: fn(conn, items), futures))
+        return steps
+
+    def _commit_batch(self, jobs):
+        done = []
+        try:
+            with get_db(immediate=True) as conn:
+                for run, futures in self._steps(jobs):
+                    conn.execute("SAVEPOINT job")
+                    hooks = len(_after_commit.get(id(conn), ()))
+                    try:
+                        outcomes = run(conn)
+                        conn.execute("RELEASE job")
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO job")
+                        conn.execute("RELEASE job")
+                        del _after_commit.get(id(conn), [])[hooks:] # Actions de la tâche annulée
+                        outcomes = [(None, e)] * len(futures)
+                    done.extend((future, result, error) for future, (result, error) in zip(futures, outcomes))
+        except Exception as e:
+            # Commit (ou connexion) en échec : tout le lot est annulé
+            for _, _, future, _ in jobs:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        # Résultats publiés après le commit : l'appelant relit des données durables
+        for future, result, error in done:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def close(self, timeout: float = 5.0):
+        """Vide la file d'écriture puis arrête les threads."""
+        if self._writer is not None and self._writer.is_alive():
+            self._writes.put(None)
+            self._writer.join(timeout)
+        self._readers.shutdown(wait=False)
+
+db = Database()
+
 def init_db():
     with get_db() as conn:
         # --- EXISTING WATCHLIST TABLES ---
@@ -56,6 +280,19 @@ def init_db():
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions(type)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp)")
+
+        # Agrégats du portefeuille tenus à jour à chaque écriture (ligne unique id = 1)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS portfolio_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                net_deposits REAL NOT NULL DEFAULT 0.0,
+                realized_pnl REAL NOT NULL DEFAULT 0.0,
+                trade_count INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
 
         # --- SHADOW BACK COMPUTE (SBC) TABLES ---
         # MISE À JOUR DU SCHÉMA : Ajout de 'resolution'
@@ -82,6 +319,59 @@ def init_db():
             pass # La colonne existe déjà
 
         conn.execute("CREATE INDEX IF NOT EXISTS idx_indicators_ticker ON saved_indicators(ticker)")
+
+        # --- ALERTES ---
+        # kind : PRICE_CROSS | PCT_MOVE | INDICATOR_CROSS | BAND_BREAKOUT
+        # level : prix (PRICE_CROSS) ou % (PCT_MOVE, relatif à base_price)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ticker TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                direction TEXT NOT NULL DEFAULT 'BOTH',
+                level REAL,
+                base_price REAL,
+                indicator_id INTEGER,
+                repeat INTEGER NOT NULL DEFAULT 0,
+                active INTEGER NOT NULL DEFAULT 1,
+                note TEXT,
+                triggered_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(indicator_id) REFERENCES saved_indicators(id) ON DELETE CASCADE
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_active_ticker ON alerts(active, ticker)")
+
+        # --- ORDRES EN ATTENTE ---
+        # order_type : LIMIT | STOP | STOP_LIMIT
+        # status : OPEN | TRIGGERED (STOP_LIMIT devenu limite) | FILLED | CANCELLED | REJECTED
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ticker TEXT NOT NULL,
+                action TEXT NOT NULL,
+                order_type TEXT NOT NULL,
+                quantity REAL NOT NULL,
+                limit_price REAL,
+                stop_price REAL,
+                status TEXT NOT NULL DEFAULT 'OPEN',
+                fill_price REAL,
+                reason TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_ticker ON orders(status, ticker)")
+
+        # Clés d'idempotence des ordres au marché : résultat renvoyé tel quel si la clé est rejouée
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS order_requests (
+                idempotency_key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
         
         # --- SEEDS ---
         try:
@@ -96,4 +386,9 @@ def init_db():
                 INSERT INTO transactions (type, total_amount, timestamp) 
                 VALUES ('DEPOSIT', 100000.0, CURRENT_TIMESTAMP)
             """)
+
+        # Première création (ou DB antérieure) : agrégats calculés depuis l'historique existant
+        if not conn.execute("SELECT 1 FROM portfolio_stats WHERE id = 1").fetchone():
+            from .services.portfolio_service import rebuild_stats # Import local : le service dépend de ce module
+            rebuild_stats(conn)
         conn.commit()
\ No newline at end of file
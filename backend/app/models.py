@@ -22,6 +22,18 @@ class SmartFactorRequest(BaseModel):
     target_up_percent: float = 0.5
     lookback_days: int = 365
 
+class SensitivityRequest(BaseModel):
+    ticker: str
+    type: str
+    resolution: str = "1d"
+    period_min: int = Field(5, ge=2)
+    period_max: int = Field(200, ge=2, le=1000)
+    period_step: int = Field(5, gt=0, le=1000)
+    # Bandes uniquement (ignorés pour SMA/EMA). None = grille par défaut du type
+    mult_min: Optional[float] = None
+    mult_max: Optional[float] = None
+    mult_step: Optional[float] = Field(None, ge=0.01)
+
 class PortfolioRequest(BaseModel):
     name: str
 
@@ -71,6 +83,32 @@ class IndicatorBandPoint(BaseModel):
 # Union pour la réponse API : soit une ligne simple, soit des bandes
 IndicatorDataResponse = List[Union[IndicatorPoint, IndicatorBandPoint, Dict[str, Any]]]
 
+# --- ALERTES ---
+
+class AlertRequest(BaseModel):
+    ticker: str
+    kind: Literal['PRICE_CROSS', 'PCT_MOVE', 'INDICATOR_CROSS', 'BAND_BREAKOUT']
+    direction: Literal['UP', 'DOWN', 'BOTH'] = 'BOTH'
+    level: Optional[float] = None        # Prix (PRICE_CROSS) ou % (PCT_MOVE)
+    base_price: Optional[float] = None   # PCT_MOVE : défaut = dernier prix connu
+    indicator_id: Optional[int] = None   # INDICATOR_CROSS / BAND_BREAKOUT
+    repeat: bool = False
+    note: Optional[str] = None
+
+class AlertDTO(BaseModel):
+    id: int
+    ticker: str
+    kind: str
+    direction: str
+    level: Optional[float] = None
+    base_price: Optional[float] = None
+    indicator_id: Optional[int] = None
+    repeat: bool
+    active: bool
+    note: Optional[str] = None
+    triggered_at: Optional[str] = None
+    created_at: Optional[str] = None
+
 # --- EXISTING MODELS (DPMS / TRADING) ---
 
 class OrderRequest(BaseModel):
@@ -78,6 +116,28 @@ class OrderRequest(BaseModel):
     action: Literal['BUY', 'SELL']
     quantity: float = Field(..., gt=0, description="Quantité d'actions") 
 
+class PendingOrderRequest(BaseModel):
+    ticker: str
+    action: Literal['BUY', 'SELL']
+    order_type: Literal['LIMIT', 'STOP', 'STOP_LIMIT']
+    quantity: float = Field(..., gt=0, description="Quantité d'actions")
+    limit_price: Optional[float] = Field(None, gt=0)  # LIMIT / STOP_LIMIT
+    stop_price: Optional[float] = Field(None, gt=0)   # STOP / STOP_LIMIT
+
+class PendingOrderDTO(BaseModel):
+    id: int
+    ticker: str
+    action: str
+    order_type: str
+    quantity: float
+    limit_price: Optional[float] = None
+    stop_price: Optional[float] = None
+    status: str
+    fill_price: Optional[float] = None
+    reason: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
 class CashOperationRequest(BaseModel):
     amount: float = Field(..., gt=0, description="Montant positif uniquement")
     type: Literal['DEPOSIT', 'WITHDRAW']
@@ -106,4 +166,6 @@ class PortfolioSummary(BaseModel):
     total_pnl: float
     pnl_pct: float
     positions_count: int
-    invested_capital: float = 0.0
\ No newline at end of file
+    invested_capital: float = 0.0
+    realized_pnl: float = 0.0
+    trade_count: int = 0
\ No newline at end of file
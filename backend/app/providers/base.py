@@ -21,4 +21,19 @@ class MarketDataProvider(ABC):
     @abstractmethod
     def fetch_live_price(self, ticker: str) -> Dict[str, Any]:
         """Retourne {price, prev_close, is_open, next_event, exchange}"""
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def is_market_open(self, ticker: str, now: Optional[pd.Timestamp] = None) -> bool:
+        """Indique si la place de cotation du ticker est en séance (calendrier d'échange)"""
+        pass
+
+    @abstractmethod
+    def fetch_bulk_1m_bars(self, tickers: list, start: Optional[pd.Timestamp] = None) -> Dict[str, pd.DataFrame]:
+        """Retourne { ticker: barres 1m OHLCV } ; start=None -> fenêtre complète, sinon barres depuis start"""
+        pass
+
+    @abstractmethod
+    def fetch_bulk_1m_status(self, tickers: list) -> Dict[str, Dict[str, Any]]:
+        """Retourne { ticker: {price, change_pct, is_open} } pour plusieurs tickers en une requête"""
+        pass
@@ -5,7 +5,11 @@ from .base import MarketDataProvider
 from datetime import datetime
 
 class YFinanceProvider(MarketDataProvider):
-    
+
+    def __init__(self):
+        # Cache des calendriers pour éviter de recharger "XNYS" 50 fois
+        self._calendar_cache = {}
+
     # --- HELPER: Détection du calendrier selon le suffixe ---
     def _get_cal_name(self, ticker: str) -> str:
         if ticker.endswith(".PA"): return "XPAR"  # Euronext Paris
@@ -16,6 +20,19 @@ class YFinanceProvider(MarketDataProvider):
         if ticker.endswith(".TO"): return "XTSE"  # Toronto
         return "XNYS" # Default US (NYSE/NASDAQ)
 
+    # --- HELPER: Calendriers chargés une seule fois (coûteux à construire) ---
+    def _get_calendar(self, cal_name: str):
+        if cal_name not in self._calendar_cache:
+            self._calendar_cache[cal_name] = ecals.get_calendar(cal_name)
+        return self._calendar_cache[cal_name]
+
+    def is_market_open(self, ticker: str, now: pd.Timestamp = None) -> bool:
+        try:
+            now = now if now is not None else pd.Timestamp.now(tz='UTC')
+            return bool(self._get_calendar(self._get_cal_name(ticker)).is_trading_minute(now))
+        except Exception:
+            return False # Fallback safe
+
     def fetch_history(self, ticker: str, period: str, interval: str) -> pd.DataFrame:
         try:
             stock = yf.Ticker(ticker)
@@ -68,68 +85,59 @@ class YFinanceProvider(MarketDataProvider):
             print(f"[YF Provider] Error live: {e}")
             return {"price": 0, "change_pct": 0, "is_open": False, "next_event": None}
 
-    def fetch_bulk_1m_status(self, tickers: list):
+    def fetch_bulk_1m_bars(self, tickers: list, start: pd.Timestamp = None) -> dict:
         """
-        Récupère les données 1m pour tous les tickers.
-        CORRIGÉ : Vérifie le calendrier par ticker individuel.
+        Récupère les barres 1m brutes de plusieurs tickers en une requête : { ticker: DataFrame }.
+        start=None -> fenêtre complète (2 jours), sinon uniquement les barres depuis start (incrémental).
         """
         if not tickers: return {}
-        
+
         try:
-            # On récupère le timestamp UTC actuel une seule fois
-            now = pd.Timestamp.now(tz='UTC')
+            window = {"period": "2d"} if start is None else {"start": start}
+            data = yf.download(tickers, interval="1m", group_by='ticker', threads=True, progress=False, auto_adjust=True, **window)
 
-            # Téléchargement Bulk
-            data = yf.download(tickers, period="2d", interval="1m", group_by='ticker', threads=True, progress=False, auto_adjust=True)
-            
             if data is None or data.empty:
                 return {}
 
-            results = {}
-            
-            # Cache simple des calendriers pour éviter de recharger "XNYS" 50 fois
-            calendar_cache = {}
-
+            frames = {}
             for t in tickers:
                 try:
-                    df = data[t] if len(tickers) > 1 else data
-                    if df is None or df.empty: continue
-                        
+                    if isinstance(data.columns, pd.MultiIndex):
+                        if t not in data.columns.get_level_values(0): continue
+                        df = data[t]
+                    else:
+                        df = data
                     df = df.dropna(subset=['Close'])
-                    if df.empty: continue
-
-                    last_price = df['Close'].iloc[-1]
-                    prev_close = df['Close'].iloc[-2] if len(df) > 1 else last_price
-                    
-                    if pd.isna(last_price): continue
-
-                    # --- CORRECTION ICI ---
-                    # 1. Identifier le bon calendrier
-                    cal_name = self._get_cal_name(t)
-                    
-                    # 2. Vérifier l'ouverture
-                    ticker_is_open = False
-                    try:
-                        if cal_name not in calendar_cache:
-                            calendar_cache[cal_name] = ecals.get_calendar(cal_name)
-                        
-                        ticker_is_open = calendar_cache[cal_name].is_trading_minute(now)
-                    except:
-                        ticker_is_open = False # Fallback safe
-
-                    results[t] = {
-                        "price": round(float(last_price), 2),
-                        "change_pct": round(float(((last_price - prev_close) / prev_close) * 100), 2),
-                        "is_open": ticker_is_open
-                    }
-                except KeyError:
-                    continue
+                    if not df.empty:
+                        frames[t] = df
                 except Exception as e:
                     print(f"[YF Bulk] Error processing {t}: {e}")
                     continue
-                    
-            return results
-            
+
+            return frames
+
         except Exception as e:
             print(f"[YF Bulk] Critical Error: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+    def fetch_bulk_1m_status(self, tickers: list):
+        """
+        Récupère les données 1m pour tous les tickers.
+        CORRIGÉ : Vérifie le calendrier par ticker individuel.
+        """
+        # On récupère le timestamp UTC actuel une seule fois
+        now = pd.Timestamp.now(tz='UTC')
+        results = {}
+
+        for t, df in self.fetch_bulk_1m_bars(tickers).items():
+            last_price = df['Close'].iloc[-1]
+            prev_close = df['Close'].iloc[-2] if len(df) > 1 else last_price
+
+            results[t] = {
+                "price": round(float(last_price), 2),
+                "change_pct": round(float(((last_price - prev_close) / prev_close) * 100), 2),
+                # Vérification de l'ouverture via le calendrier propre au ticker
+                "is_open": self.is_market_open(t, now)
+            }
+
+        return results
@@ -0,0 +1,397 @@
+import asyncio
+import fcntl
+import json
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from .websockets import manager, GLOBAL_TOPIC
+from .streams import indicator_streams
+from .services.ticks import tick_store
+from .services.interest import interest_registry
+from .services.alerts import alert_engine
+from .services.order_book import order_book
+
+# --- PUB/SUB INTER-PROCESSUS ---
+# Un seul processus (le "leader", élu) fait tourner le worker de polling et publie les événements.
+# Chaque processus uvicorn reçoit ces événements et ne fait le fan-out que pour ses propres sockets.
+# En retour, chaque processus remonte son intérêt (tickers affichés + nb de spectateurs) au leader,
+# ainsi que les mises à jour du registre des tickers d'intérêt faites par ses routes (favoris, ordres...)
+# et les invalidations des caches du worker (règles d'alerte, carnet d'ordres).
+#
+# DTRADE_BUS=local (défaut) : un seul processus, livraison directe (comportement historique)
+# DTRADE_BUS=unix           : élection par flock + broker sur socket Unix (plusieurs workers, une machine)
+# DTRADE_BUS=redis          : élection + pub/sub Redis (paquet optionnel 'redis', plusieurs machines)
+
+BUS_BACKEND = os.environ.get("DTRADE_BUS", "local")
+BUS_SOCKET_PATH = os.environ.get("DTRADE_BUS_SOCKET", "market.bus.sock")
+LEADER_LOCK_PATH = os.environ.get("DTRADE_LEADER_LOCK", "market.leader.lock")
+REDIS_URL = os.environ.get("DTRADE_REDIS_URL", "redis://localhost:6379/0")
+
+# Les canaux du bus sont les topics WebSocket (quote:{ticker}, candle:{ticker}:{res}, global)
+GLOBAL_CHANNEL = GLOBAL_TOPIC
+
+# Caches du worker invalidés par les routes qui modifient leurs tables (bus.invalidate) : chez un
+# follower, l'invalidation est remontée au leader avec le rapport d'intérêt suivant
+INVALIDATE_ALERTS = "alerts"
+INVALIDATE_ORDERS = "orders"
+DIRTY_CACHES = {INVALIDATE_ALERTS: alert_engine, INVALIDATE_ORDERS: order_book}
+
+# Remontée d'intérêt des followers (s) et durée de validité d'un rapport
+INTEREST_INTERVAL = 1.0
+INTEREST_TTL = 5.0
+# Délai entre deux tentatives d'élection / de reconnexion au leader
+ELECTION_INTERVAL = 2.0
+# Un follower dont le buffer d'écriture dépasse ce seuil perd les frames (il ne doit pas bloquer le leader)
+MAX_PEER_BUFFER = 4 * 1024 * 1024
+# Taille max d'une frame (un PRICE_BATCH de plusieurs centaines de tickers dépasse la limite asyncio de 64 Ko)
+MAX_FRAME_SIZE = 4 * 1024 * 1024
+
+def log(msg):
+    print(f"\033[96m[{datetime.now().strftime('%H:%M:%S')}] [BUS]\033[0m {msg}")
+
+async def deliver_local(channel: str, message: dict):
+    """Fan-out vers les sockets de CE processus."""
+    await manager.publish(channel, message)
+    if message.get("type") == "PRICE_UPDATE":
+        tick_store.append(message["ticker"], message["timestamp"], message.get("price"))
+    elif message.get("type") == "CANDLE_CLOSE":
+        # Les indicateurs streamés sont recalculés par chaque processus pour ses propres abonnés
+        indicator_streams.on_candle_close(message)
+
+def local_subscribers() -> Dict[str, int]:
+    return manager.ticker_subscribers()
+
+class QuoteBus:
+    """
+    Bus mono-processus (DTRADE_BUS=local) et socle commun des transports.
+    on_leader : coroutine du worker, lancée quand ce processus devient le poller élu.
+    Les tâches de fond du bus sont référencées ici (la boucle asyncio ne garde qu'une référence faible).
+    """
+
+    def __init__(self):
+        self.is_leader = False
+        self._on_leader: Optional[Callable] = None
+        self._leader_task: Optional[asyncio.Task] = None
+        self._tasks = set()
+        self._remote: Dict[str, Tuple[float, Dict[str, int]]] = {}
+        # Tickers à fetcher hors cycle (premier spectateur dans un processus) + réveil du worker
+        self._bumps = set()
+        self._wakeup = asyncio.Event()
+        # Follower : invalidations à remonter au leader
+        self._invalidations = set()
+
+    async def start(self, on_leader: Callable):
+        self._on_leader = on_leader
+        self._become_leader()
+
+    def _become_leader(self):
+        self.is_leader = True
+        interest_registry.stop_forwarding() # Le worker de ce processus recharge le registre depuis la DB
+        log(f"Processus {os.getpid()} élu poller ({BUS_BACKEND}).")
+        self._leader_task = self._spawn(self._lead(self._leader_task))
+
+    async def _lead(self, previous: Optional[asyncio.Task]):
+        # Réélection : le worker précédent doit avoir fini son annulation (et remis son état à zéro)
+        # avant qu'un nouveau ne démarre, jamais deux workers en parallèle
+        if previous:
+            await asyncio.gather(previous, return_exceptions=True)
+        await self._on_leader()
+
+    def _step_down(self):
+        self.is_leader = False
+        interest_registry.start_forwarding()
+        log(f"Processus {os.getpid()} n'est plus poller.")
+        if self._leader_task:
+            self._leader_task.cancel() # Le worker annule ses shards et vide le scheduler
+        self._bumps.clear()
+
+    # --- TÂCHES DE FOND ---
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            log(f"Tâche du bus arrêtée sur erreur: {task.exception()!r}")
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def publish(self, channel: str, message: dict):
+        await deliver_local(channel, message)
+
+    def _receive_interest(self, source: str, subscribers: Dict[str, int], bumps=(), registry=(), invalidate=()):
+        self._remote[source] = (time.time(), subscribers)
+        for ticker in bumps:
+            self._bump(ticker)
+        for kind, counts, replace in registry:
+            interest_registry.apply(kind, counts, replace)
+        for name in invalidate:
+            DIRTY_CACHES[name].dirty = True
+
+    # --- INVALIDATION DES CACHES DU WORKER ---
+    def invalidate(self, name: str):
+        """Table des alertes / ordres modifiée : le worker (leader) recharge au prochain tick."""
+        if self.is_leader:
+            DIRTY_CACHES[name].dirty = True
+        else:
+            self._invalidations.add(name)
+
+    def take_invalidations(self):
+        names, self._invalidations = self._invalidations, set()
+        return list(names)
+
+    # --- FETCH HORS CYCLE ---
+    def request_fetch(self, ticker: str):
+        """Un ticker vient d'être affiché dans ce processus : le poller doit le fetcher sans attendre son tour."""
+        if self.is_leader:
+            self._bump(ticker)
+        else:
+            self._send_bump(ticker)
+
+    def _bump(self, ticker: str):
+        self._bumps.add(ticker)
+        self._wakeup.set()
+
+    def _send_bump(self, ticker: str):
+        pass # Pas de leader joignable (démarrage) : le ticker sera pris au prochain rapport d'intérêt
+
+    def take_bumps(self):
+        bumps, self._bumps = self._bumps, set()
+        return bumps
+
+    async def wait(self, timeout: float):
+        """Sommeil du worker, interrompu dès qu'un fetch hors cycle est demandé."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def subscribers(self) -> Dict[str, int]:
+        """Spectateurs par ticker, tous processus confondus (vu du leader)."""
+        counts = local_subscribers()
+        now = time.time()
+        for source, (received_at, remote) in list(self._remote.items()):
+            if now - received_at > INTEREST_TTL:
+                del self._remote[source]
+                continue
+            for t, n in remote.items():
+                counts[t] = counts.get(t, 0) + n
+        return counts
+
+class UnixSocketBus(QuoteBus):
+    """Élection par verrou fichier (flock) : le détenteur sert un broker sur socket Unix, les autres s'y abonnent."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock_fd = None
+        self._peers = set()
+        self._upstream: Optional[asyncio.StreamWriter] = None
+        self._source = f"pid:{os.getpid()}"
+
+    async def start(self, on_leader: Callable):
+        self._on_leader = on_leader
+        self._lock_fd = os.open(LEADER_LOCK_PATH, os.O_CREAT | os.O_RDWR)
+        self._spawn(self._run())
+
+    def _try_lock(self) -> bool:
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    async def _run(self):
+        while True:
+            if self._try_lock():
+                await self._serve()
+                return # Le verrou est conservé jusqu'à la mort du processus
+            try:
+                await self._follow()
+            except OSError:
+                pass # Leader pas encore prêt ou en cours de remplacement
+            await asyncio.sleep(ELECTION_INTERVAL)
+
+    # --- LEADER ---
+    async def _serve(self):
+        if os.path.exists(BUS_SOCKET_PATH):
+            os.unlink(BUS_SOCKET_PATH) # Socket orpheline d'un ancien leader
+        await asyncio.start_unix_server(self._handle_peer, path=BUS_SOCKET_PATH, limit=MAX_FRAME_SIZE)
+        self._become_leader()
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        source = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                if msg.get("type") == "interest":
+                    source = msg["source"]
+                    self._receive_interest(
+                        source, msg["subscribers"], msg.get("bump", ()), msg.get("registry", ()), msg.get("invalidate", ())
+                    )
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            if source: self._remote.pop(source, None)
+            writer.close()
+
+    async def publish(self, channel: str, message: dict):
+        await deliver_local(channel, message)
+        if not self._peers:
+            return
+        # Sérialisation unique pour tous les processus followers
+        frame = (json.dumps({"c": channel, "m": message}, separators=(",", ":")) + "\n").encode()
+        for writer in list(self._peers):
+            if writer.transport.get_write_buffer_size() > MAX_PEER_BUFFER:
+                continue
+            writer.write(frame)
+
+    # --- FOLLOWER ---
+    async def _follow(self):
+        reader, writer = await asyncio.open_unix_connection(BUS_SOCKET_PATH, limit=MAX_FRAME_SIZE)
+        log(f"Processus {os.getpid()} abonné au poller.")
+        self._upstream = writer
+        interest_registry.start_forwarding()
+        reporter = self._spawn(self._report_interest(writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break # Le leader est tombé -> nouvelle élection
+                frame = json.loads(line)
+                await deliver_local(frame["c"], frame["m"])
+        finally:
+            self._upstream = None
+            reporter.cancel()
+            writer.close()
+
+    async def _send_upstream(self, writer: asyncio.StreamWriter, msg: dict):
+        writer.write((json.dumps(msg) + "\n").encode())
+        await writer.drain()
+
+    def _send_bump(self, ticker: str):
+        # Rapport d'intérêt immédiat (le leader doit connaître le ticker) accompagné de la demande de fetch
+        if self._upstream is None:
+            return
+        self._upstream.write((json.dumps({
+            "type": "interest", "source": self._source, "subscribers": local_subscribers(), "bump": [ticker]
+        }) + "\n").encode())
+
+    async def _report_interest(self, writer: asyncio.StreamWriter):
+        while True:
+            await self._send_upstream(writer, {
+                "type": "interest", "source": self._source, "subscribers": local_subscribers(),
+                "registry": interest_registry.take_outbox(), "invalidate": self.take_invalidations()
+            })
+            await asyncio.sleep(INTEREST_INTERVAL)
+
+class RedisBus(QuoteBus):
+    """Élection par clé Redis (SET NX + TTL renouvelé) et diffusion par PUBLISH/SUBSCRIBE."""
+
+    EVENTS_CHANNEL = "dtrade:events"
+    INTEREST_CHANNEL = "dtrade:interest"
+    LEADER_KEY = "dtrade:leader"
+    LEADER_TTL = 10
+
+    def __init__(self):
+        super().__init__()
+        self._redis = None
+        self._source = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def start(self, on_leader: Callable):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("DTRADE_BUS=redis nécessite le paquet 'redis'")
+
+        self._on_leader = on_leader
+        self._redis = aioredis.from_url(REDIS_URL)
+        interest_registry.start_forwarding() # Follower jusqu'à l'élection
+        self._spawn(self._listen())
+        self._spawn(self._elect())
+        self._spawn(self._report_interest())
+
+    async def _elect(self):
+        while True:
+            try:
+                if self.is_leader:
+                    if await self._redis.get(self.LEADER_KEY) == self._source.encode():
+                        await self._redis.expire(self.LEADER_KEY, self.LEADER_TTL)
+                    else:
+                        self._step_down()
+                elif await self._redis.set(self.LEADER_KEY, self._source, nx=True, ex=self.LEADER_TTL):
+                    self._become_leader()
+            except Exception as e:
+                log(f"Erreur élection Redis: {e}")
+            await asyncio.sleep(self.LEADER_TTL / 3)
+
+    async def _listen(self):
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.EVENTS_CHANNEL, self.INTEREST_CHANNEL)
+        async for raw in pubsub.listen():
+            if raw.get("type") != "message":
+                continue
+            try:
+                msg = json.loads(raw["data"])
+                if msg.get("src") == self._source:
+                    continue # Déjà livré localement par publish()
+                if raw["channel"] in (self.INTEREST_CHANNEL, self.INTEREST_CHANNEL.encode()):
+                    if self.is_leader:
+                        self._receive_interest(
+                            msg["src"], msg["subscribers"], msg.get("bump", ()), msg.get("registry", ()), msg.get("invalidate", ())
+                        )
+                else:
+                    await deliver_local(msg["c"], msg["m"])
+            except Exception as e:
+                log(f"Message Redis invalide: {e}")
+
+    def _send_bump(self, ticker: str):
+        self._spawn(self._redis.publish(self.INTEREST_CHANNEL, json.dumps({
+            "src": self._source, "subscribers": local_subscribers(), "bump": [ticker]
+        })))
+
+    async def _report_interest(self):
+        while True:
+            if not self.is_leader:
+                try:
+                    await self._redis.publish(self.INTEREST_CHANNEL, json.dumps({
+                        "src": self._source, "subscribers": local_subscribers(),
+                        "registry": interest_registry.take_outbox(), "invalidate": self.take_invalidations()
+                    }))
+                except Exception as e:
+                    log(f"Erreur remontée d'intérêt: {e}")
+            await asyncio.sleep(INTEREST_INTERVAL)
+
+    async def publish(self, channel: str, message: dict):
+        await deliver_local(channel, message)
+        try:
+            await self._redis.publish(self.EVENTS_CHANNEL, json.dumps(
+                {"src": self._source, "c": channel, "m": message}, separators=(",", ":")
+            ))
+        except Exception as e:
+            log(f"Erreur publication Redis: {e}")
+
+def create_bus() -> QuoteBus:
+    if BUS_BACKEND == "unix":
+        return UnixSocketBus()
+    if BUS_BACKEND == "redis":
+        return RedisBus()
+    return QuoteBus()
+
+bus = create_bus()
+manager.on_new_ticker = bus.request_fetch
@@ -0,0 +1,86 @@
+from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+
+from ..database import get_db, db
+from ..models import AlertRequest, AlertDTO
+from ..services import market_data
+from ..websockets import manager, quote_topic
+from ..pubsub import bus, INVALIDATE_ALERTS
+
+router = APIRouter(prefix="/api/alerts", tags=["alerts"])
+
+def _to_dto(row) -> dict:
+    alert = dict(row)
+    alert["repeat"] = bool(alert["repeat"])
+    alert["active"] = bool(alert["active"])
+    return alert
+
+@router.get("/", response_model=List[AlertDTO])
+def list_alerts(ticker: Optional[str] = None, active: Optional[bool] = None):
+    query, args = "SELECT * FROM alerts WHERE 1=1", []
+    if ticker:
+        query += " AND ticker = ?"
+        args.append(ticker)
+    if active is not None:
+        query += " AND active = ?"
+        args.append(int(active))
+    with get_db() as conn:
+        rows = conn.execute(query + " ORDER BY id DESC", args).fetchall()
+    return [_to_dto(r) for r in rows]
+
+@router.post("/", response_model=AlertDTO)
+def create_alert(req: AlertRequest):
+    base_price = req.base_price
+
+    if req.kind in ("PRICE_CROSS", "PCT_MOVE") and req.level is None:
+        raise HTTPException(400, f"'level' requis pour {req.kind}")
+    if req.kind == "PCT_MOVE":
+        if req.level <= 0:
+            raise HTTPException(400, "'level' doit être un pourcentage positif")
+        if base_price is None:
+            # Dernier prix diffusé dans ce processus, sinon prix live
+            last = manager.last_values.get(quote_topic(req.ticker))
+            base_price = last["price"] if last else market_data.provider.fetch_live_price(req.ticker).get("price")
+        if not base_price:
+            raise HTTPException(400, "Prix de référence indisponible")
+
+    def insert(conn):
+        if req.kind in ("INDICATOR_CROSS", "BAND_BREAKOUT"):
+            if req.indicator_id is None:
+                raise HTTPException(400, f"'indicator_id' requis pour {req.kind}")
+            ind = conn.execute("SELECT ticker FROM saved_indicators WHERE id = ?", (req.indicator_id,)).fetchone()
+            if not ind:
+                raise HTTPException(404, "Indicator not found")
+            if ind["ticker"] != req.ticker:
+                raise HTTPException(400, "L'indicateur appartient à un autre ticker")
+
+        cursor = conn.execute("""
+            INSERT INTO alerts (ticker, kind, direction, level, base_price, indicator_id, repeat, note)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (req.ticker, req.kind, req.direction, req.level, base_price, req.indicator_id, int(req.repeat), req.note))
+        return conn.execute("SELECT * FROM alerts WHERE id = ?", (cursor.lastrowid,)).fetchone()
+
+    # Table aussi écrite par le worker : écriture via le thread écrivain
+    row = db.write(insert).result()
+    bus.invalidate(INVALIDATE_ALERTS)
+    return _to_dto(row)
+
+@router.post("/{alert_id}/rearm", response_model=AlertDTO)
+def rearm_alert(alert_id: int):
+    def rearm(conn):
+        conn.execute("UPDATE alerts SET active = 1, triggered_at = NULL WHERE id = ?", (alert_id,))
+        return conn.execute("SELECT * FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+
+    row = db.write(rearm).result()
+    if not row:
+        raise HTTPException(404, "Alert not found")
+
+    bus.invalidate(INVALIDATE_ALERTS)
+    return _to_dto(row)
+
+@router.delete("/{alert_id}")
+def delete_alert(alert_id: int):
+    db.write(lambda conn: conn.execute("DELETE FROM alerts WHERE id = ?", (alert_id,))).result()
+
+    bus.invalidate(INVALIDATE_ALERTS)
+    return {"status": "deleted"}
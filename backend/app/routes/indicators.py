@@ -4,12 +4,13 @@ import json
 import pandas as pd
 import numpy as np
 
-from ..database import get_db
+from ..database import get_db, db
+from ..pubsub import bus, INVALIDATE_ALERTS
 from ..models import (
     IndicatorSaveRequest, IndicatorDTO, 
-    SmartPeriodRequest, SmartBandRequest, SmartFactorRequest
+    SmartPeriodRequest, SmartBandRequest, SmartFactorRequest, SensitivityRequest
 )
-from ..services import market_data, optimizer
+from ..services import market_data, optimizer, sensitivity
 from ..services.indicators import compute_indicator
 
 router = APIRouter(prefix="/api/indicators", tags=["indicators"])
@@ -54,7 +55,7 @@ def save_indicator(req: IndicatorSaveRequest):
             elif req.period == '1mo': final_resolution = '1h'
             else: final_resolution = '1d'
 
-    with get_db() as conn:
+    def insert(conn):
         cursor = conn.execute("""
             INSERT INTO saved_indicators (ticker, type, name, params, style, granularity, resolution, period)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -63,9 +64,9 @@ def save_indicator(req: IndicatorSaveRequest):
         
         # Récupération immédiate du timestamp de création
         created_row = conn.execute("SELECT created_at FROM saved_indicators WHERE id = ?", (new_id,)).fetchone()
-        created_at = created_row['created_at'] if created_row else None
-        
-        conn.commit()
+        return new_id, created_row['created_at'] if created_row else None
+
+    new_id, created_at = db.write(insert).result()
 
     return {
         "id": new_id,
@@ -82,9 +83,12 @@ def save_indicator(req: IndicatorSaveRequest):
 
 @router.delete("/{ind_id}")
 def delete_indicator(ind_id: int):
-    with get_db() as conn:
+    def delete(conn):
         conn.execute("DELETE FROM saved_indicators WHERE id = ?", (ind_id,))
-        conn.commit()
+        conn.execute("DELETE FROM alerts WHERE indicator_id = ?", (ind_id,)) # Alertes orphelines
+
+    db.write(delete).result()
+    bus.invalidate(INVALIDATE_ALERTS) # Règles retirées du moteur au prochain cycle du worker
     return {"status": "deleted"}
 
 @router.get("/{ticker}/calculate/{ind_id}")
@@ -162,4 +166,31 @@ def smart_envelope(req: SmartBandRequest):
 
 @router.post("/smart/supertrend")
 def smart_supertrend(req: SmartFactorRequest):
-    return optimizer.optimize_supertrend(req.ticker, req.target_up_percent, req.lookback_days)
\ No newline at end of file
+    return optimizer.optimize_supertrend(req.ticker, req.target_up_percent, req.lookback_days)
+
+# --- SENSITIVITY MAP ---
+
+@router.post("/sensitivity")
+def sensitivity_map(req: SensitivityRequest):
+    """
+    Heatmap de sensibilité : métriques résumées (couverture, croisements, distance moyenne)
+    pour toute une grille de paramètres, calculées en une passe par les kernels batchés.
+    """
+    if req.type not in sensitivity.SUPPORTED_TYPES:
+        raise HTTPException(400, f"Sensitivity not supported for {req.type}")
+
+    try:
+        periods = sensitivity.build_grid(req.period_min, req.period_max, req.period_step, sensitivity.MAX_PERIODS)
+        multipliers = sensitivity.build_optional_grid(req.mult_min, req.mult_max, req.mult_step, sensitivity.MAX_MULTIPLIERS, "mult")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    period_fetch, interval_fetch = market_data.resolve_fetch_params_from_resolution(req.resolution)
+    df = market_data.provider.fetch_history(req.ticker, period_fetch, interval_fetch)
+    if df is None or df.empty:
+        raise HTTPException(404, "Data unavailable")
+
+    result = sensitivity.compute_sensitivity(req.type, df, periods, multipliers)
+    result["ticker"] = req.ticker
+    result["resolution"] = req.resolution
+    return result
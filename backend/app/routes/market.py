@@ -1,5 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from ..services import market_data
+from ..services.ticks import tick_store
+from .. import worker
+
+# Garde-fous de la route sparklines
+MAX_SPARKLINE_TICKERS = 500
+MAX_SPARKLINE_POINTS = 500
 
 router = APIRouter(tags=["market"])
 
@@ -28,4 +34,26 @@ def get_company_info_route(ticker: str):
     
     if not data:
         raise HTTPException(404, detail="Info introuvable")
-    return data
\ No newline at end of file
+    return data
+
+@router.get("/api/sparklines")
+def get_sparklines(
+    tickers: str = Query(..., description="Liste séparée par des virgules"),
+    points: int = Query(60, ge=2, le=MAX_SPARKLINE_POINTS),
+    window: int = Query(6 * 3600, gt=0, description="Fenêtre couverte (s)")
+):
+    """
+    Mini-graphiques de toute la Sidebar en un appel : lus dans les ring buffers en mémoire,
+    aucun fetch. Un ticker encore inconnu du processus est absent de la réponse.
+    """
+    symbols = list(dict.fromkeys(t.strip() for t in tickers.split(",") if t.strip()))
+    if len(symbols) > MAX_SPARKLINE_TICKERS:
+        raise HTTPException(400, f"Maximum {MAX_SPARKLINE_TICKERS} tickers")
+    return tick_store.sparklines(symbols, points, window)
+
+# --- DIAGNOSTIC WORKER ---
+
+@router.get("/api/system/worker")
+def get_worker_stats():
+    """Timings par shard du worker (aide au réglage de SHARD_SIZE)."""
+    return worker.get_shard_stats()
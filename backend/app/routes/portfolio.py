@@ -1,7 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from ..services import portfolio_service, market_data
-from ..models import OrderRequest, CashOperationRequest
-from ..database import get_db
+import csv
+import io
+import json
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+from ..services import portfolio_service, market_data, valuation, interest
+from ..services.order_pipeline import order_pipeline
+from ..services.equity import equity_engine, to_points
+from ..models import OrderRequest, CashOperationRequest, PendingOrderRequest, PendingOrderDTO
+from ..database import get_db, db
+from ..pubsub import bus, INVALIDATE_ORDERS
 
 router = APIRouter(prefix="/api/portfolio", tags=["portfolio"])
 
@@ -9,86 +17,67 @@ router = APIRouter(prefix="/api/portfolio", tags=["portfolio"])
 def get_portfolio_summary():
     """
     Dashboard principal : Cash, Equity Totale, P&L Global.
-    Calcul dynamique basé sur l'historique des transactions.
+    Positions valorisées en une passe sur les cotations en cache (services/valuation).
     """
-    # 1. Récupérer le cash et le Capital Investi (Net Deposits)
-    with get_db() as conn:
-        account = conn.execute("SELECT * FROM accounts LIMIT 1").fetchone()
-        cash = account['balance'] if account else 0.0
-
-        # Calculer le total investi (Dépôts - Retraits)
-        # On utilise COALESCE ou "or 0.0" pour gérer le cas où c'est vide (None)
-        dep = conn.execute("SELECT SUM(total_amount) FROM transactions WHERE type='DEPOSIT'").fetchone()[0] or 0.0
-        wit = conn.execute("SELECT SUM(total_amount) FROM transactions WHERE type='WITHDRAW'").fetchone()[0] or 0.0
-        invested_capital = dep - wit
-
-    # 2. Récupérer les positions
-    positions = portfolio_service.get_positions()
-
-    # 3. Calculer l'Equity (Valeur Latente)
-    equity_positions = 0.0
-    for pos in positions:
-        live = market_data.provider.fetch_live_price(pos['ticker'])
-        current_price = live.get('price', 0.0)
-        equity_positions += pos['quantity'] * current_price
-
-    total_equity = cash + equity_positions
-    
-    # 4. Calcul du P&L Réel (Equity actuelle - Capital réellement investi)
-    # Si aucun capital investi (cas après un nuke total sans dépôt), on évite la division par zéro
-    if invested_capital <= 0:
-        total_pnl = 0.0
-        pnl_pct = 0.0
-    else:
-        total_pnl = total_equity - invested_capital
-        pnl_pct = total_pnl / invested_capital
-
-    return {
-        "cash_balance": round(cash, 2),
-        "equity_value": round(total_equity, 2),
-        "total_pnl": round(total_pnl, 2),
-        "pnl_pct": round(pnl_pct, 4),
-        "positions_count": len(positions),
-        "invested_capital": invested_capital # On renvoie cette info au front pour le calcul temps réel
-    }
+    summary = valuation.get_valuation()
+    summary.pop("positions")
+    return summary
 
 @router.get("/positions")
 def get_open_positions():
     """
     Liste détaillée des actifs détenus avec calcul P&L temps réel.
     """
-    positions = portfolio_service.get_positions()
-    results = []
-
-    for pos in positions:
-        live = market_data.provider.fetch_live_price(pos['ticker'])
-        current_price = live.get('price', 0.0)
-        market_val = pos['quantity'] * current_price
-        
-        # P&L Latent = (Prix Actuel - Prix Moyen) * Qté
-        pnl_unrealized = (current_price - pos['avg_price']) * pos['quantity']
-        pnl_pct = (pnl_unrealized / (pos['avg_price'] * pos['quantity'])) if pos['avg_price'] > 0 else 0
-
-        results.append({
-            "ticker": pos['ticker'],
-            "quantity": pos['quantity'],
-            "avg_price": pos['avg_price'],
-            "current_price": current_price,
-            "market_value": round(market_val, 2),
-            "pnl_unrealized": round(pnl_unrealized, 2),
-            "pnl_pct": round(pnl_pct, 4)
-        })
-    
-    return results
+    return valuation.get_valuation()["positions"]
+
+# Taille max d'une page d'historique
+MAX_HISTORY_PAGE = 500
 
 @router.get("/history")
-def get_transactions_history():
-    return portfolio_service.get_history()
+def get_transactions_history(
+    limit: int = Query(50, ge=1, le=MAX_HISTORY_PAGE),
+    before_ts: Optional[str] = None,
+    before_id: Optional[int] = None
+):
+    """
+    Page d'historique (plus récent d'abord). Page suivante : before_ts / before_id = timestamp / id
+    de la dernière ligne reçue ; une page plus courte que `limit` est la dernière.
+    """
+    if (before_id is None) != (before_ts is None):
+        raise HTTPException(400, "'before_ts' et 'before_id' vont ensemble (curseur de la dernière ligne reçue)")
+    return portfolio_service.get_history(limit, before_ts, before_id)
+
+def _export_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(portfolio_service.HISTORY_COLUMNS)
+    for rows in portfolio_service.iter_history():
+        writer.writerows(tuple(r) for r in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def _export_ndjson():
+    for rows in portfolio_service.iter_history():
+        yield "".join(json.dumps(dict(r)) + "\n" for r in rows)
+
+@router.get("/history/export")
+def export_transactions_history(format: Literal["csv", "ndjson"] = "csv"):
+    """Export complet de l'historique en flux (mémoire constante, quelle que soit la taille de la table)."""
+    if format == "csv":
+        return StreamingResponse(_export_csv(), media_type="text/csv", headers={
+            "Content-Disposition": "attachment; filename=transactions.csv"
+        })
+    return StreamingResponse(_export_ndjson(), media_type="application/x-ndjson", headers={
+        "Content-Disposition": "attachment; filename=transactions.ndjson"
+    })
 
 @router.post("/order")
-def place_order(order: OrderRequest):
+def place_order(order: OrderRequest, idempotency_key: Optional[str] = Header(None, max_length=128)):
     """
     Passe un ordre. Le backend vérifie le prix LIVE avant d'exécuter.
+    En-tête Idempotency-Key (optionnel) : un renvoi de la même requête n'exécute pas l'ordre deux fois.
     """
     # 1. Récupération du prix autoritaire
     live = market_data.provider.fetch_live_price(order.ticker)
@@ -97,8 +86,81 @@ def place_order(order: OrderRequest):
     if price <= 0:
         raise HTTPException(400, "Marché fermé ou donnée indisponible")
 
-    # 2. Exécution via le service (Transactionnel)
-    return portfolio_service.execute_order(order, price)
+    # 2. Exécution via le pipeline (validation + commit par lot, verrou d'écriture pris d'entrée)
+    return order_pipeline.execute(order, price, idempotency_key)
+
+@router.get("/equity")
+def get_equity_curve(resolution: Literal["1d", "1h"] = "1d", start: Optional[str] = None):
+    """
+    Courbe historique du portefeuille (cash, valeur de marché, equity, dépôts nets, P&L).
+    1d : depuis la première transaction (ou `start`, AAAA-MM-JJ), prolongée incrémentalement.
+    1h : période récente uniquement.
+    """
+    try:
+        curve = equity_engine.daily(start) if resolution == "1d" else equity_engine.intraday()
+    except ValueError:
+        raise HTTPException(400, "Date de début invalide (AAAA-MM-JJ)")
+    return {"resolution": resolution, "points": to_points(curve)}
+
+# --- ORDRES EN ATTENTE (exécutés par le worker au fil des cotations) ---
+
+@router.get("/orders", response_model=List[PendingOrderDTO])
+def list_pending_orders(status: Optional[str] = None, ticker: Optional[str] = None):
+    query, args = "SELECT * FROM orders WHERE 1=1", []
+    if status:
+        query += " AND status = ?"
+        args.append(status)
+    if ticker:
+        query += " AND ticker = ?"
+        args.append(ticker)
+    with get_db() as conn:
+        rows = conn.execute(query + " ORDER BY id DESC", args).fetchall()
+    return [dict(r) for r in rows]
+
+@router.post("/orders", response_model=PendingOrderDTO)
+def place_pending_order(req: PendingOrderRequest):
+    if req.order_type in ("LIMIT", "STOP_LIMIT") and req.limit_price is None:
+        raise HTTPException(400, f"'limit_price' requis pour {req.order_type}")
+    if req.order_type in ("STOP", "STOP_LIMIT") and req.stop_price is None:
+        raise HTTPException(400, f"'stop_price' requis pour {req.order_type}")
+
+    def insert(conn):
+        cursor = conn.execute("""
+            INSERT INTO orders (ticker, action, order_type, quantity, limit_price, stop_price)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            req.ticker, req.action, req.order_type, req.quantity,
+            req.limit_price if req.order_type != "STOP" else None,
+            req.stop_price if req.order_type != "LIMIT" else None
+        ))
+        interest.track(conn, interest.ORDER, [req.ticker])
+        return conn.execute("SELECT * FROM orders WHERE id = ?", (cursor.lastrowid,)).fetchone()
+
+    # Table aussi écrite par le worker (exécutions) : écriture via le thread écrivain
+    row = db.write(insert).result()
+    bus.invalidate(INVALIDATE_ORDERS)
+    return dict(row)
+
+@router.delete("/orders/{order_id}", response_model=PendingOrderDTO)
+def cancel_pending_order(order_id: int):
+    def cancel(conn):
+        cursor = conn.execute("""
+            UPDATE orders SET status = 'CANCELLED', updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('OPEN', 'TRIGGERED')
+        """, (order_id,))
+        row = conn.execute("SELECT * FROM orders WHERE id = ?", (order_id,)).fetchone()
+        if cursor.rowcount:
+            interest.track(conn, interest.ORDER, [row["ticker"]])
+        return cursor.rowcount, row
+
+    cancelled, row = db.write(cancel).result()
+    if not row:
+        raise HTTPException(404, "Order not found")
+    if cancelled == 0:
+        raise HTTPException(409, f"Ordre déjà {row['status']}")
+
+    bus.invalidate(INVALIDATE_ORDERS)
+    return dict(row)
 
 @router.post("/cash")
 def manage_cash_flow(req: CashOperationRequest):
@@ -106,4 +168,6 @@ def manage_cash_flow(req: CashOperationRequest):
 
 @router.post("/nuke")
 def nuke_data():
-    return portfolio_service.nuke_portfolio()
\ No newline at end of file
+    result = portfolio_service.nuke_portfolio()
+    bus.invalidate(INVALIDATE_ORDERS)
+    return result
\ No newline at end of file
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException
-from ..database import get_db
+from ..database import get_db, db
 from ..models import PortfolioRequest, PortfolioItemRequest
-from ..services.market_data import provider
+from ..services.quotes import cached_quotes
+from ..services import interest
 import sqlite3
 
 # Changement de prefix et de tag pour éviter le conflit avec le vrai Portfolio
@@ -13,62 +14,64 @@ def get_sidebar():
     Récupère la structure de la sidebar (Dossiers de favoris).
     Note: On continue d'utiliser la table 'portfolios' pour le stockage existant,
     mais sémantiquement, ce sont des watchlists.
+    Variations lues dans les cotations déjà diffusées par le worker : seuls les tickers
+    jamais cotés font l'objet d'un fetch.
     """
     with get_db() as conn:
         # On utilise toujours la table 'portfolios' (Legacy naming) pour les dossiers
         folders = conn.execute("SELECT * FROM portfolios").fetchall()
         all_items_rows = conn.execute("SELECT portfolio_id, ticker FROM portfolio_items").fetchall()
 
-    unique_tickers = list(set([row['ticker'] for row in all_items_rows]))
-    bulk_data = provider.fetch_bulk_1m_status(unique_tickers)
+    # Regroupement par dossier en une seule passe
+    items_by_folder = {}
+    for row in all_items_rows:
+        items_by_folder.setdefault(row['portfolio_id'], []).append(row['ticker'])
 
-    result = []
-    for f in folders:
-        p_items = [row for row in all_items_rows if row['portfolio_id'] == f['id']]
-        tickers_data = []
-        for item in p_items:
-            ticker = item['ticker']
-            data = bulk_data.get(ticker, {})
-            tickers_data.append({
-                "ticker": ticker, 
-                "change_pct": data.get('change_pct', 0)
-            })
-        
-        result.append({
-            "id": f['id'], 
-            "name": f['name'], 
-            "items": tickers_data
-        })
-    return result
+    quotes = cached_quotes(list({row['ticker'] for row in all_items_rows}))
+
+    return [{
+        "id": f['id'],
+        "name": f['name'],
+        "items": [
+            {"ticker": ticker, "change_pct": quotes.get(ticker, {}).get('change_pct', 0)}
+            for ticker in items_by_folder.get(f['id'], ())
+        ]
+    } for f in folders]
 
 @router.post("/")
 def create_watchlist(p: PortfolioRequest):
     try:
-        with get_db() as conn:
-            cursor = conn.execute("INSERT INTO portfolios (name) VALUES (?)", (p.name,))
-            new_id = cursor.lastrowid
-            conn.commit()
+        new_id = db.write(lambda conn: conn.execute("INSERT INTO portfolios (name) VALUES (?)", (p.name,)).lastrowid).result()
         return {"id": new_id, "name": p.name, "items": []}
     except sqlite3.IntegrityError:
         raise HTTPException(400, "Name exists")
 
 @router.delete("/{pid}")
 def delete_watchlist(pid: int):
-    with get_db() as conn:
+    def delete(conn):
+        tickers = [r["ticker"] for r in conn.execute("SELECT ticker FROM portfolio_items WHERE portfolio_id = ?", (pid,))]
+        # Les items du dossier partent avec lui (pas de PRAGMA foreign_keys : la cascade n'est pas appliquée)
+        conn.execute("DELETE FROM portfolio_items WHERE portfolio_id = ?", (pid,))
         conn.execute("DELETE FROM portfolios WHERE id = ?", (pid,))
-        conn.commit()
+        interest.track(conn, interest.WATCHLIST, tickers)
+
+    db.write(delete).result()
     return {"status": "deleted"}
 
 @router.post("/{pid}/items")
 def add_ticker_to_watchlist(pid: int, item: PortfolioItemRequest):
-    with get_db() as conn:
+    def add(conn):
         conn.execute("INSERT OR IGNORE INTO portfolio_items (portfolio_id, ticker) VALUES (?, ?)", (pid, item.ticker))
-        conn.commit()
+        interest.track(conn, interest.WATCHLIST, [item.ticker])
+
+    db.write(add).result()
     return {"status": "added"}
 
 @router.delete("/{pid}/items/{ticker}")
 def remove_ticker_from_watchlist(pid: int, ticker: str):
-    with get_db() as conn:
+    def remove(conn):
         conn.execute("DELETE FROM portfolio_items WHERE portfolio_id = ? AND ticker = ?", (pid, ticker))
-        conn.commit()
+        interest.track(conn, interest.WATCHLIST, [ticker])
+
+    db.write(remove).result()
     return {"status": "removed"}
\ No newline at end of file
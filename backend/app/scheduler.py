@@ -0,0 +1,112 @@
+import heapq
+import itertools
+import math
+from typing import Dict, List, Optional
+
+# --- PRIORITÉS (plus petit = plus important) ---
+PRIORITY_CHART = 0      # Graphique ouvert (au moins un client WebSocket)
+PRIORITY_WATCHLIST = 1  # Favoris (Sidebar)
+PRIORITY_POSITION = 2   # Simple ligne du portefeuille (calcul Equity)
+
+# Cadence de polling (secondes) selon la priorité et l'état de la séance
+OPEN_CADENCE = {PRIORITY_CHART: 5, PRIORITY_WATCHLIST: 15, PRIORITY_POSITION: 30}
+CLOSED_CADENCE = {PRIORITY_CHART: 60, PRIORITY_WATCHLIST: 300, PRIORITY_POSITION: 600}
+
+# Plancher absolu (aligné sur l'ancien UPDATE_INTERVAL) et bonus max lié au nombre de spectateurs
+MIN_CADENCE = 5
+MAX_SUBSCRIBER_BOOST = 4
+
+def compute_cadence(priority: int, subscribers: int, is_open: bool) -> float:
+    base = (OPEN_CADENCE if is_open else CLOSED_CADENCE)[priority]
+    if subscribers > 1:
+        # Plus un ticker a de spectateurs, plus on le rafraîchit souvent
+        base = base / min(subscribers, MAX_SUBSCRIBER_BOOST)
+    return max(MIN_CADENCE, base)
+
+class PollScheduler:
+    """
+    File de priorité temporelle (heap de (échéance, seq, ticker)) : chaque ticker a sa propre cadence.
+    Invalidation paresseuse : une entrée n'est valide que si son échéance correspond à self._due[ticker].
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Planning vide (nouveau worker après une réélection : plus aucun fetch n'est en cours)."""
+        self._heap = []
+        self._seq = itertools.count()
+        self._due: Dict[str, float] = {}
+        self._last_fetch: Dict[str, float] = {}
+        self._is_open: Dict[str, bool] = {}
+        self._inflight = set()
+        self.priority: Dict[str, int] = {}
+        self.subscribers: Dict[str, int] = {}
+
+    def _schedule(self, ticker: str, due: float):
+        self._due[ticker] = due
+        heapq.heappush(self._heap, (due, next(self._seq), ticker))
+
+    def cadence(self, ticker: str) -> float:
+        return compute_cadence(
+            self.priority.get(ticker, PRIORITY_POSITION),
+            self.subscribers.get(ticker, 0),
+            self._is_open.get(ticker, True)
+        )
+
+    def sync(self, interest: Dict[str, int], subscribers: Dict[str, int], now: float):
+        """Aligne le planning sur les tickers d'intérêt courants {ticker: priorité}."""
+        self.subscribers = subscribers
+
+        for ticker in list(self.priority):
+            if ticker not in interest:
+                self._due.pop(ticker, None)
+                self.priority.pop(ticker, None)
+                self._last_fetch.pop(ticker, None)
+                self._is_open.pop(ticker, None)
+
+        for ticker, priority in interest.items():
+            self.priority[ticker] = priority
+            if ticker in self._inflight:
+                continue # Fetch en cours, sera replanifié à son retour
+            if ticker not in self._due:
+                self._schedule(ticker, now) # Nouveau ticker : fetch immédiat
+                continue
+            # Promotion (ex: watchlist -> graphique ouvert) : on avance l'échéance si besoin
+            last = self._last_fetch.get(ticker)
+            if last is not None:
+                due = last + self.cadence(ticker)
+                if due < self._due[ticker]:
+                    self._schedule(ticker, due)
+
+    def bump(self, ticker: str, now: float):
+        """Force un fetch prioritaire hors cycle."""
+        if ticker in self._due and self._due[ticker] > now:
+            self._schedule(ticker, now)
+
+    def pop_due(self, now: float) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, _, ticker = heapq.heappop(self._heap)
+            if self._due.get(ticker) != when:
+                continue # Entrée périmée
+            del self._due[ticker]
+            self._inflight.add(ticker)
+            due.append(ticker)
+        return due
+
+    def reschedule(self, ticker: str, now: float, is_open: Optional[bool] = None):
+        self._inflight.discard(ticker)
+        if ticker not in self.priority:
+            return # Plus d'intérêt entre-temps
+        if is_open is not None:
+            self._is_open[ticker] = is_open
+        self._last_fetch[ticker] = now
+        self._schedule(ticker, now + self.cadence(ticker))
+
+    def next_due(self) -> float:
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else math.inf
+
+scheduler = PollScheduler()
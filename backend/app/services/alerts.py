@@ -0,0 +1,269 @@
+import json
+import time
+import numpy as np
+from typing import Dict, List, Optional
+
+from ..database import get_db
+from . import market_data
+from .indicators import compute_indicator
+
+# --- MOTEUR D'ALERTES ---
+# Chaque règle active est réduite à un ou deux seuils de prix :
+#   PRICE_CROSS     -> level
+#   PCT_MOVE        -> base_price * (1 ± level/100)
+#   INDICATOR_CROSS -> dernière valeur de l'indicateur sauvegardé (basis pour une bande)
+#   BAND_BREAKOUT   -> bande haute (franchie à la hausse) et bande basse (franchie à la baisse)
+# Par ticker, les seuils sont triés : np.searchsorted donne la frontière (nb de seuils <= prix) et
+# les seuils franchis depuis la dernière évaluation sont exactement la tranche entre l'ancienne et
+# la nouvelle frontière. Une évaluation coûte O(log n) par ticker, quel que soit le nombre de règles.
+
+KINDS = ("PRICE_CROSS", "PCT_MOVE", "INDICATOR_CROSS", "BAND_BREAKOUT")
+DIRECTIONS = ("UP", "DOWN", "BOTH")
+_DIRECTION_CODES = {"UP": 1, "DOWN": -1, "BOTH": 0}
+
+# Rafraîchissement des valeurs d'indicateurs (s) selon la résolution de l'indicateur
+INDICATOR_REFRESH = {"1m": 60, "5m": 300, "1h": 900, "1d": 3600}
+DEFAULT_INDICATOR_REFRESH = 3600
+
+class TickerRules:
+    """Seuils triés d'un ticker et frontière courante (-1 tant qu'aucun prix n'a été vu)."""
+
+    __slots__ = ("levels", "rule_ids", "directions", "labels", "boundary")
+
+    def __init__(self, entries: List[tuple], price: Optional[float] = None):
+        # entries : (seuil, id règle, code direction, libellé) - le libellé distingue les 2 seuils d'une même règle
+        entries = sorted(entries, key=lambda e: e[0])
+        self.levels = np.array([e[0] for e in entries], dtype=np.float64)
+        self.rule_ids = np.array([e[1] for e in entries], dtype=np.int64)
+        self.directions = np.array([e[2] for e in entries], dtype=np.int8)
+        self.labels = [e[3] for e in entries]
+        self.boundary = self.frontier(price) if price is not None else -1
+
+    def frontier(self, price: float) -> int:
+        return int(np.searchsorted(self.levels, price, side="right"))
+
+    def sides(self, price: float) -> Dict[tuple, bool]:
+        """{(règle, bande): seuil <= prix} pour comparer deux versions de l'index."""
+        above = self.levels <= price
+        return {(int(r), l): bool(a) for r, l, a in zip(self.rule_ids, self.labels, above)}
+
+class AlertEngine:
+
+    def __init__(self):
+        self.rules: Dict[int, dict] = {}
+        self._by_ticker: Dict[str, List[dict]] = {}
+        self.index: Dict[str, TickerRules] = {}
+        self.last_price: Dict[str, float] = {}
+        self.indicator_levels: Dict[int, dict] = {}
+        self._indicator_refreshed: Dict[int, float] = {}
+        self._marker = None
+        # Mis à True par les routes : recharge au prochain cycle sans attendre le marqueur
+        self.dirty = True
+
+    # --- CHARGEMENT (DB) ---
+    def fetch_rules_if_changed(self, conn) -> Optional[List[dict]]:
+        """Lecture des règles actives si la table a changé (via db.aread, hors de la boucle asyncio)."""
+        marker = tuple(conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(SUM(active), 0) FROM alerts"
+        ).fetchone())
+        if marker == self._marker and not self.dirty:
+            return None
+        rows = conn.execute("""
+            SELECT a.*, i.resolution AS indicator_resolution
+            FROM alerts a LEFT JOIN saved_indicators i ON i.id = a.indicator_id
+            WHERE a.active = 1
+        """).fetchall()
+        self._marker, self.dirty = marker, False
+        return [dict(r) for r in rows]
+
+    def apply_rules(self, rows: List[dict]) -> List[dict]:
+        self.rules = {r["id"]: r for r in rows}
+        self._group()
+        referenced = {r["indicator_id"] for r in rows if r["indicator_id"] is not None}
+        for ind_id in list(self.indicator_levels):
+            if ind_id not in referenced:
+                self.indicator_levels.pop(ind_id, None)
+                self._indicator_refreshed.pop(ind_id, None)
+
+        events = []
+        tickers = {r["ticker"] for r in rows} | set(self.index)
+        for ticker in tickers:
+            events.extend(self._rebuild(ticker))
+        return events
+
+    def _group(self):
+        self._by_ticker = {}
+        for rule in self.rules.values():
+            self._by_ticker.setdefault(rule["ticker"], []).append(rule)
+
+    def tickers(self):
+        """Tickers portant au moins une règle active (à surveiller par le worker)."""
+        return self._by_ticker.keys()
+
+    # --- INDEX ---
+    def _entries(self, rule: dict) -> List[tuple]:
+        kind, direction = rule["kind"], rule["direction"] or "BOTH"
+        code = _DIRECTION_CODES.get(direction, 0)
+        rid = rule["id"]
+
+        if kind == "PRICE_CROSS":
+            return [(rule["level"], rid, code, None)]
+        if kind == "PCT_MOVE":
+            base, pct = rule["base_price"], abs(rule["level"]) / 100
+            entries = []
+            if direction in ("UP", "BOTH"):
+                entries.append((base * (1 + pct), rid, 1, "up"))
+            if direction in ("DOWN", "BOTH"):
+                entries.append((base * (1 - pct), rid, -1, "down"))
+            return entries
+
+        levels = self.indicator_levels.get(rule["indicator_id"])
+        if not levels:
+            return [] # Valeur pas encore calculée
+        if kind == "INDICATOR_CROSS":
+            value = levels.get("value", levels.get("basis"))
+            return [(value, rid, code, None)] if value is not None else []
+        if kind == "BAND_BREAKOUT":
+            entries = []
+            if levels.get("upper") is not None and direction in ("UP", "BOTH"):
+                entries.append((levels["upper"], rid, 1, "upper"))
+            if levels.get("lower") is not None and direction in ("DOWN", "BOTH"):
+                entries.append((levels["lower"], rid, -1, "lower"))
+            return entries
+        return []
+
+    def _rebuild(self, ticker: str) -> List[dict]:
+        """
+        Reconstruit l'index d'un ticker (règles ou valeurs d'indicateurs modifiées).
+        Un seuil dynamique qui passe de l'autre côté d'un prix immobile est un franchissement.
+        """
+        entries = [e for r in self._by_ticker.get(ticker, ()) for e in self._entries(r)]
+        old = self.index.pop(ticker, None)
+        if not entries:
+            return []
+
+        price = self.last_price.get(ticker)
+        rules = TickerRules(entries, price)
+        self.index[ticker] = rules
+        if old is None or price is None:
+            return []
+
+        before = old.sides(price)
+        events = []
+        for i, (rid, label) in enumerate(zip(rules.rule_ids, rules.labels)):
+            was_above = before.get((int(rid), label))
+            is_above = bool(rules.levels[i] <= price)
+            if was_above is None or was_above == is_above:
+                continue
+            move = 1 if is_above else -1
+            if rules.directions[i] in (0, move):
+                events.append(self._event(int(rid), label, rules.levels[i], price, move))
+        return self._settle(events)
+
+    # --- ÉVALUATION ---
+    def evaluate(self, prices: Dict[str, float]) -> List[dict]:
+        """Seuils franchis depuis la dernière évaluation de chaque ticker."""
+        events = []
+        for ticker, price in prices.items():
+            if price is None:
+                continue
+            self.last_price[ticker] = price
+            rules = self.index.get(ticker)
+            if rules is None:
+                continue
+
+            frontier = rules.frontier(price)
+            previous, rules.boundary = rules.boundary, frontier
+            if previous < 0 or frontier == previous:
+                continue
+
+            if frontier > previous:
+                crossed, move = slice(previous, frontier), 1
+            else:
+                crossed, move = slice(frontier, previous), -1
+            directions = rules.directions[crossed]
+            for i in np.nonzero((directions == 0) | (directions == move))[0] + crossed.start:
+                events.append(self._event(int(rules.rule_ids[i]), rules.labels[i], rules.levels[i], price, move))
+        return self._settle(events)
+
+    def _event(self, rule_id: int, label, level: float, price: float, move: int) -> dict:
+        rule = self.rules[rule_id]
+        return {
+            "type": "ALERT",
+            "id": rule_id,
+            "ticker": rule["ticker"],
+            "kind": rule["kind"],
+            "direction": "UP" if move > 0 else "DOWN",
+            "band": label if rule["kind"] == "BAND_BREAKOUT" else None,
+            "level": round(float(level), 4),
+            "price": price,
+            "note": rule.get("note"),
+            "timestamp": time.time()
+        }
+
+    def _settle(self, events: List[dict]) -> List[dict]:
+        """Une alerte par règle ; les règles non répétables sont retirées de l'index."""
+        unique, done = [], set()
+        for event in events:
+            if event["id"] in done:
+                continue
+            done.add(event["id"])
+            unique.append(event)
+
+        spent = [rid for rid in done if not self.rules[rid]["repeat"]]
+        tickers = {self.rules[rid]["ticker"] for rid in spent}
+        for rid in spent:
+            del self.rules[rid]
+        if spent:
+            self._group()
+        for ticker in tickers:
+            self._rebuild(ticker)
+        return unique
+
+    def persist_triggered(self, conn, events: List[dict]):
+        """Horodatage des déclenchements, désactivation des règles non répétables (via db.awrite)."""
+        conn.executemany(
+            "UPDATE alerts SET triggered_at = CURRENT_TIMESTAMP, active = repeat WHERE id = ?",
+            [(e["id"],) for e in events]
+        )
+
+    # --- INDICATEURS ---
+    def indicators_due(self, now: float) -> List[int]:
+        """Indicateurs référencés dont la valeur doit être recalculée (marqués aussitôt pour éviter les doublons)."""
+        due = []
+        for rule in self.rules.values():
+            ind_id = rule["indicator_id"]
+            if ind_id is None or ind_id in due:
+                continue
+            refresh = INDICATOR_REFRESH.get(rule["indicator_resolution"], DEFAULT_INDICATOR_REFRESH)
+            if now - self._indicator_refreshed.get(ind_id, 0) >= refresh:
+                self._indicator_refreshed[ind_id] = now
+                due.append(ind_id)
+        return due
+
+    def compute_indicator_level(self, ind_id: int) -> Optional[dict]:
+        """Dernier point de l'indicateur sauvegardé sur sa résolution (bloquant : fetch + calcul)."""
+        with get_db() as conn:
+            row = conn.execute("SELECT * FROM saved_indicators WHERE id = ?", (ind_id,)).fetchone()
+        if not row:
+            return None
+        period, interval = market_data.resolve_fetch_params_from_resolution(row["resolution"])
+        df = market_data.provider.fetch_history(row["ticker"], period, interval)
+        if df is None or df.empty:
+            return None
+        points = compute_indicator(row["type"], df, json.loads(row["params"]))
+        if not points:
+            return None
+        return {k: v for k, v in points[-1].items() if k != "time"}
+
+    def set_indicator_level(self, ind_id: int, levels: Optional[dict]) -> List[dict]:
+        if not levels:
+            return []
+        self.indicator_levels[ind_id] = levels
+        tickers = {r["ticker"] for r in self.rules.values() if r["indicator_id"] == ind_id}
+        events = []
+        for ticker in tickers:
+            events.extend(self._rebuild(ticker))
+        return events
+
+alert_engine = AlertEngine()
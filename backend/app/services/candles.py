@@ -0,0 +1,82 @@
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from .live_bars import live_bars
+
+# --- BOUGIES LIVE ---
+# Bougies OHLCV glissantes par ticker et résolution, reconstruites à partir des barres 1m du buffer live.
+# Les buckets sont ancrés sur l'ouverture de la séance (ex: 9h30 pour le 1h US, comme les bougies Yahoo).
+
+RESOLUTIONS = {"1m": 60, "5m": 300, "1h": 3600}
+# Un trou plus long que ça entre deux barres 1m marque le début d'une nouvelle séance
+SESSION_GAP = pd.Timedelta(minutes=30)
+
+def _session_anchor(bars: pd.DataFrame) -> pd.Timestamp:
+    """Première barre de la séance en cours (après le dernier trou > SESSION_GAP)."""
+    gaps = bars.index[1:] - bars.index[:-1]
+    breaks = (gaps > SESSION_GAP).nonzero()[0]
+    return bars.index[breaks[-1] + 1] if len(breaks) else bars.index[0].floor("1h")
+
+def _bucket_start(last_ts: pd.Timestamp, anchor: pd.Timestamp, seconds: int) -> pd.Timestamp:
+    step = pd.Timedelta(seconds=seconds)
+    return anchor + ((last_ts - anchor) // step) * step
+
+def _aggregate(bars: pd.DataFrame, start: pd.Timestamp, seconds: int) -> Optional[dict]:
+    window = bars[(bars.index >= start) & (bars.index < start + pd.Timedelta(seconds=seconds))]
+    if window.empty:
+        return None
+    volume = window['Volume'].sum() if 'Volume' in window else 0
+    return {
+        "time": int(start.timestamp()),
+        "open": round(float(window['Open'].iloc[0]), 2),
+        "high": round(float(window['High'].max()), 2),
+        "low": round(float(window['Low'].min()), 2),
+        "close": round(float(window['Close'].iloc[-1]), 2),
+        "volume": int(volume) if not pd.isna(volume) else 0
+    }
+
+class CandleAggregator:
+
+    def __init__(self):
+        self._current: Dict[Tuple[str, str], dict] = {}
+
+    def update(self, ticker: str) -> List[dict]:
+        """
+        Recalcule la bougie en cours de chaque résolution.
+        Retourne les messages à diffuser : CANDLE_CLOSE quand un bucket se termine, CANDLE_UPDATE si la bougie a bougé.
+        """
+        bars = live_bars.bars(ticker)
+        if bars is None or bars.empty:
+            return []
+
+        last_ts = bars.index[-1]
+        anchor = _session_anchor(bars)
+        events = []
+        for resolution, seconds in RESOLUTIONS.items():
+            key = (ticker, resolution)
+            start = _bucket_start(last_ts, anchor, seconds)
+            previous = self._current.get(key)
+
+            if previous and previous["time"] < int(start.timestamp()):
+                # Bucket terminé : version finale (la dernière barre 1m a pu être révisée entre-temps)
+                prev_start = pd.Timestamp(previous["time"], unit="s", tz="UTC")
+                final = _aggregate(bars, prev_start, seconds) or previous
+                events.append({"type": "CANDLE_CLOSE", "ticker": ticker, "resolution": resolution, "candle": final})
+
+            candle = _aggregate(bars, start, seconds)
+            if candle and candle != previous:
+                self._current[key] = candle
+                events.append({"type": "CANDLE_UPDATE", "ticker": ticker, "resolution": resolution, "candle": candle})
+        return events
+
+    def update_many(self, tickers) -> List[dict]:
+        events = []
+        for ticker in tickers:
+            events.extend(self.update(ticker))
+        return events
+
+    def retain(self, tickers):
+        for key in list(self._current):
+            if key[0] not in tickers:
+                del self._current[key]
+
+candle_aggregator = CandleAggregator()
@@ -0,0 +1,213 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from ..database import get_db
+from . import market_data
+
+# --- COURBE D'EQUITY HISTORIQUE ---
+# Les transactions sont rejouées en positions cumulées (quantité par ticker, cash, dépôts nets) puis
+# valorisées contre les clôtures historiques, le tout en NumPy : searchsorted donne l'état du
+# portefeuille et la dernière clôture de chaque titre pour toutes les dates d'un coup.
+# La courbe journalière est conservée : un nouveau jour ou une nouvelle transaction ne recalcule
+# que les dates à partir du premier jour touché.
+
+# Délai avant de revérifier les dernières clôtures journalières d'un ticker
+DAILY_REFRESH = 15 * 60
+# Intraday : bougies 1h sur la période récente seulement
+INTRADAY_PERIOD = "1mo"
+INTRADAY_REFRESH = 5 * 60
+# Types de transactions et effet sur le cash
+CASH_SIGN = {"DEPOSIT": 1.0, "WITHDRAW": -1.0, "BUY": -1.0, "SELL": 1.0}
+
+def _history_period(start: pd.Timestamp) -> str:
+    """Plus petite période yfinance couvrant `start`."""
+    days = (pd.Timestamp.now() - start).days
+    for period, span in (("1mo", 28), ("3mo", 88), ("6mo", 180), ("1y", 360), ("2y", 725), ("5y", 1820), ("10y", 3645)):
+        if days <= span:
+            return period
+    return "max"
+
+def _naive(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    return index.tz_convert("UTC").tz_localize(None) if index.tz is not None else index
+
+class BarCache:
+    """Clôtures par (ticker, intervalle), prolongées par petits fetchs plutôt que retéléchargées."""
+
+    def __init__(self):
+        self._closes: Dict[Tuple[str, str], pd.Series] = {}
+        self._fetched: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def daily(self, ticker: str, start: pd.Timestamp) -> Optional[pd.Series]:
+        key = (ticker, "1d")
+        with self._lock:
+            closes, fetched = self._closes.get(key), self._fetched.get(key, 0)
+        if closes is None or closes.index[0] > start + pd.Timedelta(days=7):
+            closes = self._fetch(ticker, _history_period(start), "1d", closes)
+        elif time.time() - fetched > DAILY_REFRESH:
+            closes = self._fetch(ticker, "5d", "1d", closes) # Derniers jours seulement
+        return closes
+
+    def intraday(self, ticker: str) -> Optional[pd.Series]:
+        key = (ticker, "1h")
+        with self._lock:
+            closes, fetched = self._closes.get(key), self._fetched.get(key, 0)
+        if closes is None or time.time() - fetched > INTRADAY_REFRESH:
+            closes = self._fetch(ticker, INTRADAY_PERIOD, "1h", None)
+        return closes
+
+    def _fetch(self, ticker: str, period: str, interval: str, known: Optional[pd.Series]) -> Optional[pd.Series]:
+        df = market_data.provider.fetch_history(ticker, period, interval)
+        key = (ticker, interval)
+        with self._lock:
+            self._fetched[key] = time.time()
+            if df is None or df.empty:
+                return known
+            closes = df["Close"].astype(float)
+            if interval == "1d":
+                # Une clôture par date de séance (index naïf à minuit)
+                closes.index = closes.index.tz_localize(None).normalize() if closes.index.tz is not None else closes.index.normalize()
+            else:
+                closes.index = _naive(closes.index)
+            if known is not None:
+                closes = closes.combine_first(known) # Les valeurs fraîches remplacent les anciennes
+            closes = closes[~closes.index.duplicated(keep="last")].sort_index()
+            self._closes[key] = closes
+            return closes
+
+class EquityEngine:
+
+    def __init__(self):
+        self.bars = BarCache()
+        self._tx: Optional[pd.DataFrame] = None # Transactions triées par date
+        self._loaded_id = 0
+        self._count = 0
+        self._curve: Optional[pd.DataFrame] = None
+        self._lock = threading.Lock()
+
+    # --- TRANSACTIONS ---
+    def _sync_transactions(self) -> Optional[pd.Timestamp]:
+        """Charge les nouvelles transactions ; retourne la date la plus ancienne touchée (None si rien)."""
+        with get_db() as conn:
+            if conn.execute("SELECT COUNT(*) FROM transactions WHERE id <= ?", (self._loaded_id,)).fetchone()[0] != self._count:
+                # Lignes déjà chargées supprimées (reset) : reconstruction complète
+                self._tx, self._curve, self._loaded_id, self._count = None, None, 0, 0
+            rows = conn.execute("""
+                SELECT id, timestamp, type, ticker, quantity, price, total_amount FROM transactions
+                WHERE id > ? ORDER BY id
+            """, (self._loaded_id,)).fetchall()
+        if not rows:
+            return None
+        self._count += len(rows)
+        self._loaded_id = rows[-1]["id"]
+        rows = [r for r in rows if r["type"] in CASH_SIGN] # RESET & co : sans effet sur la valorisation
+        if not rows:
+            return None
+
+        new = pd.DataFrame([tuple(r) for r in rows], columns=["id", "timestamp", "type", "ticker", "quantity", "price", "total_amount"])
+        new["time"] = pd.to_datetime(new["timestamp"], format="ISO8601")
+        sign = new["type"].map(CASH_SIGN)
+        new["cash"] = sign * new["total_amount"].fillna(0.0)
+        new["deposit"] = np.where(new["type"].isin(("DEPOSIT", "WITHDRAW")), new["cash"], 0.0)
+        new["qty"] = np.where(new["type"] == "BUY", new["quantity"], np.where(new["type"] == "SELL", -new["quantity"], 0.0))
+        new = new.drop(columns=["timestamp", "type", "total_amount"])
+
+        self._tx = new if self._tx is None else pd.concat([self._tx, new], ignore_index=True)
+        self._tx = self._tx.sort_values(["time", "id"], kind="stable", ignore_index=True)
+        return new["time"].min().normalize()
+
+    # --- VALORISATION VECTORISÉE ---
+    def _value(self, times: pd.DatetimeIndex, closes: Dict[str, pd.Series], side: str) -> pd.DataFrame:
+        """
+        État et valeur du portefeuille à chaque instant de `times` : transactions et clôtures
+        <= instant si side="right", < instant si side="left". Sans clôture connue, un titre est
+        valorisé à son dernier prix de transaction.
+        """
+        tx = self._tx
+        at = times.values
+        idx = np.searchsorted(tx["time"].values, at, side=side) # Nb de transactions prises en compte
+        cash = np.concatenate(([0.0], np.cumsum(tx["cash"].values)))[idx]
+        deposits = np.concatenate(([0.0], np.cumsum(tx["deposit"].values)))[idx]
+
+        market_value = np.zeros(len(times))
+        trades = tx[tx["ticker"].notna() & (tx["qty"] != 0)]
+        for ticker, group in trades.groupby("ticker", sort=False):
+            k = np.searchsorted(group["time"].values, at, side=side)
+            qty = np.concatenate(([0.0], np.cumsum(group["qty"].values)))[k]
+            last_trade = np.concatenate(([np.nan], group["price"].values))[k]
+            series = closes.get(ticker)
+            if series is not None and len(series):
+                pos = np.searchsorted(series.index.values, at, side=side) - 1
+                price = np.where(pos >= 0, series.values[np.maximum(pos, 0)], np.nan)
+                price = np.where(np.isnan(price), last_trade, price)
+            else:
+                price = last_trade
+            market_value += np.where(qty != 0, qty * np.nan_to_num(price), 0.0)
+
+        equity = cash + market_value
+        return pd.DataFrame({
+            "cash": cash,
+            "market_value": market_value,
+            "equity": equity,
+            "net_deposits": deposits,
+            "pnl": equity - deposits
+        }, index=times)
+
+    def _tickers(self) -> List[str]:
+        return self._tx["ticker"].dropna().unique().tolist()
+
+    # --- COURBES ---
+    def daily(self, start: Optional[str] = None) -> pd.DataFrame:
+        """Courbe journalière (jours ouvrés), prolongée incrémentalement entre deux appels."""
+        with self._lock:
+            touched = self._sync_transactions()
+            if self._tx is None or self._tx.empty:
+                return pd.DataFrame()
+
+            today = pd.Timestamp.now().normalize()
+            first = self._tx["time"].iloc[0].normalize()
+            if self._curve is None or self._curve.empty:
+                from_date = first
+            else:
+                # Le dernier jour calculé (séance éventuellement en cours) est toujours recalculé
+                from_date = self._curve.index[-1]
+                if touched is not None:
+                    from_date = min(from_date, touched)
+            dates = pd.bdate_range(max(from_date, first), today)
+            if len(dates):
+                closes = {t: self.bars.daily(t, dates[0]) for t in self._tickers()}
+                # Fin de journée : tout ce qui précède minuit suivant (transactions et clôture du jour)
+                rows = self._value(dates + pd.Timedelta(days=1), closes, side="left").set_axis(dates)
+                kept = self._curve[self._curve.index < dates[0]] if self._curve is not None else None
+                self._curve = rows if kept is None or kept.empty else pd.concat([kept, rows])
+            curve = self._curve
+
+        if start:
+            curve = curve[curve.index >= pd.Timestamp(start)]
+        return curve
+
+    def intraday(self) -> pd.DataFrame:
+        """Courbe horaire sur la période récente (non conservée : calcul à la demande)."""
+        with self._lock:
+            self._sync_transactions()
+            if self._tx is None or self._tx.empty:
+                return pd.DataFrame()
+            closes = {t: self.bars.intraday(t) for t in self._tickers()}
+            stamps = [s.index for s in closes.values() if s is not None and len(s)]
+            if not stamps:
+                return pd.DataFrame()
+            times = stamps[0].append(stamps[1:]).unique().sort_values() if len(stamps) > 1 else stamps[0]
+            return self._value(times, closes, side="right")
+
+def to_points(curve: pd.DataFrame) -> List[dict]:
+    """Format graphique : une entrée par instant (epoch s), valeurs arrondies au centime."""
+    if curve.empty:
+        return []
+    times = curve.index.as_unit("s").asi8.tolist()
+    values = curve.round(2).to_dict("list")
+    return [{"time": t, **{k: values[k][i] for k in values}} for i, t in enumerate(times)]
+
+equity_engine = EquityEngine()
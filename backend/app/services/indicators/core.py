@@ -49,4 +49,74 @@ def calc_atr(df, period):
     return tr.ewm(alpha=1/period, adjust=False).mean()
 
 def calc_std(series, period):
-    return series.rolling(window=period).std(ddof=0) # ddof=0 pour population std (comme le JS souvent) ou 1 pour sample
\ No newline at end of file
+    return series.rolling(window=period).std(ddof=0) # ddof=0 pour population std (comme le JS souvent) ou 1 pour sample
+
+# --- BATCHED KERNELS (MULTI-PÉRIODES) ---
+# Calculent un indicateur pour tout un vecteur de périodes en une seule passe.
+# Sortie : ndarray de forme (len(periods), len(series)), NaN tant que la fenêtre n'est pas pleine.
+
+def _rolling_sums(values, periods):
+    """Sommes glissantes (P, n) via cumsum. Une fenêtre contenant un NaN renvoie NaN (comme rolling())."""
+    n = len(values)
+    nan_mask = np.isnan(values)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(nan_mask, 0.0, values))))
+    cnan = np.concatenate(([0], np.cumsum(nan_mask)))
+
+    end = np.arange(1, n + 1)
+    start = end[None, :] - periods[:, None]
+    valid = start >= 0
+    start = np.clip(start, 0, None)
+
+    sums = csum[end][None, :] - csum[start]
+    has_nan = (cnan[end][None, :] - cnan[start]) > 0
+    sums[~valid | has_nan] = np.nan
+    return sums
+
+def _ewm_multi(values, alphas):
+    """
+    EMA récursive (adjust=False) pour un vecteur d'alphas, mêmes règles que pandas ewm(ignore_na=False) :
+    un NaN répète la dernière valeur, mais le poids de l'historique continue de décroître pendant le trou.
+    Cas particulier de pandas à alpha = 0.5 (alpha == 1 - alpha) : la nouvelle valeur reçoit le poids
+    complémentaire (1 - poids de l'historique) au lieu d'alpha, ce qui ne change rien hors des trous.
+    """
+    n = len(values)
+    out = np.full((len(alphas), n), np.nan)
+    decay = 1.0 - alphas
+    half = alphas == decay
+    prev, old_wt = None, None
+    for i in range(n):
+        x = values[i]
+        if prev is None:
+            if not np.isnan(x):
+                prev, old_wt = np.full(len(alphas), x), np.ones(len(alphas))
+                out[:, i] = prev
+            continue
+        old_wt = old_wt * decay
+        if not np.isnan(x):
+            new_wt = np.where(half, 1.0 - old_wt, alphas)
+            prev = (old_wt * prev + new_wt * x) / (old_wt + new_wt)
+            old_wt = np.ones(len(alphas))
+        out[:, i] = prev
+    return out
+
+def calc_sma_multi(series, periods):
+    values = np.asarray(series, dtype=float)
+    periods = np.asarray(periods, dtype=np.int64)
+    return _rolling_sums(values, periods) / periods[:, None]
+
+def calc_std_multi(series, periods):
+    values = np.asarray(series, dtype=float)
+    periods = np.asarray(periods, dtype=np.int64)
+    # Centrage préalable : la variance est invariante par translation et la cumsum reste précise
+    centered = values - np.nanmean(values) if len(values) else values
+    mean = _rolling_sums(centered, periods) / periods[:, None]
+    mean_sq = _rolling_sums(centered ** 2, periods) / periods[:, None]
+    return np.sqrt(np.clip(mean_sq - mean ** 2, 0.0, None)) # ddof=0, comme calc_std
+
+def calc_ema_multi(series, periods):
+    periods = np.asarray(periods, dtype=float)
+    return _ewm_multi(np.asarray(series, dtype=float), 2.0 / (periods + 1.0))
+
+def calc_atr_multi(df, periods):
+    periods = np.asarray(periods, dtype=float)
+    return _ewm_multi(calc_tr(df).values.astype(float), 1.0 / periods)
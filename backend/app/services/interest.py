@@ -0,0 +1,126 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from ..database import after_commit
+
+# --- REGISTRE DES TICKERS D'INTÉRÊT ---
+# Compteurs de références par source, en mémoire, tenus à jour par les chemins qui les modifient :
+#   watchlist : lignes portfolio_items (routes /api/watchlists)
+#   position  : 1 par position ouverte (exécution d'ordres, reset)
+#   order     : ordres en attente ouverts (routes /orders, exécutions du carnet, reset)
+# Chaque mutation recompte les tickers touchés dans sa propre transaction ; le registre n'est mis à
+# jour qu'après le commit (valeurs absolues : pas de dérive si deux mises à jour se croisent).
+# Les graphiques ouverts (WebSocket) et les alertes sont déjà suivis en mémoire (bus, alert_engine).
+#
+# Plusieurs processus : les mises à jour d'un follower sont remontées au leader avec son rapport
+# d'intérêt (forward=True), précédées de son état complet au démarrage du renvoi. Le worker recharge
+# tout au démarrage (et périodiquement) puis lit des ensembles prêts, sans requête DB dans sa boucle.
+#
+# Rechargement complet et mises à jour concurrentes : chaque mise à jour partielle reçoit un numéro
+# de séquence. Un rechargement note la séquence avant sa lecture ; à l'application, les tickers mis
+# à jour depuis gardent leur valeur (plus récente que l'instantané lu).
+
+WATCHLIST = "watchlist"
+POSITION = "position"
+ORDER = "order"
+SOURCES = (WATCHLIST, POSITION, ORDER)
+
+# Comptage par source ({filter} : restriction éventuelle aux tickers touchés)
+SOURCE_QUERIES = {
+    WATCHLIST: "SELECT ticker, COUNT(*) FROM portfolio_items WHERE ticker IS NOT NULL {filter} GROUP BY ticker",
+    POSITION: "SELECT ticker, 1 FROM positions WHERE quantity > 0 {filter}",
+    ORDER: "SELECT ticker, COUNT(*) FROM orders WHERE status IN ('OPEN', 'TRIGGERED') {filter} GROUP BY ticker",
+}
+
+class InterestRegistry:
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {source: {} for source in SOURCES}
+        # Séquence de la dernière mise à jour partielle, globale et par ticker
+        self.seq = 0
+        self._updated: Dict[str, Dict[str, int]] = {source: {} for source in SOURCES}
+        self._lock = threading.Lock()
+        # Incrémenté à chaque changement d'un ensemble de tickers (le worker ne relit qu'alors)
+        self.version = 0
+        # Follower : mises à jour à remonter au leader
+        self.forward = False
+        self._outbox: List[list] = []
+
+    def apply(self, source: str, counts: Dict[str, int], replace: bool = False, since: Optional[int] = None):
+        """
+        counts : {ticker: références} (0 = plus d'intérêt) ; replace : état complet de la source.
+        since : séquence notée avant la lecture de l'état complet (voir load()).
+        """
+        with self._lock:
+            current, updated = self._counts[source], self._updated[source]
+            before = set(current)
+            if replace:
+                if since is not None:
+                    newer = {t: current.get(t, 0) for t, seq in updated.items() if seq > since}
+                    counts = {**counts, **newer}
+                    self._updated[source] = {t: seq for t, seq in updated.items() if seq > since}
+                current.clear()
+            else:
+                self.seq += 1
+                for ticker in counts:
+                    updated[ticker] = self.seq
+            for ticker, n in counts.items():
+                if n > 0:
+                    current[ticker] = n
+                else:
+                    current.pop(ticker, None)
+            if set(current) != before:
+                self.version += 1
+            if self.forward:
+                self._outbox.append([source, counts, replace])
+
+    def tickers(self, source: str) -> Set[str]:
+        with self._lock:
+            return set(self._counts[source])
+
+    def take_outbox(self) -> List[list]:
+        with self._lock:
+            outbox, self._outbox = self._outbox, []
+            return outbox
+
+    def start_forwarding(self):
+        """Follower : l'état déjà connu part avec le premier rapport, puis chaque mise à jour."""
+        with self._lock:
+            if self.forward:
+                return
+            self.forward = True
+            self._outbox = [[source, dict(counts), False] for source, counts in self._counts.items() if counts]
+
+    def stop_forwarding(self):
+        """Leader : le worker de ce processus recharge le registre depuis la DB."""
+        with self._lock:
+            self.forward = False
+            self._outbox = []
+
+def count(conn, source: str, tickers: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Références en base pour `tickers` (0 inclus), ou pour toute la source si None."""
+    if tickers is None:
+        return {r[0]: r[1] for r in conn.execute(SOURCE_QUERIES[source].format(filter=""))}
+    tickers = list(set(tickers))
+    if not tickers:
+        return {}
+    rows = conn.execute(
+        SOURCE_QUERIES[source].format(filter=f"AND ticker IN ({', '.join('?' * len(tickers))})"), tickers
+    ).fetchall()
+    counts = dict.fromkeys(tickers, 0)
+    counts.update({r[0]: r[1] for r in rows})
+    return counts
+
+def track(conn, source: str, tickers: Optional[Iterable[str]] = None):
+    """À appeler dans la transaction qui modifie la source : registre mis à jour après son commit."""
+    counts = count(conn, source, tickers)
+    after_commit(conn, lambda: interest_registry.apply(source, counts, replace=tickers is None))
+
+def load(conn):
+    """Chargement complet (démarrage du worker, resynchronisation)."""
+    since = interest_registry.seq # Avant la lecture : toute mise à jour ultérieure prime sur l'instantané
+    for source in SOURCES:
+        counts = count(conn, source)
+        after_commit(conn, lambda source=source, counts=counts: interest_registry.apply(source, counts, replace=True, since=since))
+
+interest_registry = InterestRegistry()
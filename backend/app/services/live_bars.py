@@ -0,0 +1,81 @@
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+# --- BUFFER DES BARRES 1M LIVE ---
+# Le worker ne télécharge plus 2 jours de 1m à chaque cycle : il garde un curseur (dernière barre)
+# par ticker et ne demande que les barres postérieures, ajoutées à ce buffer en mémoire.
+
+# Nombre de barres 1m conservées par ticker (~2 séances US)
+BUFFER_BARS = 800
+# Au-delà de cet écart depuis le curseur (week-end, ticker longtemps ignoré...), on recharge la fenêtre complète
+MAX_GAP = pd.Timedelta(hours=18)
+# Tickers dont les curseurs sont proches partagent une même requête incrémentale
+TAIL_GROUP_SPAN = pd.Timedelta(minutes=15)
+
+class LiveBarBuffer:
+
+    def __init__(self, max_bars: int = BUFFER_BARS):
+        self.max_bars = max_bars
+        self._bars: Dict[str, pd.DataFrame] = {}
+
+    def cursor(self, ticker: str) -> Optional[pd.Timestamp]:
+        df = self._bars.get(ticker)
+        return df.index[-1] if df is not None and not df.empty else None
+
+    def plan(self, tickers: List[str], now: pd.Timestamp) -> List[Tuple[Optional[pd.Timestamp], List[str]]]:
+        """
+        Regroupe les tickers en requêtes : [(start, tickers)].
+        start=None -> fenêtre complète (pas de curseur ou trou trop grand).
+        La dernière barre connue est redemandée : elle était peut-être encore en formation.
+        """
+        full, tails = [], []
+        for t in tickers:
+            cursor = self.cursor(t)
+            if cursor is None or now - cursor > MAX_GAP:
+                full.append(t)
+            else:
+                tails.append((cursor, t))
+
+        requests = [(None, full)] if full else []
+        tails.sort()
+        for cursor, t in tails:
+            if requests and requests[-1][0] is not None and cursor - requests[-1][0] <= TAIL_GROUP_SPAN:
+                requests[-1][1].append(t)
+            else:
+                requests.append((cursor, [t]))
+        return requests
+
+    def ingest(self, ticker: str, df: pd.DataFrame, full: bool = False):
+        """Ajoute les nouvelles barres (les barres déjà connues sont remplacées par leur version récente)."""
+        if df is None or df.empty:
+            return
+        # Index normalisé en UTC (yfinance renvoie l'heure locale de la place)
+        df = df.tz_localize('UTC') if df.index.tz is None else df.tz_convert('UTC')
+        previous = self._bars.get(ticker)
+        if previous is not None and not full:
+            df = pd.concat([previous, df])
+            df = df[~df.index.duplicated(keep='last')].sort_index()
+        self._bars[ticker] = df.iloc[-self.max_bars:]
+
+    def bars(self, ticker: str) -> Optional[pd.DataFrame]:
+        return self._bars.get(ticker)
+
+    def snapshot(self, ticker: str) -> Optional[dict]:
+        """Dernier prix et variation vs la barre précédente (même calcul que fetch_bulk_1m_status)."""
+        df = self._bars.get(ticker)
+        if df is None or df.empty:
+            return None
+        last_price = df['Close'].iloc[-1]
+        prev_close = df['Close'].iloc[-2] if len(df) > 1 else last_price
+        return {
+            "price": round(float(last_price), 2),
+            "change_pct": round(float(((last_price - prev_close) / prev_close) * 100), 2)
+        }
+
+    def retain(self, tickers):
+        """Libère la mémoire des tickers qui ne sont plus suivis."""
+        for t in list(self._bars):
+            if t not in tickers:
+                del self._bars[t]
+
+live_bars = LiveBarBuffer()
@@ -17,7 +17,8 @@ def _format_df_to_list(df):
     """Convertit un DataFrame en liste de dictionnaires optimisée pour le front"""
     if df is None or df.empty: return []
     res = []
-    df = df.reset_index()
+    # Barres sans échange (OHLC NaN) ignorées : round() lèverait une exception
+    df = df.dropna(subset=['Open', 'High', 'Low', 'Close']).reset_index()
     for _, r in df.iterrows():
         d_val = r.get('Date') or r.get('Datetime')
         if pd.isna(d_val): continue
@@ -16,6 +16,14 @@ def calculate_atr(high, low, close, period=14):
     tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
     return tr.ewm(alpha=1/period, adjust=False).mean()
 
+def get_clean_history(ticker, lookback):
+    """Historique journalier couvrant `lookback` jours, lignes sans clôture retirées (None si indisponible)."""
+    df = get_internal_history(ticker, lookback)
+    if df is None or df.empty:
+        return None
+    df = df.dropna(subset=['Close'])
+    return df if not df.empty else None
+
 # --- OPTIMIZERS ---
 
 def optimize_period_ma(ticker, target_up, lookback, calc_func):
@@ -0,0 +1,207 @@
+import heapq
+from datetime import datetime
+from fastapi import HTTPException
+from typing import Dict, List, Optional, Tuple
+
+from ..models import OrderRequest
+from . import interest, portfolio_service
+
+# --- ORDRES EN ATTENTE (LIMIT / STOP / STOP_LIMIT) ---
+# Carnet en mémoire par ticker : un tas par sens et par type, trié pour que le prochain ordre
+# déclenchable soit toujours au sommet. À chaque cotation, on dépile tant que le sommet est
+# exécutable : O(log n) par exécution, O(1) si rien ne se passe, quel que soit le nombre d'ordres.
+#
+#   BUY  LIMIT : prix <= limite  -> tas max sur la limite
+#   SELL LIMIT : prix >= limite  -> tas min sur la limite
+#   BUY  STOP  : prix >= stop    -> tas min sur le stop
+#   SELL STOP  : prix <= stop    -> tas max sur le stop
+# Un STOP_LIMIT déclenché devient un LIMIT (statut TRIGGERED en base).
+
+ORDER_TYPES = ("LIMIT", "STOP", "STOP_LIMIT")
+OPEN_STATUSES = ("OPEN", "TRIGGERED")
+
+def _log(conn, order_id: int, status: str, fill_price: Optional[float] = None, reason: Optional[str] = None) -> bool:
+    """Transition d'état conditionnelle : False si l'ordre n'est plus ouvert (annulé entre-temps)."""
+    cur = conn.execute("""
+        UPDATE orders SET status = ?, fill_price = ?, reason = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status IN ('OPEN', 'TRIGGERED')
+    """, (status, fill_price, reason, order_id))
+    return cur.rowcount == 1
+
+class TickerBook:
+
+    __slots__ = ("buy_limits", "sell_limits", "buy_stops", "sell_stops")
+
+    def __init__(self):
+        self.buy_limits: List[Tuple[float, int]] = []   # (-limite, id)
+        self.sell_limits: List[Tuple[float, int]] = []  # (limite, id)
+        self.buy_stops: List[Tuple[float, int]] = []    # (stop, id)
+        self.sell_stops: List[Tuple[float, int]] = []   # (-stop, id)
+
+    def add_limit(self, order: dict):
+        if order["action"] == "BUY":
+            heapq.heappush(self.buy_limits, (-order["limit_price"], order["id"]))
+        else:
+            heapq.heappush(self.sell_limits, (order["limit_price"], order["id"]))
+
+    def add_stop(self, order: dict):
+        if order["action"] == "BUY":
+            heapq.heappush(self.buy_stops, (order["stop_price"], order["id"]))
+        else:
+            heapq.heappush(self.sell_stops, (-order["stop_price"], order["id"]))
+
+    def __len__(self):
+        return len(self.buy_limits) + len(self.sell_limits) + len(self.buy_stops) + len(self.sell_stops)
+
+class OrderBook:
+
+    def __init__(self):
+        self.orders: Dict[int, dict] = {}
+        self.books: Dict[str, TickerBook] = {}
+        # Ordres sortis du carnet, en cours d'exécution (ignorés par un rechargement concurrent)
+        self._executing = set()
+        self._marker = None
+        self.dirty = True
+
+    # --- CHARGEMENT (DB) ---
+    def fetch_if_changed(self, conn) -> Optional[List[dict]]:
+        """Ordres ouverts si la table a changé (via db.aread)."""
+        marker = tuple(conn.execute("""
+            SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(MAX(updated_at), '') FROM orders
+            WHERE status IN ('OPEN', 'TRIGGERED')
+        """).fetchone())
+        if marker == self._marker and not self.dirty:
+            return None
+        rows = conn.execute("SELECT * FROM orders WHERE status IN ('OPEN', 'TRIGGERED')").fetchall()
+        self._marker, self.dirty = marker, False
+        return [dict(r) for r in rows]
+
+    def apply(self, rows: List[dict]):
+        self.orders = {r["id"]: r for r in rows if r["id"] not in self._executing}
+        self.books = {}
+        for order in self.orders.values():
+            book = self.books.setdefault(order["ticker"], TickerBook())
+            if order["order_type"] == "LIMIT" or order["status"] == "TRIGGERED":
+                book.add_limit(order)
+            else:
+                book.add_stop(order)
+
+    def tickers(self):
+        return self.books.keys()
+
+    # --- MATCHING ---
+    def _pop_ready(self, heap, ready) -> Optional[dict]:
+        """Dépile le sommet s'il est exécutable (les entrées d'ordres disparus sont purgées au passage)."""
+        while heap:
+            key, order_id = heap[0]
+            order = self.orders.get(order_id)
+            if order is None:
+                heapq.heappop(heap) # Annulé ou déjà exécuté
+                continue
+            if not ready(key):
+                return None
+            heapq.heappop(heap)
+            return order
+        return None
+
+    def match(self, prices: Dict[str, float]) -> List[dict]:
+        """
+        Ordres exécutables aux cotations du cycle : [{order, price}] (price None = STOP_LIMIT déclenché
+        mais pas encore exécutable). Les ordres exécutés sortent du carnet ; execute_fills() les persiste.
+        """
+        fills = []
+        for ticker, price in prices.items():
+            book = self.books.get(ticker)
+            if book is None or price is None or price <= 0:
+                continue
+
+            # 1. Stops déclenchés : STOP -> exécution au marché, STOP_LIMIT -> rejoint les limites
+            triggered = []
+            for heap, ready in ((book.buy_stops, lambda k: price >= k), (book.sell_stops, lambda k: price <= -k)):
+                while (order := self._pop_ready(heap, ready)) is not None:
+                    if order["order_type"] == "STOP":
+                        fills.append(self._take(order, price))
+                    else:
+                        order["status"] = "TRIGGERED"
+                        triggered.append(order["id"])
+                        book.add_limit(order)
+
+            # 2. Limites franchies
+            for heap, ready in ((book.buy_limits, lambda k: price <= -k), (book.sell_limits, lambda k: price >= k)):
+                while (order := self._pop_ready(heap, ready)) is not None:
+                    fills.append(self._take(order, price))
+
+            for order_id in triggered:
+                if order_id in self.orders:
+                    fills.append({"order": self.orders[order_id], "price": None})
+            if not len(book):
+                del self.books[ticker]
+        return fills
+
+    def _take(self, order: dict, price: float) -> dict:
+        self.orders.pop(order["id"], None)
+        self._executing.add(order["id"])
+        return {"order": order, "price": price}
+
+    # --- EXÉCUTION (thread écrivain) ---
+    def execute_fills(self, conn, fills: List[dict]) -> List[dict]:
+        """
+        Lot d'exécutions (via db.awrite, commit unique), un SAVEPOINT par ordre : un rejet (fonds
+        insuffisants, position insuffisante) n'annule que son propre ordre. Retourne les événements à diffuser.
+        """
+        events = []
+        for fill in fills:
+            order, price = fill["order"], fill["price"]
+            if price is None:
+                # STOP_LIMIT déclenché mais pas (encore) exécutable : il reste dans le carnet
+                conn.execute("""
+                    UPDATE orders SET status = 'TRIGGERED', updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'OPEN'
+                """, (order["id"],))
+                continue
+
+            conn.execute("SAVEPOINT fill")
+            try:
+                if not _log(conn, order["id"], "FILLED", price):
+                    conn.execute("RELEASE fill")
+                    continue # Annulé entre le matching et l'exécution
+                portfolio_service.execute_order(
+                    OrderRequest(ticker=order["ticker"], action=order["action"], quantity=order["quantity"]),
+                    price, conn=conn
+                )
+                conn.execute("RELEASE fill")
+                events.append(self._event(order, "FILLED", price))
+            except HTTPException as e:
+                conn.execute("ROLLBACK TO fill")
+                conn.execute("RELEASE fill")
+                _log(conn, order["id"], "REJECTED", reason=e.detail)
+                events.append(self._event(order, "REJECTED", price, e.detail))
+        if events:
+            interest.track(conn, interest.ORDER, [event["ticker"] for event in events])
+        return events
+
+    def settle(self, fills: List[dict], committed: bool = True):
+        """
+        Fin du lot : un rechargement peut de nouveau reprendre ces ordres. Lot annulé : les ordres
+        sortis du carnet par match() sont toujours ouverts en base, rechargement forcé au prochain cycle.
+        """
+        for fill in fills:
+            self._executing.discard(fill["order"]["id"])
+        if not committed:
+            self.dirty = True
+
+    def _event(self, order: dict, status: str, price: float, reason: Optional[str] = None) -> dict:
+        return {
+            "type": "ORDER_UPDATE",
+            "id": order["id"],
+            "ticker": order["ticker"],
+            "action": order["action"],
+            "order_type": order["order_type"],
+            "quantity": order["quantity"],
+            "status": status,
+            "price": price,
+            "reason": reason,
+            "timestamp": datetime.now().timestamp()
+        }
+
+order_book = OrderBook()
@@ -0,0 +1,96 @@
+import json
+import threading
+from concurrent.futures import Future
+from fastapi import HTTPException
+from typing import Dict, List, Optional, Tuple
+
+from ..database import db
+from ..models import OrderRequest
+from .portfolio_service import Ledger
+
+# --- PIPELINE D'EXÉCUTION DES ORDRES AU MARCHÉ ---
+# Les ordres passent par le thread écrivain de la DB (db.write_grouped) : ceux d'un même lot sont
+# exécutés ensemble par execute_batch :
+#   1. BEGIN IMMEDIATE : verrou d'écriture pris d'entrée, aucun autre écrivain (autre processus compris)
+#      ne peut s'intercaler entre la lecture du solde et son écriture ;
+#   2. tout le lot est validé contre l'état en mémoire (Ledger) : un rejet n'écrit rien ;
+#   3. écriture groupée et un seul commit (group commit : une synchronisation disque par lot).
+# Sous charge, les ordres arrivés pendant un commit forment naturellement le lot suivant.
+#
+# Idempotence : un ordre passé avec une clé (en-tête Idempotency-Key) déjà exécutée renvoie le résultat
+# enregistré sans être rejoué ; la même clé avec d'autres paramètres est refusée (409). Un ordre rejeté
+# n'a rien modifié : sa clé n'est pas enregistrée et il peut être retenté.
+
+def _fingerprint(order: OrderRequest) -> str:
+    return f"{order.ticker}|{order.action}|{order.quantity}"
+
+def execute_batch(conn, jobs: List[Tuple[OrderRequest, float, Optional[str]]]) -> List[Tuple[Optional[dict], Optional[Exception]]]:
+    """Exécute un lot [(ordre, prix, clé)] dans la transaction de l'appelant : [(résultat, erreur)] dans l'ordre."""
+    keys = list({key for _, _, key in jobs if key})
+    known: Dict[str, Tuple[str, dict]] = {}
+    if keys:
+        rows = conn.execute(
+            f"SELECT idempotency_key, fingerprint, response FROM order_requests WHERE idempotency_key IN ({', '.join('?' * len(keys))})", keys
+        ).fetchall()
+        known = {r["idempotency_key"]: (r["fingerprint"], json.loads(r["response"])) for r in rows}
+
+    ledger = Ledger(conn, [order.ticker for order, _, _ in jobs])
+    outcomes, recorded = [], []
+    for order, price, key in jobs:
+        try:
+            if key in known:
+                fingerprint, response = known[key]
+                if fingerprint != _fingerprint(order):
+                    raise HTTPException(status_code=409, detail="Idempotency-Key already used for a different order")
+                outcomes.append((response, None))
+                continue
+            if price <= 0:
+                raise HTTPException(status_code=400, detail="Invalid market price")
+            response = ledger.fill(order, price)
+            if key:
+                known[key] = (_fingerprint(order), response)
+                recorded.append((key, _fingerprint(order), json.dumps(response)))
+            outcomes.append((response, None))
+        except HTTPException as e:
+            outcomes.append((None, e))
+
+    ledger.flush(conn)
+    if recorded:
+        conn.executemany("INSERT INTO order_requests (idempotency_key, fingerprint, response) VALUES (?, ?, ?)", recorded)
+    return outcomes
+
+class OrderPipeline:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Clés en attente de commit -> (empreinte, future) : un doublon concurrent partage le même résultat
+        self._inflight: Dict[str, Tuple[str, Future]] = {}
+
+    def submit(self, order: OrderRequest, live_price: float, key: Optional[str] = None) -> Future:
+        """Future résolue une fois le lot commité (résultat de l'ordre ou HTTPException)."""
+        fingerprint = _fingerprint(order)
+        with self._lock:
+            if key and key in self._inflight:
+                inflight_fingerprint, future = self._inflight[key]
+                if inflight_fingerprint != fingerprint:
+                    raise HTTPException(status_code=409, detail="Idempotency-Key already used for a different order")
+                return future
+            future = db.write_grouped(execute_batch, (order, live_price, key))
+            if key:
+                self._inflight[key] = (fingerprint, future)
+        if key:
+            # Hors verrou : le callback s'exécute aussitôt si le lot est déjà commité
+            future.add_done_callback(lambda done: self._release(key, done))
+        return future
+
+    def execute(self, order: OrderRequest, live_price: float, key: Optional[str] = None) -> dict:
+        """Depuis une route synchrone : bloque jusqu'au commit du lot."""
+        return self.submit(order, live_price, key).result()
+
+    def _release(self, key: str, future: Future):
+        """Lot commité : la clé est désormais lue en base (order_requests)."""
+        with self._lock:
+            if self._inflight.get(key, (None, None))[1] is future:
+                del self._inflight[key]
+
+order_pipeline = OrderPipeline()
@@ -1,8 +1,9 @@
 import sqlite3
 from datetime import datetime
 from fastapi import HTTPException
-from ..database import get_db
+from ..database import get_db, db
 from ..models import OrderRequest, CashOperationRequest, PortfolioSummary, PositionDTO, TransactionDTO
+from . import interest
 
 def get_account():
     """Récupère le compte principal (Singleton pour cette version)."""
@@ -19,136 +20,265 @@ def get_positions():
         rows = conn.execute("SELECT * FROM positions WHERE quantity > 0").fetchall()
         return [dict(r) for r in rows]
 
-def get_history(limit: int = 50):
-    """Récupère l'historique des transactions."""
+# --- AGRÉGATS MATÉRIALISÉS ---
+# portfolio_stats (ligne unique) est tenue à jour dans la même transaction que chaque opération :
+# le résumé du portefeuille ne rescanne plus `transactions`, quelle que soit sa taille.
+# rebuild_stats() rejoue l'historique pour vérifier / corriger (python manage.py rebuild-stats).
+
+STATS_FIELDS = ("net_deposits", "realized_pnl", "trade_count")
+
+def _bump_stats(conn: sqlite3.Connection, net_deposits: float = 0.0, realized_pnl: float = 0.0, trades: int = 0):
+    conn.execute("""
+        UPDATE portfolio_stats SET net_deposits = net_deposits + ?, realized_pnl = realized_pnl + ?,
+            trade_count = trade_count + ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1
+    """, (net_deposits, realized_pnl, trades))
+
+def get_stats(conn: sqlite3.Connection = None) -> dict:
+    if conn is None:
+        with get_db() as conn:
+            return get_stats(conn)
+    row = conn.execute("SELECT * FROM portfolio_stats WHERE id = 1").fetchone()
+    return {k: row[k] for k in STATS_FIELDS} if row else _empty_stats()
+
+def _empty_stats() -> dict:
+    return {"net_deposits": 0.0, "realized_pnl": 0.0, "trade_count": 0}
+
+def compute_stats(conn: sqlite3.Connection) -> dict:
+    """Agrégats recalculés en rejouant `transactions` (PMP par ticker pour le P&L réalisé)."""
+    stats = _empty_stats()
+    holdings = {} # ticker -> (quantité, prix moyen)
+    rows = conn.execute("SELECT ticker, type, quantity, price, total_amount FROM transactions ORDER BY id")
+    for r in rows:
+        kind = r["type"]
+        if kind == "DEPOSIT":
+            stats["net_deposits"] += r["total_amount"] or 0.0
+        elif kind == "WITHDRAW":
+            stats["net_deposits"] -= r["total_amount"] or 0.0
+        elif kind == "BUY":
+            qty, avg = holdings.get(r["ticker"], (0.0, 0.0))
+            new_qty = qty + r["quantity"]
+            holdings[r["ticker"]] = (new_qty, (qty * avg + r["quantity"] * r["price"]) / new_qty)
+            stats["trade_count"] += 1
+        elif kind == "SELL":
+            qty, avg = holdings.get(r["ticker"], (0.0, 0.0))
+            stats["realized_pnl"] += (r["price"] - avg) * r["quantity"]
+            holdings[r["ticker"]] = (qty - r["quantity"], avg)
+            stats["trade_count"] += 1
+        elif kind == "RESET":
+            stats, holdings = _empty_stats(), {}
+    return stats
+
+def rebuild_stats(conn: sqlite3.Connection, write: bool = True) -> dict:
+    """
+    Compare les agrégats stockés à l'historique rejoué ; les remplace si write=True.
+    À exécuter par le thread écrivain (db.write) : aucun ordre ne se glisse entre le rejeu et l'écriture.
+    """
+    stored, rebuilt = get_stats(conn), compute_stats(conn)
+    drift = {k: round(rebuilt[k] - stored[k], 6) for k in STATS_FIELDS if abs(rebuilt[k] - stored[k]) > 1e-6}
+    if write:
+        conn.execute("""
+            INSERT OR REPLACE INTO portfolio_stats (id, net_deposits, realized_pnl, trade_count, updated_at)
+            VALUES (1, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, tuple(rebuilt[k] for k in STATS_FIELDS))
+    return {"stored": stored, "rebuilt": rebuilt, "drift": drift}
+
+# Colonnes exportées (ordre des colonnes CSV)
+HISTORY_COLUMNS = ("id", "timestamp", "type", "ticker", "quantity", "price", "total_amount")
+# Lignes lues par aller-retour lors d'un export
+EXPORT_CHUNK = 1000
+
+def get_history(limit: int = 50, before_ts: str = None, before_id: int = None):
+    """
+    Historique des transactions, plus récent d'abord, paginé par curseur (keyset) :
+    la page suivante reprend après (timestamp, id) de la dernière ligne reçue (les deux, ou aucun).
+    Parcours de l'index idx_transactions_timestamp (qui inclut le rowid) : coût constant quelle que soit la page.
+    """
     with get_db() as conn:
-        rows = conn.execute("SELECT * FROM transactions ORDER BY timestamp DESC LIMIT ?", (limit,)).fetchall()
+        if before_ts is None:
+            rows = conn.execute(
+                "SELECT * FROM transactions ORDER BY timestamp DESC, id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT * FROM transactions WHERE (timestamp, id) < (?, ?)
+                ORDER BY timestamp DESC, id DESC LIMIT ?
+            """, (before_ts, before_id, limit)).fetchall()
         return [dict(r) for r in rows]
 
+def iter_history(chunk: int = EXPORT_CHUNK):
+    """
+    Toutes les transactions dans l'ordre chronologique d'insertion, lues par paquets sur un curseur
+    serveur : la table n'est jamais chargée en mémoire. La connexion reste prise jusqu'à la fin
+    (ou l'abandon) de l'itération.
+    """
+    with get_db() as conn:
+        cursor = conn.execute(f"SELECT {', '.join(HISTORY_COLUMNS)} FROM transactions ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                return
+            yield rows
+
 def manage_cash(req: CashOperationRequest):
     """Gère les Dépôts et Retraits (Cash In/Out)."""
-    with get_db() as conn:
-        account = conn.execute("SELECT * FROM accounts LIMIT 1").fetchone()
-        if not account:
-            raise HTTPException(status_code=404, detail="Account not found")
-        
-        current_balance = account['balance']
-        new_balance = current_balance
-
-        if req.type == 'DEPOSIT':
-            new_balance += req.amount
-        elif req.type == 'WITHDRAW':
-            if req.amount > current_balance:
-                raise HTTPException(status_code=400, detail="Insufficient funds")
-            new_balance -= req.amount
-        
-        # 1. Update Balance
-        conn.execute("UPDATE accounts SET balance = ? WHERE id = ?", (new_balance, account['id']))
-        
-        # 2. Log Transaction
-        conn.execute("""
-            INSERT INTO transactions (ticker, type, quantity, price, total_amount, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (None, req.type, None, None, req.amount, datetime.now()))
-        
-        return {"old_balance": current_balance, "new_balance": new_balance}
+    return db.write(_apply_cash, req).result()
 
-def execute_order(order: OrderRequest, live_price: float):
+def _apply_cash(conn: sqlite3.Connection, req: CashOperationRequest):
+    account = conn.execute("SELECT * FROM accounts LIMIT 1").fetchone()
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
+    
+    current_balance = account['balance']
+    new_balance = current_balance
+
+    if req.type == 'DEPOSIT':
+        new_balance += req.amount
+    elif req.type == 'WITHDRAW':
+        if req.amount > current_balance:
+            raise HTTPException(status_code=400, detail="Insufficient funds")
+        new_balance -= req.amount
+    
+    # 1. Update Balance
+    conn.execute("UPDATE accounts SET balance = ? WHERE id = ?", (new_balance, account['id']))
+    _bump_stats(conn, net_deposits=req.amount if req.type == 'DEPOSIT' else -req.amount)
+    
+    # 2. Log Transaction
+    conn.execute("""
+        INSERT INTO transactions (ticker, type, quantity, price, total_amount, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (None, req.type, None, None, req.amount, datetime.now()))
+    
+    return {"old_balance": current_balance, "new_balance": new_balance}
+
+def execute_order(order: OrderRequest, live_price: float, conn: sqlite3.Connection = None):
     """
     Exécute un ordre d'achat ou de vente.
     CRITIQUE : live_price doit être fourni par le contrôleur (source de vérité).
+    conn : transaction de l'appelant (exécution par lot des ordres en attente) ; le commit lui revient.
     """
     if live_price <= 0:
         raise HTTPException(status_code=400, detail="Invalid market price")
 
-    # Calcul du montant total de la transaction
-    total_value = order.quantity * live_price
+    if conn is not None:
+        return _apply_order(conn, order, live_price)
+    return db.write(_apply_order, order, live_price).result()
 
-    with get_db() as conn:
-        # Récupération du compte (Lock implicite via transaction SQL)
-        account = conn.execute("SELECT * FROM accounts LIMIT 1").fetchone()
+def _apply_order(conn: sqlite3.Connection, order: OrderRequest, live_price: float):
+    ledger = Ledger(conn, [order.ticker])
+    result = ledger.fill(order, live_price)
+    ledger.flush(conn)
+    return result
+
+# --- ÉTAT DU COMPTE EN MÉMOIRE ---
+# Un lot d'ordres est validé contre une copie en mémoire du solde et des positions concernées,
+# lue une seule fois dans la transaction d'écriture, puis écrit en quelques requêtes : un UPDATE
+# du solde, une ligne par ticker touché, un executemany des transactions, un seul _bump_stats.
+
+# En deçà, une position est considérée soldée (tolérance float)
+QTY_EPSILON = 0.000001
+
+class Ledger:
+
+    def __init__(self, conn: sqlite3.Connection, tickers):
+        # Récupération du compte (verrou pris par la transaction de l'appelant)
+        account = conn.execute("SELECT id, balance FROM accounts LIMIT 1").fetchone()
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
-        
-        current_balance = account['balance']
+        self.account_id = account["id"]
+        self.balance = self._opening_balance = account["balance"]
+
+        tickers = list(set(tickers))
+        rows = conn.execute(
+            f"SELECT ticker, quantity, avg_price FROM positions WHERE ticker IN ({', '.join('?' * len(tickers))})", tickers
+        ).fetchall() if tickers else []
+        self.positions = {r["ticker"]: (r["quantity"], r["avg_price"]) for r in rows} # ticker -> (quantité, PMP)
+        self._stored = set(self.positions)
+        self._touched = set()
+        self._transactions = []
+        self._realized_pnl = 0.0
+
+    def fill(self, order: OrderRequest, live_price: float) -> dict:
+        """Applique l'ordre à l'état en mémoire ; HTTPException (état inchangé) s'il est refusé."""
+        # Calcul du montant total de la transaction
+        total_value = order.quantity * live_price
+        qty, avg = self.positions.get(order.ticker, (0.0, 0.0))
 
         # --- LOGIQUE ACHAT (BUY) ---
         if order.action == 'BUY':
-            if current_balance < total_value:
-                raise HTTPException(status_code=400, detail=f"Insufficient funds. Need {total_value:.2f}, have {current_balance:.2f}")
-            
-            # 1. Débit Cash
-            new_balance = current_balance - total_value
-            conn.execute("UPDATE accounts SET balance = ? WHERE id = ?", (new_balance, account['id']))
-
-            # 2. Gestion Position (Avg Price)
-            pos = conn.execute("SELECT * FROM positions WHERE ticker = ?", (order.ticker,)).fetchone()
-            
-            if pos:
-                # Update existant (Calcul PMP)
-                old_qty = pos['quantity']
-                old_avg = pos['avg_price']
-                new_qty = old_qty + order.quantity
-                # Formule Moyenne Pondérée
-                new_avg = ((old_qty * old_avg) + (order.quantity * live_price)) / new_qty
-                
-                conn.execute("""
-                    UPDATE positions SET quantity = ?, avg_price = ?, last_updated = CURRENT_TIMESTAMP 
-                    WHERE ticker = ?
-                """, (new_qty, new_avg, order.ticker))
-            else:
-                # Nouvelle position
-                conn.execute("""
-                    INSERT INTO positions (ticker, quantity, avg_price) VALUES (?, ?, ?)
-                """, (order.ticker, order.quantity, live_price))
-
-            # 3. Log Transaction
-            conn.execute("""
-                INSERT INTO transactions (ticker, type, quantity, price, total_amount, timestamp)
-                VALUES (?, 'BUY', ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (order.ticker, order.quantity, live_price, total_value))
+            if self.balance < total_value:
+                raise HTTPException(status_code=400, detail=f"Insufficient funds. Need {total_value:.2f}, have {self.balance:.2f}")
+            # Débit Cash, puis PMP (moyenne pondérée)
+            self.balance -= total_value
+            new_qty = qty + order.quantity
+            self.positions[order.ticker] = (new_qty, ((qty * avg) + (order.quantity * live_price)) / new_qty)
 
         # --- LOGIQUE VENTE (SELL) ---
         elif order.action == 'SELL':
-            # 1. Vérif Position
-            pos = conn.execute("SELECT * FROM positions WHERE ticker = ?", (order.ticker,)).fetchone()
-            if not pos or pos['quantity'] < order.quantity:
+            if qty < order.quantity:
                 raise HTTPException(status_code=400, detail="Insufficient asset quantity")
-            
-            # 2. Crédit Cash
-            new_balance = current_balance + total_value
-            conn.execute("UPDATE accounts SET balance = ? WHERE id = ?", (new_balance, account['id']))
-
-            # 3. Update Position
-            new_qty = pos['quantity'] - order.quantity
-            if new_qty > 0.000001: # Tolérance float
-                # Le prix de revient (Avg Price) ne change PAS à la vente
+            # Crédit Cash ; le prix de revient (Avg Price) ne change PAS à la vente
+            self.balance += total_value
+            self.positions[order.ticker] = (qty - order.quantity, avg)
+            self._realized_pnl += (live_price - avg) * order.quantity
+
+        self._touched.add(order.ticker)
+        self._transactions.append((order.ticker, order.action, order.quantity, live_price, total_value))
+        return {"status": "executed", "action": order.action, "ticker": order.ticker, "price": live_price}
+
+    def flush(self, conn: sqlite3.Connection):
+        """Écrit l'état accumulé (sans commit : la transaction appartient à l'appelant)."""
+        if not self._transactions:
+            return
+        if self.balance != self._opening_balance:
+            conn.execute("UPDATE accounts SET balance = ? WHERE id = ?", (self.balance, self.account_id))
+
+        for ticker in self._touched:
+            qty, avg = self.positions[ticker]
+            if qty > QTY_EPSILON:
                 conn.execute("""
-                    UPDATE positions SET quantity = ?, last_updated = CURRENT_TIMESTAMP 
-                    WHERE ticker = ?
-                """, (new_qty, order.ticker))
-            else:
+                    INSERT INTO positions (ticker, quantity, avg_price) VALUES (?, ?, ?)
+                    ON CONFLICT(ticker) DO UPDATE SET quantity = excluded.quantity, avg_price = excluded.avg_price,
+                        last_updated = CURRENT_TIMESTAMP
+                """, (ticker, qty, avg))
+            elif ticker in self._stored:
                 # Clôture complète
-                conn.execute("DELETE FROM positions WHERE ticker = ?", (order.ticker,))
+                conn.execute("DELETE FROM positions WHERE ticker = ?", (ticker,))
 
-            # 4. Log Transaction
-            conn.execute("""
-                INSERT INTO transactions (ticker, type, quantity, price, total_amount, timestamp)
-                VALUES (?, 'SELL', ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (order.ticker, order.quantity, live_price, total_value))
+        conn.executemany("""
+            INSERT INTO transactions (ticker, type, quantity, price, total_amount, timestamp)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, self._transactions)
+        _bump_stats(conn, realized_pnl=self._realized_pnl, trades=len(self._transactions))
+        interest.track(conn, interest.POSITION, self._touched)
 
-        return {"status": "executed", "action": order.action, "ticker": order.ticker, "price": live_price}
+        self._opening_balance, self._stored = self.balance, {t for t, (q, _) in self.positions.items() if q > QTY_EPSILON}
+        self._touched, self._transactions, self._realized_pnl = set(), [], 0.0
 
 def nuke_portfolio():
     """RESET COMPLET (Danger Zone)."""
-    with get_db() as conn:
-        # 1. Reset Cash (On ne remet pas 100k ici, on met 0, l'utilisateur devra déposer)
-        conn.execute("UPDATE accounts SET balance = 0")
-        # 2. Vide les positions
-        conn.execute("DELETE FROM positions")
-        # 3. Vide l'historique
-        conn.execute("DELETE FROM transactions")
-        # 4. Log le reset
-        conn.execute("INSERT INTO transactions (type, total_amount) VALUES ('RESET', 0)")
-        
-    return {"status": "nuked"}
\ No newline at end of file
+    db.write(_nuke).result()
+    return {"status": "nuked"}
+
+def _nuke(conn: sqlite3.Connection):
+    # 1. Reset Cash (On ne remet pas 100k ici, on met 0, l'utilisateur devra déposer)
+    conn.execute("UPDATE accounts SET balance = 0")
+    # 2. Vide les positions
+    conn.execute("DELETE FROM positions")
+    # 3. Vide l'historique
+    conn.execute("DELETE FROM transactions")
+    # 4. Annule les ordres en attente
+    conn.execute("""
+        UPDATE orders SET status = 'CANCELLED', reason = 'RESET', updated_at = CURRENT_TIMESTAMP
+        WHERE status IN ('OPEN', 'TRIGGERED')
+    """)
+    # 5. Log le reset
+    conn.execute("INSERT INTO transactions (type, total_amount) VALUES ('RESET', 0)")
+    # 6. Remise à zéro des agrégats
+    conn.execute("""
+        UPDATE portfolio_stats SET net_deposits = 0, realized_pnl = 0, trade_count = 0,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1
+    """)
+    interest.track(conn, interest.POSITION)
+    interest.track(conn, interest.ORDER)
\ No newline at end of file
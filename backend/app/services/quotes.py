@@ -0,0 +1,80 @@
+import time
+from typing import Dict, List, Optional
+
+from ..websockets import manager, quote_topic
+from ..scheduler import OPEN_CADENCE, CLOSED_CADENCE
+from . import market_data
+
+# --- PUBLICATION DELTA ---
+# Variation minimale de prix pour republier un ticker (0 = toute variation compte)
+MIN_PRICE_DELTA = 0.0
+# Keyframe : un ticker inchangé est quand même republié toutes les N secondes (resync clients)
+KEYFRAME_INTERVAL = 60
+
+# --- FRAÎCHEUR DU CACHE ---
+# Un ticker suivi par le worker est republié au plus tard à sa cadence de poll (+ keyframe) :
+# une cotation plus ancienne n'est plus alimentée et doit être refetchée.
+MAX_QUOTE_AGE_OPEN = KEYFRAME_INTERVAL + max(OPEN_CADENCE.values())
+MAX_QUOTE_AGE_CLOSED = KEYFRAME_INTERVAL + max(CLOSED_CADENCE.values())
+
+class QuoteStore:
+    """
+    Dernière cotation reçue et dernière cotation publiée, par ticker.
+    Permet au worker de ne diffuser que ce qui a réellement changé.
+    """
+
+    def __init__(self, min_price_delta: float = MIN_PRICE_DELTA, keyframe_interval: float = KEYFRAME_INTERVAL):
+        self.min_price_delta = min_price_delta
+        self.keyframe_interval = keyframe_interval
+        self.latest: Dict[str, dict] = {}
+        self._published: Dict[str, dict] = {}
+        self._published_at: Dict[str, float] = {}
+
+    def _has_changed(self, quote: dict, last: Optional[dict]) -> bool:
+        if last is None or quote.get("is_open") != last.get("is_open"):
+            return True
+        moved = abs((quote.get("price") or 0) - (last.get("price") or 0))
+        if self.min_price_delta > 0:
+            return moved >= self.min_price_delta
+        return moved > 0 or quote.get("change_pct") != last.get("change_pct")
+
+    def update(self, ticker: str, quote: dict, now: Optional[float] = None) -> bool:
+        """Enregistre la cotation et indique si elle doit être publiée (changement ou keyframe)."""
+        now = now if now is not None else time.time()
+        self.latest[ticker] = quote
+
+        due_keyframe = now - self._published_at.get(ticker, 0.0) >= self.keyframe_interval
+        if not (due_keyframe or self._has_changed(quote, self._published.get(ticker))):
+            return False
+
+        self._published[ticker] = quote
+        self._published_at[ticker] = now
+        return True
+
+    def get(self, ticker: str) -> Optional[dict]:
+        return self.latest.get(ticker)
+
+quote_store = QuoteStore()
+
+# --- COTATIONS EN CACHE (routes) ---
+def cached_quotes(tickers: List[str], fetch_missing: bool = True) -> Dict[str, dict]:
+    """
+    Dernières cotations diffusées sur le bus (manager.last_values : présent dans chaque processus,
+    alimenté par le worker) -> { ticker: { price, change_pct, is_open } }. Les tickers jamais cotés
+    ou dont la cotation a expiré sont demandés en un seul appel batch au provider.
+    """
+    quotes, missing = {}, []
+    for ticker in tickers:
+        topic = quote_topic(ticker)
+        last = manager.last_values.get(topic)
+        max_age = MAX_QUOTE_AGE_OPEN if last and last.get("is_open") else MAX_QUOTE_AGE_CLOSED
+        age = manager.value_age(topic)
+        if last and last.get("price") and age is not None and age <= max_age:
+            quotes[ticker] = last
+        else:
+            missing.append(ticker)
+    if missing and fetch_missing:
+        for ticker, data in (market_data.provider.fetch_bulk_1m_status(missing) or {}).items():
+            if data and data.get("price"):
+                quotes[ticker] = data
+    return quotes
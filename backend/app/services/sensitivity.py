@@ -0,0 +1,125 @@
+import math
+import numpy as np
+from .indicators.core import calc_sma_multi, calc_ema_multi, calc_std_multi, calc_atr_multi
+
+# --- SENSITIVITY MAP ---
+# Balaye une grille de paramètres en une passe (kernels batchés) et renvoie
+# des métriques résumées pour chaque combinaison -> Heatmap instantanée côté front.
+
+LINE_TYPES = {"SMA", "EMA"}
+BAND_TYPES = {"BB", "ENV", "STARC", "KELT"}
+SUPPORTED_TYPES = LINE_TYPES | BAND_TYPES
+
+# Grilles de multiplicateurs par défaut (ENV est exprimé en % de déviation)
+DEFAULT_MULTIPLIERS = {
+    "BB": (0.5, 4.0, 0.25),
+    "ENV": (0.5, 10.0, 0.5),
+    "STARC": (0.5, 4.0, 0.25),
+    "KELT": (0.5, 4.0, 0.25),
+}
+
+MAX_PERIODS = 200
+MAX_MULTIPLIERS = 100
+
+def build_grid(start, stop, step, limit):
+    if step <= 0 or stop < start:
+        raise ValueError("Invalid parameter range")
+    # Taille calculée avant toute allocation (tolérance float : stop atteint à l'arrondi près)
+    n = math.floor((stop - start) / step + 1e-9) + 1
+    if n > limit:
+        raise ValueError(f"Grid too large ({n} > {limit})")
+    return start + step * np.arange(n)
+
+def build_optional_grid(start, stop, step, limit, name):
+    """Grille facultative : les trois bornes ou aucune (None = grille par défaut du type)."""
+    bounds = (start, stop, step)
+    if all(b is None for b in bounds):
+        return None
+    if any(b is None for b in bounds):
+        raise ValueError(f"{name}_min, {name}_max and {name}_step must be given together")
+    return build_grid(start, stop, step, limit)
+
+def _line_metrics(close, lines):
+    """Métriques (P,) pour des lignes (P, n) : % au-dessus, croisements, distance moyenne (%)."""
+    valid = ~np.isnan(lines) & ~np.isnan(close)[None, :]
+    n_valid = valid.sum(axis=1)
+    diff = close[None, :] - lines
+    above = (diff > 0) & valid
+
+    pairs = valid[:, 1:] & valid[:, :-1]
+    crossovers = ((above[:, 1:] != above[:, :-1]) & pairs).sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        coverage = np.where(n_valid > 0, above.sum(axis=1) / n_valid, np.nan)
+        dist = np.where(valid, np.abs(diff) / close[None, :], 0.0)
+        avg_distance = np.where(n_valid > 0, dist.sum(axis=1) / n_valid * 100, np.nan)
+    return coverage, crossovers, avg_distance
+
+def _band_metrics(close, basis, width, multipliers):
+    """Métriques (P, M) pour des bandes basis +/- k * width : % à l'intérieur, cassures, distance au basis (%)."""
+    P, M = basis.shape[0], len(multipliers)
+    coverage = np.full((P, M), np.nan)
+    breakouts = np.zeros((P, M), dtype=np.int64)
+
+    valid = ~(np.isnan(basis) | np.isnan(width) | np.isnan(close)[None, :])
+    n_valid = valid.sum(axis=1)
+    pairs = valid[:, 1:] & valid[:, :-1]
+
+    for j, k in enumerate(multipliers):
+        inside = (close[None, :] <= basis + k * width) & (close[None, :] >= basis - k * width) & valid
+        # Une cassure = passage de l'intérieur vers l'extérieur
+        breakouts[:, j] = (inside[:, :-1] & ~inside[:, 1:] & pairs).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            coverage[:, j] = np.where(n_valid > 0, inside.sum(axis=1) / n_valid, np.nan)
+
+    # La distance au basis ne dépend pas du multiplicateur
+    _, _, avg_distance = _line_metrics(close, np.where(valid, basis, np.nan))
+    return coverage, breakouts, np.repeat(avg_distance[:, None], M, axis=1)
+
+def compute_sensitivity(ind_type, df, periods, multipliers=None):
+    close = df['Close'].values.astype(float)
+    periods = np.asarray(periods, dtype=np.int64)
+
+    if ind_type in LINE_TYPES:
+        lines = calc_sma_multi(close, periods) if ind_type == "SMA" else calc_ema_multi(close, periods)
+        coverage, crossovers, avg_distance = _line_metrics(close, lines)
+        # Une seule colonne : matrice (P, 1) pour un format de réponse uniforme
+        coverage, crossovers, avg_distance = coverage[:, None], crossovers[:, None], avg_distance[:, None]
+        multipliers = None
+
+    elif ind_type in BAND_TYPES:
+        if multipliers is None:
+            multipliers = build_grid(*DEFAULT_MULTIPLIERS[ind_type], MAX_MULTIPLIERS)
+        multipliers = np.asarray(multipliers, dtype=float)
+
+        if ind_type == "BB":
+            basis = calc_sma_multi(close, periods)
+            width = calc_std_multi(close, periods)
+        elif ind_type == "ENV":
+            basis = calc_sma_multi(close, periods)
+            width = basis / 100.0
+        elif ind_type == "STARC":
+            basis = calc_sma_multi(close, periods)
+            width = calc_atr_multi(df, periods)
+        else: # KELT : ATR fixé à 10 comme indicator_kelt
+            basis = calc_ema_multi(close, periods)
+            width = np.repeat(calc_atr_multi(df, [10]), len(periods), axis=0)
+
+        coverage, crossovers, avg_distance = _band_metrics(close, basis, width, multipliers)
+    else:
+        raise ValueError(f"Sensitivity not supported for {ind_type}")
+
+    def to_matrix(arr, digits):
+        return [[None if np.isnan(v) else round(float(v), digits) for v in row] for row in arr]
+
+    return {
+        "type": ind_type,
+        "bars": len(close),
+        "periods": periods.tolist(),
+        "multipliers": [round(float(k), 4) for k in multipliers] if multipliers is not None else None,
+        "metrics": {
+            "coverage": to_matrix(coverage, 4),
+            "crossovers": crossovers.tolist(),
+            "avg_distance": to_matrix(avg_distance, 4),
+        }
+    }
@@ -0,0 +1,119 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# --- RING BUFFERS DE TICKS ---
+# Derniers prix par ticker dans des tableaux NumPy de taille fixe (mémoire bornée, aucune allocation
+# à l'ajout). Alimentés par chaque PRICE_UPDATE qui transite dans le processus, et amorcés côté
+# poller avec les clôtures 1m du buffer live. Servent aux sparklines de la Sidebar.
+
+# Points conservés par ticker (~2 séances en 1m, ou quelques heures de ticks à 5 s)
+RING_CAPACITY = 1024
+# Nombre max de tickers suivis (les moins récemment mis à jour sont évincés)
+MAX_RINGS = 2000
+
+class TickRing:
+    """Buffer circulaire (timestamp epoch s, prix), en float64 ; les timestamps sont croissants."""
+
+    __slots__ = ("times", "prices", "head", "count")
+
+    def __init__(self, capacity: int = RING_CAPACITY):
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.prices = np.zeros(capacity, dtype=np.float64) # float32 : ~7 chiffres, faux au centime au-delà de 1e5
+        self.head = 0 # Prochaine case écrite
+        self.count = 0
+
+    def last_time(self) -> Optional[float]:
+        return float(self.times[self.head - 1]) if self.count else None
+
+    def append(self, ts: float, price: float):
+        if self.count and ts <= self.times[self.head - 1]:
+            # Même instant (ou retour en arrière) : on révise le dernier point
+            self.prices[self.head - 1] = price
+            return
+        self.times[self.head] = ts
+        self.prices[self.head] = price
+        self.head = (self.head + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def extend(self, times: np.ndarray, prices: np.ndarray):
+        last = self.last_time()
+        if last is not None:
+            keep = times > last
+            times, prices = times[keep], prices[keep]
+        capacity = len(self.times)
+        times, prices = times[-capacity:], prices[-capacity:]
+        n = len(times)
+        if not n:
+            return
+        idx = (self.head + np.arange(n)) % capacity
+        self.times[idx] = times
+        self.prices[idx] = prices
+        self.head = (self.head + n) % capacity
+        self.count = min(self.count + n, capacity)
+
+    def series(self):
+        """Copie ordonnée (plus ancien -> plus récent)."""
+        if self.count < len(self.times):
+            return self.times[:self.count].copy(), self.prices[:self.count].copy()
+        return np.roll(self.times, -self.head), np.roll(self.prices, -self.head)
+
+class TickStore:
+
+    def __init__(self, capacity: int = RING_CAPACITY, max_rings: int = MAX_RINGS):
+        self.capacity = capacity
+        self.max_rings = max_rings
+        self._rings: "OrderedDict[str, TickRing]" = OrderedDict()
+        # Écritures depuis le thread de fetch du worker, lectures depuis les routes
+        self._lock = threading.Lock()
+
+    def _ring(self, ticker: str) -> TickRing:
+        ring = self._rings.get(ticker)
+        if ring is None:
+            ring = self._rings[ticker] = TickRing(self.capacity)
+            if len(self._rings) > self.max_rings:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(ticker)
+        return ring
+
+    def append(self, ticker: str, ts: float, price: float):
+        if price is None:
+            return
+        with self._lock:
+            self._ring(ticker).append(ts, price)
+
+    def seed(self, ticker: str, times: np.ndarray, prices: np.ndarray):
+        """Amorçage avec un historique (clôtures 1m) : seuls les points plus récents que le buffer sont ajoutés."""
+        with self._lock:
+            self._ring(ticker).extend(times, prices)
+
+    def is_empty(self, ticker: str) -> bool:
+        ring = self._rings.get(ticker)
+        return ring is None or ring.count == 0
+
+    def sparklines(self, tickers: List[str], points: int, window: float) -> Dict[str, dict]:
+        """
+        Séries échantillonnées sur une grille régulière couvrant `window` secondes jusqu'au dernier point
+        du ticker (marché fermé = dernière séance) : valeur = dernier prix connu à chaque pas,
+        None avant le premier point. Réponse compacte : t0 et step remplacent les timestamps.
+        """
+        step = window / points
+        offsets = step * np.arange(points - 1, -1, -1)
+        with self._lock:
+            series = {t: self._rings[t].series() for t in tickers if t in self._rings and self._rings[t].count}
+
+        result = {}
+        for ticker, (times, prices) in series.items():
+            grid = times[-1] - offsets
+            idx = np.searchsorted(times, grid, side="right") - 1
+            values = np.where(idx >= 0, prices[np.maximum(idx, 0)], np.nan)
+            result[ticker] = {
+                "t0": round(float(grid[0]), 3),
+                "step": round(step, 3),
+                "v": [None if np.isnan(v) else round(float(v), 2) for v in values]
+            }
+        return result
+
+tick_store = TickStore()
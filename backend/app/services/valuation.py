@@ -0,0 +1,75 @@
+import time
+import numpy as np
+from typing import Dict, List
+
+from ..database import get_db
+from . import portfolio_service
+from .quotes import cached_quotes
+
+# --- VALORISATION DU PORTEFEUILLE ---
+# Toutes les positions valorisées en une passe NumPy à partir des dernières cotations diffusées
+# (état partagé par tous les processus via le bus). Seuls les tickers encore jamais cotés font
+# l'objet d'un unique appel batch au provider. Utilisé par /summary, /positions et par le worker
+# (PORTFOLIO_UPDATE sur le canal global).
+
+def load_book(conn) -> dict:
+    """Cash, positions ouvertes et agrégats, lus sur une même connexion."""
+    account = conn.execute("SELECT balance FROM accounts LIMIT 1").fetchone()
+    positions = conn.execute("SELECT ticker, quantity, avg_price FROM positions WHERE quantity > 0").fetchall()
+    return {
+        "cash": account["balance"] if account else 0.0,
+        "positions": [dict(p) for p in positions],
+        "stats": portfolio_service.get_stats(conn)
+    }
+
+def cached_prices(tickers: List[str], fetch_missing: bool = True) -> Dict[str, float]:
+    """Derniers prix connus ; les tickers absents du cache sont demandés en un seul appel batch."""
+    return {t: q["price"] for t, q in cached_quotes(tickers, fetch_missing).items()}
+
+def value_book(book: dict, prices: Dict[str, float]) -> dict:
+    """Valorisation vectorisée ; un ticker encore sans cotation est compté à son prix de revient."""
+    positions = book["positions"]
+    qty = np.array([p["quantity"] for p in positions], dtype=float)
+    avg = np.array([p["avg_price"] for p in positions], dtype=float)
+    price = np.array([prices.get(p["ticker"], np.nan) for p in positions], dtype=float)
+    price = np.where(np.isnan(price), avg, price)
+
+    market_value = qty * price
+    pnl = (price - avg) * qty
+    cost = qty * avg
+    pnl_pct = np.divide(pnl, cost, out=np.zeros_like(pnl), where=cost > 0)
+
+    cash = book["cash"]
+    invested = book["stats"]["net_deposits"]
+    equity = cash + float(market_value.sum())
+    total_pnl = equity - invested if invested > 0 else 0.0
+
+    return {
+        "cash_balance": round(cash, 2),
+        "equity_value": round(equity, 2),
+        "total_pnl": round(total_pnl, 2),
+        "pnl_pct": round(total_pnl / invested, 4) if invested > 0 else 0.0,
+        "positions_count": len(positions),
+        "invested_capital": invested,
+        "realized_pnl": round(book["stats"]["realized_pnl"], 2),
+        "trade_count": book["stats"]["trade_count"],
+        "positions": [{
+            "ticker": p["ticker"],
+            "quantity": p["quantity"],
+            "avg_price": p["avg_price"],
+            "current_price": float(price[i]),
+            "market_value": round(float(market_value[i]), 2),
+            "pnl_unrealized": round(float(pnl[i]), 2),
+            "pnl_pct": round(float(pnl_pct[i]), 4)
+        } for i, p in enumerate(positions)]
+    }
+
+def get_valuation() -> dict:
+    """Routes : lecture DB, puis prix (l'éventuel appel réseau se fait connexion rendue au pool)."""
+    with get_db() as conn:
+        book = load_book(conn)
+    return value_book(book, cached_prices([p["ticker"] for p in book["positions"]]))
+
+def portfolio_update(valuation: dict) -> dict:
+    """Message PORTFOLIO_UPDATE diffusé par le worker."""
+    return {"type": "PORTFOLIO_UPDATE", **valuation, "timestamp": time.time()}
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .database import db
+from .services import market_data
+from .services.indicators import compute_indicator
+from .websockets import manager, ClientSession, GLOBAL_TOPIC, CANDLE_RESOLUTIONS
+
+# --- FLUX MULTIPLEXÉ (/ws) ---
+# Une seule connexion par client, abonnements à la volée :
+#   {"action": "subscribe",   "topics": ["global", "quote:AAPL", "candle:AAPL:5m", "indicator:12"]}
+#   {"action": "unsubscribe", "topics": ["candle:AAPL:5m"]}
+# Réponses : SUBSCRIBED / UNSUBSCRIBED (topics acceptés) et ERROR (topics refusés).
+
+# Garde-fou par connexion
+MAX_TOPICS_PER_CLIENT = 200
+# Historique conservé par (ticker, résolution) pour recalculer les indicateurs streamés
+MAX_HISTORY_BARS = 5000
+# Nombre de points renvoyés à chaque clôture (le dernier peut réviser l'avant-dernier pour certains indicateurs)
+INDICATOR_TAIL_POINTS = 2
+
+def log(msg):
+    print(f"\033[95m[{datetime.now().strftime('%H:%M:%S')}] [STREAMS]\033[0m {msg}")
+
+def indicator_topic(ind_id: int) -> str:
+    return f"indicator:{ind_id}"
+
+# --- FLUX D'INDICATEURS ---
+class IndicatorStreams:
+    """
+    Indicateurs sauvegardés streamés : l'historique de leur résolution est chargé une fois,
+    puis prolongé avec chaque CANDLE_CLOSE reçu du bus, et seule la fin de série est diffusée.
+    """
+
+    def __init__(self):
+        self.meta: Dict[int, dict] = {}
+        self._history: Dict[Tuple[str, str], pd.DataFrame] = {}
+        self._tasks = set()
+
+    async def resolve(self, ind_id: int) -> Optional[dict]:
+        """Définition de l'indicateur (mise en cache par track() une fois l'abonnement accepté)."""
+        if ind_id in self.meta:
+            return self.meta[ind_id]
+        row = await db.aread(lambda conn: conn.execute("SELECT * FROM saved_indicators WHERE id = ?", (ind_id,)).fetchone())
+        if not row:
+            return None
+        return {
+            "id": ind_id,
+            "ticker": row["ticker"],
+            "type": row["type"],
+            "resolution": row["resolution"],
+            "params": json.loads(row["params"])
+        }
+
+    def track(self, meta: dict):
+        self.meta[meta["id"]] = meta
+
+    def release(self, ind_id: int):
+        """Oubli d'un indicateur sans abonné (et de son historique s'il n'est plus partagé)."""
+        meta = self.meta.pop(ind_id, None)
+        if not meta:
+            return
+        key = (meta["ticker"], meta["resolution"])
+        if not any((m["ticker"], m["resolution"]) == key for m in self.meta.values()):
+            self._history.pop(key, None)
+
+    def _extend_history(self, key: Tuple[str, str], candle: dict) -> Optional[pd.DataFrame]:
+        df = self._history.get(key)
+        if df is None:
+            ticker, resolution = key
+            period, interval = market_data.resolve_fetch_params_from_resolution(resolution)
+            df = market_data.provider.fetch_history(ticker, period, interval)
+            if df is None or df.empty:
+                return None
+            df = df.tz_localize('UTC') if df.index.tz is None else df.tz_convert('UTC')
+
+        bar = pd.DataFrame({
+            "Open": [candle["open"]], "High": [candle["high"]], "Low": [candle["low"]],
+            "Close": [candle["close"]], "Volume": [candle["volume"]]
+        }, index=pd.DatetimeIndex([pd.Timestamp(candle["time"], unit="s", tz="UTC")]))
+        df = pd.concat([df, bar])
+        df = df[~df.index.duplicated(keep='last')].sort_index().iloc[-MAX_HISTORY_BARS:]
+        self._history[key] = df
+        return df
+
+    def _compute(self, key: Tuple[str, str], targets: List[dict], candle: dict) -> List[Tuple[dict, list]]:
+        df = self._extend_history(key, candle)
+        if df is None:
+            return []
+        return [(meta, compute_indicator(meta["type"], df.copy(), meta["params"])[-INDICATOR_TAIL_POINTS:])
+                for meta in targets]
+
+    async def _recompute(self, key: Tuple[str, str], targets: List[dict], candle: dict):
+        try:
+            results = await asyncio.to_thread(self._compute, key, targets, candle)
+        except Exception as e:
+            log(f"Erreur recalcul {key}: {e}")
+            return
+        for meta, points in results:
+            if points:
+                await manager.publish(indicator_topic(meta["id"]), {
+                    "type": "INDICATOR_UPDATE",
+                    "id": meta["id"],
+                    "ticker": meta["ticker"],
+                    "resolution": meta["resolution"],
+                    "points": points
+                })
+
+    def on_candle_close(self, event: dict):
+        """Appelé pour chaque CANDLE_CLOSE livré à ce processus (non bloquant)."""
+        key = (event["ticker"], event["resolution"])
+        targets = [m for m in self.meta.values()
+                   if (m["ticker"], m["resolution"]) == key and manager.subscriber_count(indicator_topic(m["id"]))]
+        if not targets:
+            return
+        task = asyncio.create_task(self._recompute(key, targets, event["candle"]))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+indicator_streams = IndicatorStreams()
+
+# --- PROTOCOLE ---
+async def _validate(topic: str) -> Tuple[Optional[str], Optional[str]]:
+    """Retourne (ticker rattaché, erreur) pour un topic client."""
+    kind, _, rest = topic.partition(":")
+    if topic == GLOBAL_TOPIC:
+        return None, None
+    if kind == "quote" and rest:
+        return None, None
+    if kind == "candle":
+        ticker, _, resolution = rest.rpartition(":")
+        if ticker and resolution in CANDLE_RESOLUTIONS:
+            return None, None
+        return None, f"Résolution non streamée (disponibles: {', '.join(CANDLE_RESOLUTIONS)})"
+    if kind == "indicator":
+        if not rest.isdigit():
+            return None, "Identifiant d'indicateur invalide"
+        meta = await indicator_streams.resolve(int(rest))
+        if not meta:
+            return None, "Indicator not found"
+        if meta["resolution"] not in CANDLE_RESOLUTIONS:
+            return None, f"Résolution {meta['resolution']} non streamée"
+        indicator_streams.track(meta)
+        return meta["ticker"], None
+    return None, "Topic inconnu"
+
+async def subscribe(session: ClientSession, topics: List[str]):
+    accepted, errors = [], {}
+    for topic in topics:
+        if topic in session.topics:
+            accepted.append(topic)
+            continue
+        if len(session.topics) >= MAX_TOPICS_PER_CLIENT:
+            errors[topic] = f"Limite de {MAX_TOPICS_PER_CLIENT} topics atteinte"
+            continue
+        ticker, error = await _validate(topic)
+        if error:
+            errors[topic] = error
+            continue
+        manager.subscribe(session, topic, ticker)
+        accepted.append(topic)
+
+    if accepted:
+        session.send({"type": "SUBSCRIBED", "topics": accepted})
+    if errors:
+        session.send({"type": "ERROR", "errors": errors})
+
+def _release_indicators(topics):
+    for topic in topics:
+        if topic.startswith("indicator:") and not manager.subscriber_count(topic):
+            indicator_streams.release(int(topic.partition(":")[2]))
+
+def unsubscribe(session: ClientSession, topics: List[str]):
+    removed = [t for t in topics if t in session.topics]
+    for topic in removed:
+        manager.unsubscribe(session, topic)
+    _release_indicators(removed)
+    session.send({"type": "UNSUBSCRIBED", "topics": removed})
+
+async def handle_message(session: ClientSession, text: str):
+    try:
+        msg = json.loads(text)
+        action, topics = msg.get("action"), msg.get("topics") or []
+        if not isinstance(topics, list) or not all(isinstance(t, str) for t in topics):
+            raise ValueError("topics doit être une liste de chaînes")
+    except (ValueError, AttributeError) as e:
+        session.send({"type": "ERROR", "message": f"Message invalide: {e}"})
+        return
+
+    if action == "subscribe":
+        await subscribe(session, topics)
+    elif action == "unsubscribe":
+        unsubscribe(session, topics)
+    elif action != "ping":
+        session.send({"type": "ERROR", "message": f"Action inconnue: {action}"})
+
+def disconnect(session: ClientSession):
+    topics = list(session.topics)
+    manager.drop(session)
+    _release_indicators(topics)
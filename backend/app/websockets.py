@@ -1,66 +1,319 @@
-from typing import Dict, List, Set
+from typing import Callable, Dict, Optional, Set
 from fastapi import WebSocket
 from datetime import datetime
+from collections import OrderedDict
+import asyncio
+import json
+import time
+
+# Taille max de la file sortante d'un client. Au-delà, on jette la cotation en attente la plus ancienne
+# (PRICE_UPDATE / CANDLE_UPDATE, périmées par la suivante) : un client lent ne doit jamais ralentir
+# le worker ni les autres clients. Les événements (ALERT, ORDER_UPDATE, CANDLE_CLOSE, acks...) ne sont
+# jamais jetés : au-delà de EVENT_QUEUE_SIZE frames en attente, le client est déconnecté (il se
+# reconnecte et reçoit les dernières valeurs au réabonnement).
+SEND_QUEUE_SIZE = 64
+EVENT_QUEUE_SIZE = 1024
+SLOW_CLIENT_CLOSE_CODE = 1013 # Try Again Later
+
+# Durée de vie d'une dernière valeur sans mise à jour ni abonné (ticker sorti de l'intérêt du worker).
+# Supérieure à la cadence de poll la plus lente : un ticker encore suivi est republié avant expiration.
+LAST_VALUE_TTL = 15 * 60
+LAST_VALUE_PRUNE_INTERVAL = 60
+
+# --- TOPICS ---
+# global                 -> PRICE_BATCH (Sidebar, Equity)
+# quote:{ticker}         -> PRICE_UPDATE
+# candle:{ticker}:{res}  -> CANDLE_UPDATE / CANDLE_CLOSE
+# indicator:{id}         -> INDICATOR_UPDATE (voir streams.py)
+GLOBAL_TOPIC = "global"
+CANDLE_RESOLUTIONS = ("1m", "5m", "1h")
+# Messages dont la dernière valeur est rejouée immédiatement à l'abonnement
+SNAPSHOT_TYPES = ("PRICE_UPDATE", "CANDLE_UPDATE")
 
 def log(msg):
     print(f"\033[93m[{datetime.now().strftime('%H:%M:%S')}] [MANAGER]\033[0m {msg}")
 
+def encode(message: dict) -> str:
+    """Sérialisation unique d'un message (même format compact que send_json)."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+def coalesce_key(message: dict):
+    """Clé de coalescence : deux PRICE_UPDATE (ou CANDLE_UPDATE) en attente pour le même flux -> seul le dernier compte."""
+    if message.get("type") == "PRICE_UPDATE":
+        return ("PRICE_UPDATE", message.get("ticker"))
+    if message.get("type") == "CANDLE_UPDATE":
+        return ("CANDLE_UPDATE", message.get("ticker"), message.get("resolution"))
+    return None
+
+def quote_topic(ticker: str) -> str:
+    return f"quote:{ticker}"
+
+def candle_topic(ticker: str, resolution: str) -> str:
+    return f"candle:{ticker}:{resolution}"
+
+def topic_ticker(topic: str) -> Optional[str]:
+    """Ticker porté par un topic quote/candle (None pour global et les indicateurs)."""
+    kind, _, rest = topic.partition(":")
+    if kind == "quote":
+        return rest or None
+    if kind == "candle":
+        return rest.rsplit(":", 1)[0] or None
+    return None
+
+class ClientSession:
+    """
+    Une connexion WebSocket + sa file sortante bornée, vidée par une tâche d'écriture dédiée.
+    Le broadcast ne fait qu'empiler des frames déjà encodées (aucun await réseau).
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.topics: Set[str] = set()
+        self.closed = False
+        self.dropped = 0
+        self._pending: "OrderedDict[object, str]" = OrderedDict()
+        self._seq = 0
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+        self._closer = None
+
+    def enqueue(self, text: str, key=None):
+        if self.closed:
+            return
+        if key is None:
+            self._seq += 1
+            key = self._seq
+        elif key in self._pending:
+            # Coalescence : on remplace la valeur en attente (sa place dans la file est conservée)
+            self._pending[key] = text
+            return
+
+        if len(self._pending) >= SEND_QUEUE_SIZE and not self._drop_oldest_quote():
+            if len(self._pending) >= EVENT_QUEUE_SIZE:
+                log(f"Client trop lent ({len(self._pending)} événements en attente), déconnexion.")
+                self.close(code=SLOW_CLIENT_CLOSE_CODE)
+                return
+        self._pending[key] = text
+        self._ready.set()
+
+    def _drop_oldest_quote(self) -> bool:
+        """Retire la plus ancienne frame coalesçable (clé tuple) ; False s'il n'y a que des événements."""
+        for key in self._pending:
+            if isinstance(key, tuple):
+                del self._pending[key]
+                self.dropped += 1
+                return True
+        return False
+
+    def send(self, message: dict):
+        self.enqueue(encode(message), coalesce_key(message))
+
+    async def _writer(self):
+        try:
+            while True:
+                await self._ready.wait()
+                while self._pending:
+                    _, text = self._pending.popitem(last=False)
+                    await self.websocket.send_text(text)
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log(f"Erreur d'envoi, client marqué fermé: {e}")
+            self.closed = True
+
+    def close(self, code: Optional[int] = None):
+        """code : ferme aussi la socket (le client se reconnecte), sinon elle est déjà fermée par l'endpoint."""
+        self.closed = True
+        self._pending.clear()
+        self._task.cancel()
+        if code is not None:
+            self._closer = asyncio.create_task(self._close_socket(code)) # Référence gardée jusqu'à la fin
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception as e:
+            log(f"Fermeture du client impossible: {e}")
+
 class ConnectionManager:
+    """
+    Index d'abonnements, ajout/retrait en O(1) :
+    - topics          : topic -> sessions abonnées
+    - session.topics  : session -> topics
+    - ticker_sessions : ticker -> sessions qui le suivent (tous topics confondus, lu par le worker)
+    """
 
     def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-        self.active_tickers: Set[str] = set()
-        self.global_connections: List[WebSocket] = [] # Nouveau
+        self.sessions: Dict[WebSocket, ClientSession] = {}
+        self.topics: Dict[str, Set[ClientSession]] = {}
+        self.ticker_sessions: Dict[str, Set[ClientSession]] = {}
+        # Nombre de topics d'une session rattachés à un ticker (le ticker est libéré à 0)
+        self._ticker_refs: Dict[tuple, int] = {}
+        # Ticker des topics qui ne le portent pas dans leur nom (indicator:{id})
+        self._topic_tickers: Dict[str, str] = {}
+        # Dernière valeur connue par topic (alimentée par tout ce qui transite dans ce processus)
+        self.last_values: Dict[str, dict] = {}
+        # Instant de réception (horloge locale) de chaque dernière valeur
+        self.last_updated: Dict[str, float] = {}
+        self._next_prune = 0.0
+        # Appelé quand un ticker gagne son premier spectateur dans ce processus (fetch hors cycle)
+        self.on_new_ticker: Optional[Callable[[str], None]] = None
 
-    async def connect_global(self, websocket: WebSocket):
+    # --- CYCLE DE VIE ---
+    async def accept(self, websocket: WebSocket) -> ClientSession:
         await websocket.accept()
-        self.global_connections.append(websocket)
+        session = ClientSession(websocket)
+        self.sessions[websocket] = session
+        return session
+
+    def drop(self, session: ClientSession):
+        for topic in list(session.topics):
+            self.unsubscribe(session, topic)
+        self.sessions.pop(session.websocket, None)
+        session.close()
+
+    # --- ABONNEMENTS ---
+    def _ticker_of(self, topic: str) -> Optional[str]:
+        return self._topic_tickers.get(topic) or topic_ticker(topic)
+
+    def subscribe(self, session: ClientSession, topic: str, ticker: Optional[str] = None):
+        """ticker : rattachement explicite d'un topic au ticker suivi (ex: indicator:{id})."""
+        if topic in session.topics:
+            return
+        if ticker:
+            self._topic_tickers[topic] = ticker
+        session.topics.add(topic)
+        self.topics.setdefault(topic, set()).add(session)
+        self._replay(session, topic)
+
+        ticker = self._ticker_of(topic)
+        if ticker:
+            ref = (session, ticker)
+            self._ticker_refs[ref] = self._ticker_refs.get(ref, 0) + 1
+            if self._ticker_refs[ref] == 1:
+                is_new = ticker not in self.ticker_sessions
+                sessions = self.ticker_sessions.setdefault(ticker, set())
+                sessions.add(session)
+                log(f"Client ajouté sur {ticker}. Total spectateurs: {len(sessions)}")
+                if is_new and self.on_new_ticker:
+                    self.on_new_ticker(ticker)
+
+    def unsubscribe(self, session: ClientSession, topic: str):
+        if topic not in session.topics:
+            return
+        ticker = self._ticker_of(topic)
+        session.topics.discard(topic)
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(session)
+            if not subscribers:
+                del self.topics[topic]
+                self._topic_tickers.pop(topic, None)
+
+        if ticker:
+            ref = (session, ticker)
+            self._ticker_refs[ref] -= 1
+            if self._ticker_refs[ref] == 0:
+                del self._ticker_refs[ref]
+                sessions = self.ticker_sessions[ticker]
+                sessions.discard(session)
+                log(f"Client retiré de {ticker}.")
+                if not sessions:
+                    del self.ticker_sessions[ticker]
+                    log(f"Plus de spectateurs pour {ticker}. Arrêt surveillance.")
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self.topics.get(topic, ()))
+
+    def ticker_subscribers(self) -> Dict[str, int]:
+        """Spectateurs par ticker pour ce processus (remonté au worker via le bus)."""
+        return {t: len(sessions) for t, sessions in self.ticker_sessions.items()}
+
+    @property
+    def active_tickers(self) -> Set[str]:
+        return set(self.ticker_sessions)
+
+    # --- DERNIÈRE VALEUR CONNUE ---
+    def _replay(self, session: ClientSession, topic: str):
+        """Envoi immédiat de la dernière valeur connue : pas d'attente du prochain cycle du worker."""
+        if topic == GLOBAL_TOPIC:
+            quotes = [{k: v for k, v in m.items() if k != "type"}
+                      for t, m in self.last_values.items() if t.startswith("quote:")]
+            if quotes:
+                session.send({
+                    "type": "PRICE_BATCH",
+                    "quotes": quotes,
+                    "timestamp": max(q.get("timestamp") or 0 for q in quotes),
+                    "topic": GLOBAL_TOPIC
+                })
+        elif topic in self.last_values:
+            session.send({**self.last_values[topic], "topic": topic})
+
+    def value_age(self, topic: str) -> Optional[float]:
+        """Secondes écoulées depuis la dernière valeur reçue sur ce topic (None si inconnue)."""
+        updated = self.last_updated.get(topic)
+        return None if updated is None else time.time() - updated
+
+    def prune_last_values(self, now: float):
+        """Oublie les valeurs expirées des topics sans abonné : la table ne grossit pas avec l'historique des tickers."""
+        self._next_prune = now + LAST_VALUE_PRUNE_INTERVAL
+        for topic, updated in list(self.last_updated.items()):
+            if now - updated > LAST_VALUE_TTL and topic not in self.topics:
+                del self.last_updated[topic]
+                self.last_values.pop(topic, None)
+
+    # --- DIFFUSION ---
+    async def publish(self, topic: str, message: dict):
+        """Encodage unique par topic (le topic est ajouté au message pour le routage côté client)."""
+        if message.get("type") in SNAPSHOT_TYPES:
+            now = time.time()
+            self.last_values[topic] = message
+            self.last_updated[topic] = now
+            if now >= self._next_prune:
+                self.prune_last_values(now)
+        subscribers = self.topics.get(topic)
+        if not subscribers:
+            return
+        text, key = encode({**message, "topic": topic}), coalesce_key(message)
+        for session in list(subscribers):
+            if session.closed:
+                self.drop(session)
+            else:
+                session.enqueue(text, key)
+
+    # --- ENDPOINTS HISTORIQUES (/ws/global, /ws/{ticker}) ---
+    async def connect_global(self, websocket: WebSocket):
+        session = await self.accept(websocket)
+        self.subscribe(session, GLOBAL_TOPIC)
         log("Global Client connecté.")
 
     def disconnect_global(self, websocket: WebSocket):
-        if websocket in self.global_connections:
-            self.global_connections.remove(websocket)
+        session = self.sessions.get(websocket)
+        if session:
+            self.drop(session)
             log("Global Client déconnecté.")
 
     async def broadcast_global(self, message: dict):
         """Diffuse à tous les clients écoutant le flux global"""
-        for connection in list(self.global_connections):
-            try:
-                await connection.send_json(message)
-            except Exception:
-                self.disconnect_global(connection)
+        await self.publish(GLOBAL_TOPIC, message)
 
     async def connect(self, websocket: WebSocket, ticker: str):
-        await websocket.accept()
-        if ticker not in self.active_connections:
-            self.active_connections[ticker] = []
-        self.active_connections[ticker].append(websocket)
-        self.active_tickers.add(ticker)
-        
-        count = len(self.active_connections[ticker])
-        log(f"Client ajouté sur {ticker}. Total spectateurs: {count}")
-
-    def disconnect(self, websocket: WebSocket, ticker: str):
-        if ticker in self.active_connections:
-            if websocket in self.active_connections[ticker]:
-                self.active_connections[ticker].remove(websocket)
-                log(f"Client retiré de {ticker}.")
-            
-            if len(self.active_connections[ticker]) == 0:
-                del self.active_connections[ticker]
-                self.active_tickers.discard(ticker)
-                log(f"Plus de spectateurs pour {ticker}. Arrêt surveillance.")
+        # Un graphique reçoit les prix et les bougies live de toutes les résolutions de son ticker
+        session = await self.accept(websocket)
+        self.subscribe(session, quote_topic(ticker))
+        for resolution in CANDLE_RESOLUTIONS:
+            self.subscribe(session, candle_topic(ticker, resolution))
+
+    def disconnect(self, websocket: WebSocket, ticker: str = None):
+        session = self.sessions.get(websocket)
+        if session:
+            self.drop(session)
 
     async def broadcast(self, ticker: str, message: dict):
-        if ticker in self.active_connections:
-            connections = list(self.active_connections[ticker])
-            # log(f"Broadcasting prix {ticker} à {len(connections)} clients") # Décommenter si besoin
-            
-            for connection in connections:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"Error broadcasting: {e}")
-                    self.disconnect(connection, ticker)
-
-manager = ConnectionManager()
\ No newline at end of file
+        if message.get("type") in ("CANDLE_UPDATE", "CANDLE_CLOSE"):
+            await self.publish(candle_topic(ticker, message.get("resolution")), message)
+        else:
+            await self.publish(quote_topic(ticker), message)
+
+manager = ConnectionManager()
@@ -1,91 +1,334 @@
 import asyncio
 import time
+import pandas as pd
+from collections import deque
 from datetime import datetime
-from .websockets import manager
+from .pubsub import bus, GLOBAL_CHANNEL
+from .websockets import quote_topic, candle_topic
 from .services import market_data
-from .database import get_db
+from .services.quotes import quote_store
+from .services.live_bars import live_bars
+from .services.candles import candle_aggregator
+from .services.alerts import alert_engine
+from .services.order_book import order_book
+from .services import valuation
+from .services.interest import interest_registry, load as load_registry, WATCHLIST, POSITION, ORDER
+from .services.ticks import tick_store
+from .database import db
+from .scheduler import scheduler, PRIORITY_CHART, PRIORITY_WATCHLIST, PRIORITY_POSITION
 
-# Aligné sur l'intervalle 1m (avec une marge de sécurité)
+# Vérification des règles d'alerte et des ordres en attente modifiés (marqueurs de changement en DB)
 UPDATE_INTERVAL = 5
+# Resynchronisation complète du registre des tickers d'intérêt (filet de sécurité, hors boucle)
+REGISTRY_RESYNC = 10 * 60
+# Granularité de réveil du scheduler (prise en compte rapide des nouveaux graphiques)
+SCHEDULER_TICK = 1
+# Découpage des tickers dus en shards fetchés en parallèle (sous sémaphore)
+SHARD_SIZE = 50
+MAX_CONCURRENT_FETCHES = 4
+
+# PORTFOLIO_UPDATE : au plus un par seconde quand une position a bougé, et une keyframe périodique
+PORTFOLIO_PUSH_INTERVAL = 1
+PORTFOLIO_KEYFRAME = 30
+
+# Tickers détenus (lus dans le registre) et drapeau "valorisation à republier"
+held_tickers = set()
+portfolio_changed = asyncio.Event()
+
+# Timings des derniers shards (réglage de SHARD_SIZE / MAX_CONCURRENT_FETCHES)
+shard_stats = deque(maxlen=500)
 
 def log(msg):
     print(f"\033[92m[{datetime.now().strftime('%H:%M:%S')}] [WORKER]\033[0m {msg}")
 
+def build_interest(watchlist_tickers, position_tickers, chart_tickers, alert_tickers=(), order_tickers=()):
+    """
+    Fusionne les sources en {ticker: priorité}, la plus forte l'emporte :
+    graphique ouvert > favoris = alertes = ordres en attente > position.
+    """
+    interest = {}
+    for t in position_tickers: interest[t] = PRIORITY_POSITION
+    for t in watchlist_tickers: interest[t] = PRIORITY_WATCHLIST
+    for t in alert_tickers: interest[t] = PRIORITY_WATCHLIST
+    for t in order_tickers: interest[t] = PRIORITY_WATCHLIST
+    for t in chart_tickers: interest[t] = PRIORITY_CHART
+    # Filtrage des None ou vide au cas où
+    return {t: p for t, p in interest.items() if t}
+
+def fetch_live_quotes(tickers):
+    """
+    Fetch incrémental : seules les barres 1m postérieures au curseur de chaque ticker sont demandées
+    (fenêtre complète si pas de curseur ou trou), puis on lit { price, change_pct, is_open } dans le buffer.
+    """
+    provider = market_data.provider
+    now = pd.Timestamp.now(tz='UTC')
+
+    for start, group in live_bars.plan(tickers, now):
+        frames = provider.fetch_bulk_1m_bars(group, start)
+        for ticker, df in frames.items():
+            live_bars.ingest(ticker, df, full=start is None)
+            if tick_store.is_empty(ticker):
+                # Amorçage des sparklines avec les clôtures 1m (les ticks publiés prennent le relais)
+                bars = live_bars.bars(ticker)
+                if bars is not None and not bars.empty:
+                    tick_store.seed(ticker, bars.index.as_unit('s').asi8.astype(float), bars['Close'].to_numpy())
+
+    results = {}
+    for ticker in tickers:
+        snapshot = live_bars.snapshot(ticker)
+        if snapshot:
+            snapshot["is_open"] = provider.is_market_open(ticker, now)
+            results[ticker] = snapshot
+    return results
+
+def market_states(tickers):
+    """État de séance par ticker (calendrier d'échange chargé au premier accès : à appeler hors boucle)."""
+    provider = market_data.provider
+    now = pd.Timestamp.now(tz='UTC')
+    return {ticker: provider.is_market_open(ticker, now) for ticker in tickers}
+
+async def publish_quotes(tickers, bulk_data):
+    """Diffusion ciblée et globale, uniquement ce qui a changé (+ keyframes périodiques)."""
+    batch = []
+    now = time.time()
+    for ticker in tickers:
+        data = bulk_data.get(ticker)
+        if not data or not quote_store.update(ticker, data, now):
+            continue
+
+        payload = {
+            "type": "PRICE_UPDATE",
+            "ticker": ticker,
+            "price": data.get("price"),
+            "change_pct": data.get("change_pct"),
+            "is_open": data.get("is_open", False),
+            "timestamp": now
+        }
+
+        # A. Broadcast aux abonnés de ce ticker spécifique (Graphique ouvert)
+        await bus.publish(quote_topic(ticker), payload)
+        batch.append(payload)
+
+    # B. DIFFUSION AU CANAL GLOBAL (1 seul message par fetch)
+    # Sert à mettre à jour la Sidebar ET le calcul d'Equity du Portfolio en temps réel
+    if batch:
+        await bus.publish(GLOBAL_CHANNEL, {
+            "type": "PRICE_BATCH",
+            "quotes": [{k: v for k, v in p.items() if k != "type"} for p in batch],
+            "timestamp": now
+        })
+
+async def publish_alerts(events):
+    """Alertes déclenchées -> canal global, puis horodatage en base (hors boucle)."""
+    if not events:
+        return
+    for event in events:
+        await bus.publish(GLOBAL_CHANNEL, event)
+    log(f"{len(events)} alerte(s) déclenchée(s)")
+    await db.awrite(alert_engine.persist_triggered, events)
+
+async def execute_pending_orders(prices):
+    """Ordres en attente franchis par les cotations -> exécution par lot (thread), puis canal global."""
+    fills = order_book.match(prices)
+    if not fills:
+        return
+    committed = False
+    try:
+        events = await db.awrite(order_book.execute_fills, fills)
+        committed = True
+    finally:
+        order_book.settle(fills, committed)
+    for event in events:
+        await bus.publish(GLOBAL_CHANNEL, event)
+    if events:
+        portfolio_changed.set()
+        log(f"{len(events)} ordre(s) en attente traité(s)")
+
+async def publish_portfolio():
+    """Valorisation des positions sur les cotations en cache (aucun appel réseau) -> canal global."""
+    try:
+        book = await db.aread(valuation.load_book)
+        prices = valuation.cached_prices([p["ticker"] for p in book["positions"]], fetch_missing=False)
+        await bus.publish(GLOBAL_CHANNEL, valuation.portfolio_update(valuation.value_book(book, prices)))
+    except Exception as e:
+        log(f"Erreur valorisation: {e}")
+
+async def resync_registry():
+    """Rechargement complet du registre depuis la DB (thread de lecture, hors boucle)."""
+    try:
+        await db.aread(load_registry)
+    except Exception as e:
+        log(f"Erreur registre: {e}")
+
+async def refresh_alert_indicator(ind_id):
+    """Recalcul d'un indicateur référencé par des alertes (fetch historique dans un thread)."""
+    try:
+        levels = await asyncio.to_thread(alert_engine.compute_indicator_level, ind_id)
+        await publish_alerts(alert_engine.set_indicator_level(ind_id, levels))
+    except Exception as e:
+        log(f"Erreur indicateur d'alerte {ind_id}: {e}")
+
+async def process_shard(shard, semaphore):
+    """Fetch d'un shard puis diffusion immédiate : le fan-out recouvre le fetch des shards suivants."""
+    bulk_data = {}
+    queued = time.time()
+    try:
+        async with semaphore:
+            started = time.time()
+            # Retourne { ticker: { price, change_pct, is_open } }
+            bulk_data = await asyncio.to_thread(fetch_live_quotes, shard)
+            # Bougies live (1m, 5m, 1h) uniquement pour les tickers affichés sur un graphique
+            charted = [t for t in shard if scheduler.priority.get(t) == PRIORITY_CHART]
+            candle_events = await asyncio.to_thread(candle_aggregator.update_many, charted) if charted else []
+        fetched = time.time()
+        await publish_quotes(shard, bulk_data)
+        if held_tickers.intersection(bulk_data):
+            portfolio_changed.set()
+        # Alertes : évaluation de toutes les règles du shard (recherche dichotomique par ticker)
+        prices = {t: d.get("price") for t, d in bulk_data.items()}
+        await publish_alerts(alert_engine.evaluate(prices))
+        # Ordres en attente : sommets des carnets du shard uniquement (O(log n) par exécution)
+        await execute_pending_orders(prices)
+        for event in candle_events:
+            await bus.publish(candle_topic(event["ticker"], event["resolution"]), event)
+
+        shard_stats.append({
+            "timestamp": started,
+            "size": len(shard),
+            "received": len(bulk_data),
+            "wait_ms": round((started - queued) * 1000, 1),
+            "fetch_ms": round((fetched - started) * 1000, 1),
+            "publish_ms": round((time.time() - fetched) * 1000, 1)
+        })
+    except Exception as e:
+        log(f"Erreur shard ({len(shard)} tickers): {e}")
+
+    # Replanification selon l'état de séance. Tickers sans cotation : calendrier d'échange lu dans un
+    # thread (un calendrier pas encore en cache se charge depuis le disque, jamais sur la boucle).
+    # Annulation (arrêt du worker) : pas de replanification, le scheduler est remis à zéro.
+    done = time.time()
+    missing = [t for t in shard if not bulk_data.get(t)]
+    try:
+        states = await asyncio.to_thread(market_states, missing) if missing else {}
+    except Exception as e:
+        log(f"Erreur calendrier ({len(missing)} tickers): {e}")
+        states = {}
+    for ticker in shard:
+        data = bulk_data.get(ticker)
+        scheduler.reschedule(ticker, done, data.get("is_open") if data else states.get(ticker, False))
+
+def get_shard_stats():
+    """Résumé des timings par shard (fenêtre glissante)."""
+    records = list(shard_stats)
+    if not records:
+        return {"shards": 0, "shard_size": SHARD_SIZE, "max_concurrent": MAX_CONCURRENT_FETCHES}
+
+    fetch_ms = sorted(r["fetch_ms"] for r in records)
+    return {
+        "shards": len(records),
+        "shard_size": SHARD_SIZE,
+        "max_concurrent": MAX_CONCURRENT_FETCHES,
+        "avg_size": round(sum(r["size"] for r in records) / len(records), 1),
+        "fetch_ms_avg": round(sum(fetch_ms) / len(fetch_ms), 1),
+        "fetch_ms_p95": fetch_ms[min(len(fetch_ms) - 1, int(len(fetch_ms) * 0.95))],
+        "wait_ms_avg": round(sum(r["wait_ms"] for r in records) / len(records), 1),
+        "publish_ms_avg": round(sum(r["publish_ms"] for r in records) / len(records), 1),
+        "recent": records[-10:]
+    }
+
 async def market_data_worker():
-    log("Démarrage du Thread Background (Mode Unifié Bulk)...")
-    
-    while True:
-        try:
-            start_time = time.time()
-            
-            # 1. RÉCUPÉRATION DE TOUS LES TICKERS D'INTÉRÊT
-            # On récupère :
-            # A. Ce qui est affiché sur un graphique actif (Clients WebSocket)
-            # B. Ce qui est dans les favoris (Sidebar)
-            # C. Ce qui est détenu en portefeuille (Positions -> Pour le calcul Equity)
-            
-            active_tickers = list(manager.active_tickers)
-            db_tickers = []
-            
+    log("Démarrage du Thread Background (Mode Scheduler Adaptatif, Shards Pipelinés)...")
+
+    # Registre des tickers d'intérêt : chargé une fois, puis tenu à jour par les routes
+    await resync_registry()
+    registry_version = -1
+    watchlist_tickers, position_tickers, order_tickers = set(), set(), set()
+    last_db_refresh = 0.0
+    last_registry_resync = time.time()
+    last_portfolio_push = 0.0
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    in_flight = set()
+
+    try:
+        while True:
             try:
-                with get_db() as conn:
-                    # Fetch Watchlist
-                    rows_watchlist = conn.execute("SELECT DISTINCT ticker FROM portfolio_items").fetchall()
-                    
-                    # Fetch Positions (NOUVEAU : Epic 2.2)
-                    rows_positions = conn.execute("SELECT DISTINCT ticker FROM positions").fetchall()
-                    
-                    # Merge des deux sources DB
-                    db_tickers = [r['ticker'] for r in rows_watchlist] + [r['ticker'] for r in rows_positions]
-                    
+                now = time.time()
+
+                # 1. TICKERS D'INTÉRÊT ET PRIORITÉS (en mémoire, aucune requête DB)
+                # A. Graphiques actifs (Clients WebSocket de tous les processus), lu à chaque tick
+                # B. Favoris (Sidebar), C. Positions (Equity), E. Ordres en attente : registre, relu s'il a changé
+                if interest_registry.version != registry_version:
+                    registry_version = interest_registry.version
+                    watchlist_tickers = interest_registry.tickers(WATCHLIST)
+                    position_tickers = interest_registry.tickers(POSITION)
+                    order_tickers = interest_registry.tickers(ORDER)
+                    if position_tickers != held_tickers:
+                        held_tickers.clear()
+                        held_tickers.update(position_tickers)
+                        portfolio_changed.set()
+
+                if now - last_registry_resync >= REGISTRY_RESYNC:
+                    last_registry_resync = now
+                    task = asyncio.create_task(resync_registry())
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+                # D. Règles d'alerte et contenu des ordres en attente (rechargés seulement si la table a changé)
+                if now - last_db_refresh >= UPDATE_INTERVAL or alert_engine.dirty or order_book.dirty:
+                    try:
+                        rules = await db.aread(alert_engine.fetch_rules_if_changed)
+                        if rules is not None:
+                            await publish_alerts(alert_engine.apply_rules(rules))
+                        orders = await db.aread(order_book.fetch_if_changed)
+                        if orders is not None:
+                            order_book.apply(orders)
+                    except Exception as e:
+                        log(f"Erreur DB: {e}")
+                    last_db_refresh = now
+
+                for ind_id in alert_engine.indicators_due(now):
+                    task = asyncio.create_task(refresh_alert_indicator(ind_id))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+                subscribers = bus.subscribers()
+                interest = build_interest(
+                    watchlist_tickers, position_tickers, subscribers, alert_engine.tickers(), order_tickers
+                )
+                scheduler.sync(interest, subscribers, now)
+                # Premier spectateur d'un ticker : fetch prioritaire sans attendre son échéance
+                for ticker in bus.take_bumps():
+                    scheduler.bump(ticker, now)
+                live_bars.retain(interest)
+                candle_aggregator.retain(interest)
+
+                # Valorisation du portefeuille poussée aux clients (remplace le recalcul côté navigateur)
+                if (portfolio_changed.is_set() and now - last_portfolio_push >= PORTFOLIO_PUSH_INTERVAL) \
+                        or now - last_portfolio_push >= PORTFOLIO_KEYFRAME:
+                    portfolio_changed.clear()
+                    last_portfolio_push = now
+                    task = asyncio.create_task(publish_portfolio())
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+                # 2. TICKERS ARRIVÉS À ÉCHÉANCE (cadence propre à chacun), découpés en shards
+                # Un shard lent ne bloque ni les autres shards ni les cycles suivants
+                due = scheduler.pop_due(now)
+                for i in range(0, len(due), SHARD_SIZE):
+                    task = asyncio.create_task(process_shard(due[i:i + SHARD_SIZE], semaphore))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+                await bus.wait(max(0.1, min(SCHEDULER_TICK, scheduler.next_due() - now)))
+
             except Exception as e:
-                log(f"Erreur DB: {e}")
-
-            # Union des sets pour éviter les doublons et nettoyer
-            all_tickers = list(set(active_tickers + db_tickers))
-            # Filtrage des None ou vide au cas où
-            all_tickers = [t for t in all_tickers if t]
-            
-            if not all_tickers:
-                await asyncio.sleep(1)
-                continue
-
-            #log(f"Cycle Bulk : {len(all_tickers)} tickers (Graphiques actifs : {len(active_tickers)})")
-
-            # 2. FETCH UNIQUE (1 requête pour N tickers)
-            # Cette méthode retourne { ticker: { price, change_pct, is_open } }
-            bulk_data = await asyncio.to_thread(
-                market_data.provider.fetch_bulk_1m_status, 
-                all_tickers
-            )
-
-            # 3. DIFFUSION CIBLÉE ET GLOBALE
-            for ticker in all_tickers:
-                data = bulk_data.get(ticker)
-                if not data:
-                    continue
-                
-                payload = {
-                    "type": "PRICE_UPDATE",
-                    "ticker": ticker,
-                    "price": data.get("price"),
-                    "change_pct": data.get("change_pct"),
-                    "is_open": data.get("is_open", False),
-                    "timestamp": time.time()
-                }
-
-                # A. Broadcast aux abonnés de ce ticker spécifique (Graphique ouvert)
-                await manager.broadcast(ticker, payload)
-
-                # B. DIFFUSION AU CANAL GLOBAL
-                # Sert à mettre à jour la Sidebar ET le calcul d'Equity du Portfolio en temps réel
-                await manager.broadcast_global(payload)
-
-            # 4. CALCUL DU SOMMEIL (Sync sur cycle)
-            elapsed = time.time() - start_time
-            sleep_time = max(0.1, UPDATE_INTERVAL - elapsed)
-            await asyncio.sleep(sleep_time)
-
-        except Exception as e:
-            log(f"CRITICAL ERROR: {e}")
-            await asyncio.sleep(5)
\ No newline at end of file
+                log(f"CRITICAL ERROR: {e}")
+                await asyncio.sleep(5)
+    finally:
+        # Annulé (perte de l'élection, arrêt) : shards en cours abandonnés, planning remis à zéro
+        # pour qu'un worker relancé après une réélection reparte d'un état propre
+        for task in list(in_flight):
+            task.cancel()
+        scheduler.reset()
+        held_tickers.clear()
+        portfolio_changed.clear()
@@ -0,0 +1,173 @@
+"""
+Benchmark des indicateurs et des optimiseurs (à lancer depuis backend/, aucune donnée réseau) :
+
+    python -m benchmarks.indicators                              # 1k -> 1M barres, comparaison à la référence
+    python -m benchmarks.indicators --sizes 1000,10000 --repeat 5
+    python -m benchmarks.indicators --save-baseline              # enregistre la référence de cette machine
+    python -m benchmarks.indicators --only SMA,BB,smart/sma --threshold 0.1
+
+Mesures (médiane et minimum sur --repeat exécutions) sur des séries OHLCV synthétiques avec trous
+et lignes NaN (benchmarks/synthetic.py) :
+  indicator/{ID}/{n} : noyau REGISTRY seul, sur un DataFrame déjà assaini
+  compute/{ID}/{n}   : compute_indicator de bout en bout (assainissement + calcul + sérialisation)
+  smart/{name}/{n}   : route /api/indicators/smart/* (historique journalier de n barres)
+
+Résultats écrits en JSON (--output). Code de sortie 1 si une mesure dépasse la référence (--baseline)
+de plus de --threshold (relatif) et de plus de --min-delta-ms (absolu, pour ignorer le bruit).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.models import SmartBandRequest, SmartFactorRequest, SmartPeriodRequest
+from app.routes import indicators as indicator_routes
+from app.services import market_data
+from app.services.indicators import REGISTRY, compute_indicator
+from benchmarks.synthetic import SyntheticProvider, synthetic_ohlcv
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_OUTPUT = os.path.join(RESULTS_DIR, "indicators-latest.json")
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "indicators-baseline.json")
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+# Optimiseurs : historique journalier (boucles de 20 à 100 calculs complets par requête)
+DEFAULT_SMART_SIZES = "500,2000,5000"
+
+SMART_ROUTES = {
+    "sma": (indicator_routes.smart_sma, SmartPeriodRequest),
+    "ema": (indicator_routes.smart_ema, SmartPeriodRequest),
+    "wma": (indicator_routes.smart_wma, SmartPeriodRequest),
+    "hma": (indicator_routes.smart_hma, SmartPeriodRequest),
+    "bollinger": (indicator_routes.smart_bollinger, SmartBandRequest),
+    "envelope": (indicator_routes.smart_envelope, SmartBandRequest),
+    "supertrend": (indicator_routes.smart_supertrend, SmartFactorRequest),
+}
+
+def measure(fn, repeat: int, budget: float):
+    """Durées en ms ; on s'arrête plus tôt si une exécution dépasse le budget (séries géantes)."""
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+        if timings[-1] > budget * 1000:
+            break
+    return {"median_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3), "runs": len(timings)}
+
+def prepared(df: pd.DataFrame) -> pd.DataFrame:
+    """Même assainissement que compute_indicator (index UTC trié, sans doublons)."""
+    df = df.sort_index()
+    return df[~df.index.duplicated(keep="last")]
+
+def run(args) -> dict:
+    wanted = set(args.only.split(",")) if args.only else None
+    selected = lambda name, key: wanted is None or name in wanted or key in wanted
+    results, slow = {}, set()
+
+    for n in [int(s) for s in args.sizes.split(",")]:
+        raw = synthetic_ohlcv(n, "1m", seed=args.seed)
+        df = prepared(raw)
+        for ind_id, func in REGISTRY.items():
+            for kind, fn in (("indicator", lambda: func(df, {})), ("compute", lambda: compute_indicator(ind_id, raw.copy(), {}))):
+                key = f"{kind}/{ind_id}"
+                if not selected(ind_id, key) or key in slow:
+                    continue
+                results[f"{key}/{n}"] = stats = measure(fn, args.repeat, args.budget)
+                print(f"  {key + '/' + str(n):<32} {stats['median_ms']:>11.2f} ms")
+                if stats["median_ms"] > args.budget * 1000:
+                    slow.add(key) # Tailles suivantes ignorées
+
+    provider = market_data.provider
+    try:
+        for n in [int(s) for s in args.smart_sizes.split(",")]:
+            market_data.provider = SyntheticProvider(bars=n)
+            for name, (route, request) in SMART_ROUTES.items():
+                key = f"smart/{name}"
+                if not selected(key, key) or key in slow:
+                    continue
+                results[f"{key}/{n}"] = stats = measure(lambda: route(request(ticker="BENCH")), args.repeat, args.budget)
+                print(f"  {key + '/' + str(n):<32} {stats['median_ms']:>11.2f} ms")
+                if stats["median_ms"] > args.budget * 1000:
+                    slow.add(key)
+    finally:
+        market_data.provider = provider
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float):
+    """[(clé, référence, actuel, ratio)] des mesures en régression."""
+    regressions = []
+    for key, stats in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        before, after = base["median_ms"], stats["median_ms"]
+        if after > before * (1 + threshold) and after - before > min_delta_ms:
+            regressions.append((key, before, after, after / before))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des indicateurs et optimiseurs")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="tailles de séries (barres 1m)")
+    parser.add_argument("--smart-sizes", default=DEFAULT_SMART_SIZES, help="tailles d'historique des optimiseurs (barres 1d)")
+    parser.add_argument("--only", help="IDs REGISTRY ou clés (ex: SMA,compute/BB,smart/hma)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=30.0, help="s max par exécution avant d'ignorer les tailles suivantes")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="écrit aussi les résultats comme nouvelle référence")
+    parser.add_argument("--threshold", type=float, default=0.25, help="régression relative tolérée (0.25 = +25 %%)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="écart absolu en deçà duquel on ignore")
+    args = parser.parse_args()
+
+    print(f"Benchmark indicateurs : séries {args.sizes}, optimiseurs {args.smart_sizes}, {args.repeat} exécution(s)")
+    results = run(args)
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed
+        },
+        "results": results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Résultats : {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Référence enregistrée : {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Pas de référence (--save-baseline pour en créer une) : aucune comparaison")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    compared = sum(1 for key in results if key in baseline)
+    if not regressions:
+        print(f"OK : {compared} mesure(s) comparée(s), aucune régression au-delà de {args.threshold:.0%}")
+        return 0
+    print(f"RÉGRESSION : {len(regressions)} / {compared} mesure(s) au-delà de {args.threshold:.0%}")
+    for key, before, after, ratio in sorted(regressions, key=lambda r: -r[3]):
+        print(f"  {key:<32} {before:>10.2f} ms -> {after:>10.2f} ms  (x{ratio:.2f})")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
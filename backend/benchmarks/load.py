@@ -0,0 +1,290 @@
+"""
+Test de charge HTTP + WebSocket de bout en bout (à lancer depuis backend/, aucune donnée réseau) :
+
+    python -m benchmarks.load                                       # 50 graphiques, 10 globaux, 30 s
+    python -m benchmarks.load --ticker-clients 500 --global-clients 50 --tickers 100 --duration 60
+    python -m benchmarks.load --snapshot-rate 20 --indicator-rate 20 --portfolio-rate 10 --order-rate 5
+    python -m benchmarks.load --output /tmp/load.json
+
+Le serveur (main:app sous uvicorn, worker compris) tourne dans un sous-processus, sur une base
+temporaire, avec SyntheticProvider à la place de yfinance (--provider-latency simule le réseau).
+Le pilote ouvre les clients /ws/{ticker} et /ws/global puis envoie les requêtes HTTP en boucle
+ouverte (cadence fixe : une requête lente ne retarde pas les suivantes). Rapport :
+  - latence p50 / p90 / p99 / max par route, erreurs, débit obtenu ;
+  - latence cotation -> client (horodatage du worker -> réception) par type de flux ;
+  - temps de cycle du worker (fetch et diffusion par shard, via /api/system/worker).
+Les mesures du pilote partagent sa boucle asyncio : au-delà de quelques milliers de sockets,
+lancer plusieurs pilotes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- SERVEUR (sous-processus) ---
+
+def serve(args):
+    from app import database
+    from app.services import market_data
+    from benchmarks.synthetic import SyntheticProvider
+
+    database.DB_NAME = args.db
+    market_data.provider = SyntheticProvider(bars=args.bars, intraday_bars=args.intraday_bars, latency=args.provider_latency)
+
+    import uvicorn
+    import main # init_db() à l'import, sur la base temporaire
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(args, workdir: str):
+    port = free_port()
+    log_path = os.path.join(workdir, "server.log")
+    command = [
+        sys.executable, "-m", "benchmarks.load", "--serve", "--port", str(port),
+        "--db", os.path.join(workdir, "load.db"), "--provider-latency", str(args.provider_latency),
+        "--bars", str(args.bars), "--intraday-bars", str(args.intraday_bars)
+    ]
+    log = open(log_path, "w")
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT)
+    return process, port, log_path
+
+async def wait_ready(base: str, process, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient(base_url=base) as client:
+        while time.time() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("Le serveur s'est arrêté au démarrage")
+            try:
+                if (await client.get("/api/system/worker")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Serveur non prêt")
+
+# --- MESURES ---
+
+class Recorder:
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, name: str, seconds: float):
+        self.latencies.setdefault(name, []).append(seconds * 1000)
+
+    def error(self, name: str, reason: str):
+        self.errors.setdefault(name, {}).setdefault(reason, 0)
+        self.errors[name][reason] += 1
+
+    def summary(self, duration: float) -> dict:
+        out = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            ms = np.array(self.latencies.get(name, []))
+            out[name] = {
+                "count": len(ms),
+                "rate": round(len(ms) / duration, 1),
+                "errors": self.errors.get(name, {}),
+                **({
+                    "p50_ms": round(float(np.percentile(ms, 50)), 2),
+                    "p90_ms": round(float(np.percentile(ms, 90)), 2),
+                    "p99_ms": round(float(np.percentile(ms, 99)), 2),
+                    "max_ms": round(float(ms.max()), 2)
+                } if len(ms) else {})
+            }
+        return out
+
+# --- CLIENTS WEBSOCKET ---
+
+async def ws_client(url: str, recorder: Recorder, stop: asyncio.Event, connected: list):
+    """Latence cotation -> client : réception - horodatage de publication par le worker."""
+    name = "ws/global" if url.endswith("/ws/global") else "ws/ticker"
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=30) as ws:
+            connected.append(url)
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = time.time()
+                msg = json.loads(raw)
+                kind = msg.get("type")
+                if kind in ("PRICE_UPDATE", "PRICE_BATCH", "PORTFOLIO_UPDATE") and msg.get("timestamp"):
+                    recorder.add(f"{name} {kind}", received - msg["timestamp"])
+    except Exception as e:
+        recorder.error(name, type(e).__name__)
+
+# --- CHARGE HTTP (boucle ouverte) ---
+
+async def open_loop(name: str, rate: float, request, recorder: Recorder, stop: asyncio.Event):
+    """`rate` requêtes/s à cadence fixe, chacune dans sa propre tâche."""
+    if rate <= 0:
+        return
+    pending = set()
+
+    async def one():
+        t0 = time.perf_counter()
+        try:
+            response = await request()
+            if response.status_code >= 400:
+                recorder.error(name, f"HTTP {response.status_code}")
+            else:
+                recorder.add(name, time.perf_counter() - t0)
+        except Exception as e:
+            recorder.error(name, type(e).__name__)
+
+    interval, next_at = 1.0 / rate, time.perf_counter()
+    while not stop.is_set():
+        task = asyncio.create_task(one())
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+    if pending:
+        await asyncio.wait(pending, timeout=30)
+
+async def setup(client: httpx.AsyncClient, tickers, args) -> dict:
+    """Favoris, indicateurs sauvegardés et positions de départ."""
+    folder = (await client.post("/api/watchlists/", json={"name": f"load-{int(time.time())}"})).json()["id"]
+    indicators = {}
+    for i, ticker in enumerate(tickers):
+        await client.post(f"/api/watchlists/{folder}/items", json={"ticker": ticker})
+        kind, resolution = (("SMA", "1d"), ("BB", "1h"), ("SUPERT", "5m"))[i % 3]
+        saved = await client.post("/api/indicators/", json={
+            "ticker": ticker, "type": kind, "name": kind, "params": {}, "style": {}, "resolution": resolution
+        })
+        indicators[ticker] = saved.json()["id"]
+    for ticker in tickers[:args.positions]:
+        await client.post("/api/portfolio/order", json={"ticker": ticker, "action": "BUY", "quantity": 10})
+    return indicators
+
+async def drive(args, base: str) -> dict:
+    ws_base = base.replace("http://", "ws://")
+    tickers = [f"SYN{i:03d}" for i in range(args.tickers)]
+    recorder = Recorder()
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+
+    async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+        indicators = await setup(client, tickers, args)
+
+        connected = []
+        urls = [f"{ws_base}/ws/{tickers[i % len(tickers)]}" for i in range(args.ticker_clients)] \
+            + [f"{ws_base}/ws/global"] * args.global_clients
+        ws_tasks = []
+        for i, url in enumerate(urls):
+            ws_tasks.append(asyncio.create_task(ws_client(url, recorder, stop, connected)))
+            if i % 50 == 49:
+                await asyncio.sleep(0.05) # Montée en charge progressive
+        await asyncio.sleep(1)
+
+        portfolio_routes = ["/api/portfolio/summary", "/api/portfolio/positions", "/api/portfolio/history?limit=50"]
+        ticker = lambda: random.choice(tickers)
+        loads = [
+            ("GET /api/snapshot", args.snapshot_rate, lambda: client.get(f"/api/snapshot/{ticker()}", params={"period": "1mo"})),
+            ("GET /api/indicators/calculate", args.indicator_rate,
+             lambda: (lambda t: client.get(f"/api/indicators/{t}/calculate/{indicators[t]}"))(ticker())),
+            ("GET /api/portfolio/*", args.portfolio_rate, lambda: client.get(random.choice(portfolio_routes))),
+            ("GET /api/watchlists/sidebar", args.sidebar_rate, lambda: client.get("/api/watchlists/sidebar")),
+            ("POST /api/portfolio/order", args.order_rate, lambda: client.post("/api/portfolio/order", json={
+                "ticker": ticker(), "action": random.choice(("BUY", "SELL")), "quantity": 1
+            })),
+        ]
+        print(f"Charge : {len(connected)}/{len(urls)} WebSocket connectés, {args.duration} s ...")
+        started = time.time()
+        http_tasks = [asyncio.create_task(open_loop(name, rate, request, recorder, stop)) for name, rate, request in loads]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        elapsed = time.time() - started
+        await asyncio.gather(*http_tasks)
+        await asyncio.gather(*ws_tasks)
+
+        worker = (await client.get("/api/system/worker")).json()
+
+    # Rejet d'un ordre (vente sans position, fonds) : réponse métier attendue, pas une erreur de charge
+    order_errors = recorder.errors.get("POST /api/portfolio/order", {})
+    rejected = order_errors.pop("HTTP 400", 0)
+    report = {"config": vars(args), "duration_s": round(elapsed, 1), "connected_ws": len(connected),
+              "results": recorder.summary(elapsed), "orders_rejected": rejected, "worker": worker}
+    report["config"].pop("serve", None)
+    return report
+
+def print_report(report: dict):
+    print(f"\n{'mesure':<34} {'n':>7} {'/s':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}  erreurs")
+    for name, r in report["results"].items():
+        cells = "".join(f"{r.get(k, float('nan')):>10.2f}" for k in ("p50_ms", "p90_ms", "p99_ms", "max_ms"))
+        print(f"{name:<34} {r['count']:>7} {r['rate']:>7.1f}{cells}  {r['errors'] or ''}")
+    if report["orders_rejected"]:
+        print(f"(ordres rejetés par les règles du compte : {report['orders_rejected']})")
+
+    worker = report["worker"]
+    if worker.get("shards"):
+        print(f"\nWorker : {worker['shards']} shard(s), taille moyenne {worker['avg_size']}, "
+              f"fetch moyen {worker['fetch_ms_avg']} ms (p95 {worker['fetch_ms_p95']} ms), "
+              f"attente sémaphore {worker['wait_ms_avg']} ms, diffusion {worker['publish_ms_avg']} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge HTTP + WebSocket")
+    parser.add_argument("--ticker-clients", type=int, default=50, help="clients /ws/{ticker}")
+    parser.add_argument("--global-clients", type=int, default=10, help="clients /ws/global")
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--positions", type=int, default=5, help="tickers achetés au démarrage")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--snapshot-rate", type=float, default=5.0, help="requêtes/s")
+    parser.add_argument("--indicator-rate", type=float, default=5.0)
+    parser.add_argument("--portfolio-rate", type=float, default=5.0)
+    parser.add_argument("--sidebar-rate", type=float, default=1.0)
+    parser.add_argument("--order-rate", type=float, default=0.0)
+    parser.add_argument("--max-connections", type=int, default=100, help="connexions HTTP simultanées du pilote")
+    parser.add_argument("--provider-latency", type=float, default=0.05, help="s par appel au provider synthétique")
+    parser.add_argument("--bars", type=int, default=500, help="barres journalières par ticker")
+    parser.add_argument("--intraday-bars", type=int, default=2000, help="barres intraday par ticker")
+    parser.add_argument("--output", help="rapport JSON")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+
+    workdir = tempfile.mkdtemp(prefix="dtrade-load-")
+    process, port, log_path = start_server(args, workdir)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_ready(base, process))
+        report = asyncio.run(drive(args, base))
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    print_report(report)
+    print(f"\nJournal serveur : {log_path}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Rapport : {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Débit d'exécution des ordres au marché (à lancer depuis backend/, aucune donnée réseau) :
+
+    python -m benchmarks.orders                         # 20 000 ordres, 32 clients
+    python -m benchmarks.orders --orders 50000 --clients 64
+
+Base temporaire (market.db n'est pas touchée). Compare :
+  - direct   : portfolio_service.execute_order, une tâche du thread écrivain par ordre (lectures et SAVEPOINT propres) ;
+  - pipeline : order_pipeline, les ordres d'un même lot validés ensemble en mémoire (une lecture, une écriture groupée).
+Dans les deux cas, N clients concurrents attendent chacun leur résultat (comme autant de requêtes POST /order).
+Vérifie ensuite la cohérence (solde, positions et agrégats contre l'historique rejoué) et l'idempotence.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from fastapi import HTTPException
+
+from app import database
+from app.database import get_db, init_db
+from app.models import CashOperationRequest, OrderRequest
+from app.services import portfolio_service
+from app.services.order_pipeline import order_pipeline
+
+TICKERS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOG", "META", "TSLA", "AMD"]
+
+def make_orders(n: int, seed: int):
+    """Flux aléatoire, majorité d'achats pour que les ventes trouvent (le plus souvent) une position."""
+    rng = random.Random(seed)
+    return [(
+        OrderRequest(ticker=rng.choice(TICKERS), action="BUY" if rng.random() < 0.6 else "SELL", quantity=rng.randint(1, 10)),
+        round(rng.uniform(50, 500), 2)
+    ) for _ in range(n)]
+
+def run_clients(orders, clients: int, execute):
+    """`clients` threads concurrents, chacun attend le résultat de son ordre avant le suivant."""
+    latencies, rejected = [], [0]
+    lock = threading.Lock()
+
+    def client(chunk, prefix):
+        local, local_rejected = [], 0
+        for i, (order, price) in enumerate(chunk):
+            t0 = time.perf_counter()
+            try:
+                execute(order, price, f"{prefix}-{i}")
+            except HTTPException:
+                local_rejected += 1
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            rejected[0] += local_rejected
+
+    threads = [threading.Thread(target=client, args=(orders[c::clients], f"bench-{c}")) for c in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, rejected[0]
+
+def direct(order, price, key):
+    return portfolio_service.execute_order(order, price)
+
+def report(name: str, latencies, rejected: int, elapsed: float):
+    ms = np.array(latencies) * 1000
+    print(f"{name:<9} {len(latencies):>7} ordres  {len(latencies) / elapsed:>9.0f} ordres/s  "
+          f"p50 {np.percentile(ms, 50):6.2f} ms  p99 {np.percentile(ms, 99):7.2f} ms  rejetés {rejected}")
+
+def check_consistency() -> bool:
+    """Solde et positions rejoués depuis transactions == état stocké ; agrégats sans écart."""
+    with get_db() as conn:
+        balance = conn.execute("SELECT balance FROM accounts LIMIT 1").fetchone()[0]
+        stored = {r["ticker"]: r["quantity"] for r in conn.execute("SELECT ticker, quantity FROM positions")}
+        cash, holdings = 0.0, {}
+        for r in conn.execute("SELECT ticker, type, quantity, total_amount FROM transactions ORDER BY id"):
+            sign = {"DEPOSIT": 1, "WITHDRAW": -1, "BUY": -1, "SELL": 1}.get(r["type"], 0)
+            cash += sign * (r["total_amount"] or 0.0)
+            if r["type"] in ("BUY", "SELL"):
+                holdings[r["ticker"]] = holdings.get(r["ticker"], 0.0) + (r["quantity"] if r["type"] == "BUY" else -r["quantity"])
+        drift = portfolio_service.rebuild_stats(conn, write=False)["drift"]
+    holdings = {t: q for t, q in holdings.items() if q > portfolio_service.QTY_EPSILON}
+    ok = abs(cash - balance) < 1e-4 and holdings.keys() == stored.keys() \
+        and all(abs(holdings[t] - stored[t]) < 1e-6 for t in stored) and not drift
+    print(f"cohérence : {'OK' if ok else 'ÉCART'} (solde {balance:,.2f}, rejoué {cash:,.2f}, agrégats {drift or 'OK'})")
+    return ok
+
+def check_idempotency() -> bool:
+    """Une clé rejouée (même concurremment) n'exécute l'ordre qu'une fois."""
+    order = OrderRequest(ticker="AAPL", action="BUY", quantity=1)
+    with get_db() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    futures = [order_pipeline.submit(order, 100.0, "bench-idem") for _ in range(10)]
+    results = [f.result() for f in futures] + [order_pipeline.execute(order, 100.0, "bench-idem")]
+    with get_db() as conn:
+        after = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    try:
+        order_pipeline.execute(OrderRequest(ticker="AAPL", action="SELL", quantity=1), 100.0, "bench-idem")
+        conflict = False
+    except HTTPException as e:
+        conflict = e.status_code == 409
+    ok = after - before == 1 and all(r == results[0] for r in results) and conflict
+    print(f"idempotence : {'OK' if ok else 'ÉCHEC'} (11 envois, {after - before} exécution, clé réutilisée -> 409 : {conflict})")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark d'exécution des ordres")
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--direct", type=int, default=2000, help="ordres de la référence (une tâche d'écriture par ordre)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dtrade-bench-")
+    database.DB_NAME = os.path.join(workdir, "bench.db")
+    init_db()
+    portfolio_service.manage_cash(CashOperationRequest(type="DEPOSIT", amount=1e12))
+
+    orders = make_orders(args.orders + args.direct, args.seed)
+
+    for name, batch, execute in (("direct", orders[:args.direct], direct), ("pipeline", orders[args.direct:], order_pipeline.execute)):
+        t0 = time.perf_counter()
+        latencies, rejected = run_clients(batch, args.clients, execute)
+        report(name, latencies, rejected, time.perf_counter() - t0)
+
+    ok = check_consistency() and check_idempotency()
+    database.db.close()
+    database.pool.close_all()
+    print(f"base : {database.DB_NAME}")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Données de marché synthétiques pour les benchmarks et tests de charge (aucun accès réseau).
+
+synthetic_ohlcv() : série OHLCV réaliste (marche aléatoire log-normale) avec des trous dans
+l'horodatage (week-ends, suspensions) et des lignes NaN, comme en renvoie yfinance.
+SyntheticProvider : remplace market_data.provider ; séries déterministes par ticker, mises en cache
+pour que la génération ne soit pas comptée dans les mesures.
+"""
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.providers.base import MarketDataProvider
+
+FREQ = {"1m": "1min", "2m": "2min", "5m": "5min", "15m": "15min", "30m": "30min", "60m": "1h", "1h": "1h",
+        "1d": "1D", "1wk": "7D", "1mo": "30D"}
+DAILY_INTERVALS = ("1d", "1wk", "1mo")
+
+def synthetic_ohlcv(n: int, interval: str = "1d", seed: int = 0, gap_ratio: float = 0.002,
+                    nan_ratio: float = 0.001, end: Optional[pd.Timestamp] = None, start_price: float = 100.0) -> pd.DataFrame:
+    """n barres se terminant à `end` (maintenant par défaut), index DatetimeIndex UTC."""
+    rng = np.random.default_rng(seed)
+    step = pd.Timedelta(FREQ[interval])
+
+    # Horodatage : pas réguliers, sauf quelques trous de 2 à 50 barres
+    steps = np.ones(n, dtype=np.int64)
+    gaps = rng.random(n) < gap_ratio
+    steps[gaps] = rng.integers(2, 50, gaps.sum())
+    steps[0] = 0
+    end = (end if end is not None else pd.Timestamp.now(tz="UTC")).floor(step)
+    offsets = np.cumsum(steps) - steps.sum()
+    index = pd.to_datetime(end.value + offsets * step.value, utc=True)
+    index.name = "Date" if interval in DAILY_INTERVALS else "Datetime"
+
+    # Prix : marche aléatoire, volatilité par barre proportionnelle à la racine du pas
+    sigma = 0.02 * np.sqrt(step / pd.Timedelta("1D"))
+    close = start_price * np.exp(np.cumsum(rng.normal(0, sigma, n)))
+    open_ = np.concatenate(([start_price], close[:-1])) * (1 + rng.normal(0, sigma / 4, n))
+    wick = np.abs(rng.normal(0, sigma / 2, (2, n)))
+    df = pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) * (1 + wick[0]),
+        "Low": np.minimum(open_, close) * (1 - wick[1]),
+        "Close": close,
+        "Volume": rng.lognormal(10, 1, n).round()
+    }, index=index)
+
+    # Lignes vides (barres sans échange)
+    holes = rng.random(n) < nan_ratio
+    df.loc[holes] = np.nan
+    return df
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    Provider en mémoire : `bars` barres journalières / `intraday_bars` barres intraday par ticker.
+    Cotations live : marche aléatoire avancée à chaque fetch 1m (le worker voit les prix bouger) ;
+    `latency` simule la durée d'un appel réseau.
+    """
+
+    def __init__(self, bars: int = 1000, intraday_bars: int = 780, latency: float = 0.0, tick_volatility: float = 0.0005):
+        self.bars = bars
+        self.intraday_bars = intraday_bars
+        self.latency = latency
+        self.tick_volatility = tick_volatility
+        self._series: Dict[Tuple[str, str, int], pd.DataFrame] = {}
+        self._live: Dict[str, float] = {}
+        self._rng = np.random.default_rng(0)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _seed(ticker: str) -> int:
+        return zlib.crc32(ticker.encode())
+
+    def series(self, ticker: str, interval: str, n: int) -> pd.DataFrame:
+        key = (ticker, interval, n)
+        if key not in self._series:
+            self._series[key] = synthetic_ohlcv(n, interval, seed=self._seed(ticker))
+        return self._series[key]
+
+    def _tick(self, ticker: str) -> float:
+        with self._lock:
+            price = self._live.get(ticker)
+            if price is None:
+                price = float(self.series(ticker, "1m", self.intraday_bars)["Close"].dropna().iloc[-1])
+            price *= 1 + self._rng.normal(0, self.tick_volatility)
+            self._live[ticker] = price
+            return price
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    # --- INTERFACE PROVIDER ---
+    def fetch_history(self, ticker: str, period: str, interval: str) -> pd.DataFrame:
+        self._wait()
+        n = self.bars if interval in DAILY_INTERVALS else self.intraday_bars
+        return self.series(ticker, interval, n).copy()
+
+    def fetch_info(self, ticker: str) -> dict:
+        return {"symbol": ticker, "shortName": f"{ticker} Synthetic", "currency": "USD", "exchange": "XNYS"}
+
+    def is_market_open(self, ticker: str, now=None) -> bool:
+        return True
+
+    def fetch_live_price(self, ticker: str) -> dict:
+        self._wait()
+        price = self._live.get(ticker) or self._tick(ticker)
+        return {"price": round(price, 2), "change_pct": 0.0, "is_open": True, "next_event": None, "exchange": "XNYS"}
+
+    def fetch_bulk_1m_bars(self, tickers: list, start: pd.Timestamp = None) -> dict:
+        """Fenêtre complète (start=None) ou seulement la barre en cours, clôturée au nouveau prix."""
+        self._wait()
+        now = pd.Timestamp.now(tz="UTC").floor("1min")
+        frames = {}
+        for ticker in tickers:
+            price = self._tick(ticker)
+            bar = pd.DataFrame({"Open": price, "High": price, "Low": price, "Close": price, "Volume": 100.0},
+                               index=pd.DatetimeIndex([now], name="Datetime"))
+            if start is None:
+                history = self.series(ticker, "1m", self.intraday_bars).dropna(subset=["Close"])
+                bar = pd.concat([history[history.index < now], bar])
+            frames[ticker] = bar
+        return frames
+
+    def fetch_bulk_1m_status(self, tickers: list) -> dict:
+        self._wait()
+        return {t: {"price": round(self._tick(t), 2), "change_pct": 0.0, "is_open": True} for t in tickers}
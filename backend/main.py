@@ -1,11 +1,12 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio
 
-from app.database import init_db
-from app.routes import market, indicators, watchlist, portfolio
-from app.websockets import manager
+from app.database import init_db, pool, db
+from app.routes import market, indicators, watchlist, portfolio, alerts
+from app.websockets import manager, log
 from app.worker import market_data_worker
+from app.pubsub import bus
+from app import streams
 
 app = FastAPI()
 
@@ -24,8 +25,24 @@ app.include_router(market.router)
 app.include_router(indicators.router)
 app.include_router(watchlist.router)
 app.include_router(portfolio.router)
+app.include_router(alerts.router)
 
 # --- WEBSOCKETS ---
+@app.websocket("/ws")
+async def multiplexed_websocket_endpoint(websocket: WebSocket):
+    # Connexion unique : abonnements/désabonnements aux topics envoyés par le client
+    session = await manager.accept(websocket)
+    try:
+        while True:
+            await streams.handle_message(session, await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        # Bug côté serveur (handle_message...) : tracé avant de libérer la session
+        log(f"/ws : erreur inattendue, déconnexion ({e!r})")
+    finally:
+        streams.disconnect(session)
+
 @app.websocket("/ws/global")
 async def global_websocket_endpoint(websocket: WebSocket):
     await manager.connect_global(websocket)
@@ -33,6 +50,10 @@ async def global_websocket_endpoint(websocket: WebSocket):
         while True:
             await websocket.receive_text() # Keep alive
     except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        log(f"/ws/global : erreur inattendue, déconnexion ({e!r})")
+    finally:
         manager.disconnect_global(websocket)
 
 @app.websocket("/ws/{ticker}")
@@ -41,13 +62,24 @@ async def websocket_endpoint(websocket: WebSocket, ticker: str):
     try:
         while True:
             await websocket.receive_text()
-    except Exception:
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        log(f"/ws/{ticker} : erreur inattendue, déconnexion ({e!r})")
+    finally:
         manager.disconnect(websocket, ticker)
 
 @app.on_event("startup")
 async def startup_event():
-    # Lancement du worker en arrière-plan
-    asyncio.create_task(market_data_worker())
+    # Lancement du worker en arrière-plan, uniquement dans le processus élu poller
+    # (les autres processus uvicorn reçoivent les événements via le bus)
+    await bus.start(on_leader=market_data_worker)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await bus.stop() # Worker, écoute et rapports d'intérêt annulés
+    db.close() # Écritures en file commitées avant la fermeture des connexions
+    pool.close_all()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,41 @@
+"""
+Commandes d'administration (à lancer depuis backend/, à côté de market.db).
+
+    python manage.py rebuild-stats          # recalcule portfolio_stats depuis transactions
+    python manage.py rebuild-stats --check  # compare seulement (code de sortie 1 si écart)
+"""
+import argparse
+import sys
+
+from app.database import db, init_db
+from app.services import portfolio_service
+
+def rebuild_stats(check: bool) -> int:
+    # Via le thread écrivain : BEGIN IMMEDIATE, un ordre concurrent ne peut pas être écrasé par le rejeu
+    report = db.write(portfolio_service.rebuild_stats, not check).result()
+    db.close()
+
+    print(f"Stocké   : {report['stored']}")
+    print(f"Recalculé: {report['rebuilt']}")
+    if not report["drift"]:
+        print("OK : agrégats cohérents avec l'historique")
+        return 0
+    print(f"ÉCART    : {report['drift']}")
+    if check:
+        return 1
+    print("Agrégats remplacés par les valeurs recalculées")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="DTrade backend - administration")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild-stats", help="Recalcul des agrégats du portefeuille")
+    rebuild.add_argument("--check", action="store_true", help="Vérifie sans écrire")
+
+    args = parser.parse_args()
+    init_db()
+    if args.command == "rebuild-stats":
+        sys.exit(rebuild_stats(args.check))
+
+if __name__ == "__main__":
+    main()
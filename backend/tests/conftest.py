@@ -0,0 +1,18 @@
+import os
+import sys
+
+# Les tests importent `app` comme main.py : depuis backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import database
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Base vide dans un répertoire temporaire (le pool ne doit pas resservir une autre base)."""
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "test.db"))
+    database.pool.close_all()
+    database.init_db()
+    yield
+    database.pool.close_all()
@@ -0,0 +1,85 @@
+from app.services.alerts import AlertEngine
+
+def rule(rid, level=None, kind="PRICE_CROSS", direction="BOTH", repeat=False, ticker="AAPL", **extra):
+    return {
+        "id": rid, "ticker": ticker, "kind": kind, "direction": direction, "level": level,
+        "base_price": None, "indicator_id": None, "indicator_resolution": None,
+        "repeat": int(repeat), "note": None, **extra
+    }
+
+def engine(*rules):
+    alerts = AlertEngine()
+    alerts.apply_rules(list(rules))
+    return alerts
+
+def fired(events):
+    return sorted((e["id"], e["direction"]) for e in events)
+
+def test_first_price_only_sets_the_boundary():
+    alerts = engine(rule(1, 100.0))
+    assert alerts.evaluate({"AAPL": 105.0}) == []
+
+def test_cross_respects_direction():
+    alerts = engine(rule(1, 100.0, direction="UP", repeat=True), rule(2, 100.0, direction="DOWN", repeat=True))
+    alerts.evaluate({"AAPL": 99.0})
+    assert fired(alerts.evaluate({"AAPL": 101.0})) == [(1, "UP")]
+    assert fired(alerts.evaluate({"AAPL": 99.0})) == [(2, "DOWN")]
+
+def test_every_level_between_two_prices_fires():
+    alerts = engine(rule(1, 101.0), rule(2, 102.0), rule(3, 103.0), rule(4, 110.0), rule(5, 102.5, direction="DOWN"))
+    alerts.evaluate({"AAPL": 100.0})
+    assert fired(alerts.evaluate({"AAPL": 104.0})) == [(1, "UP"), (2, "UP"), (3, "UP")]
+
+def test_level_equal_to_price_counts_as_crossed():
+    alerts = engine(rule(1, 100.0, direction="UP"))
+    alerts.evaluate({"AAPL": 99.0})
+    assert fired(alerts.evaluate({"AAPL": 100.0})) == [(1, "UP")]
+
+def test_one_shot_rule_is_retired_after_firing():
+    alerts = engine(rule(1, 100.0))
+    alerts.evaluate({"AAPL": 99.0})
+    assert fired(alerts.evaluate({"AAPL": 101.0})) == [(1, "UP")]
+    assert 1 not in alerts.rules and "AAPL" not in alerts.index
+    assert alerts.evaluate({"AAPL": 99.0}) == []
+
+def test_repeat_rule_fires_each_cross():
+    alerts = engine(rule(1, 100.0, repeat=True))
+    alerts.evaluate({"AAPL": 99.0})
+    assert fired(alerts.evaluate({"AAPL": 101.0})) == [(1, "UP")]
+    assert fired(alerts.evaluate({"AAPL": 98.0})) == [(1, "DOWN")]
+
+def test_pct_move_builds_both_thresholds():
+    alerts = engine(rule(1, 5.0, kind="PCT_MOVE", base_price=100.0))
+    alerts.evaluate({"AAPL": 100.0})
+    assert alerts.evaluate({"AAPL": 104.0}) == []
+    events = alerts.evaluate({"AAPL": 94.0})
+    assert fired(events) == [(1, "DOWN")] and events[0]["level"] == 95.0
+
+def test_tickers_are_independent():
+    alerts = engine(rule(1, 100.0, ticker="AAPL"), rule(2, 50.0, ticker="MSFT"))
+    alerts.evaluate({"AAPL": 99.0, "MSFT": 49.0})
+    assert fired(alerts.evaluate({"AAPL": 101.0, "MSFT": 48.0})) == [(1, "UP")]
+
+def test_moving_indicator_level_past_a_still_price_fires():
+    alerts = engine(rule(1, kind="INDICATOR_CROSS", indicator_id=7))
+    assert alerts.set_indicator_level(7, {"value": 90.0}) == []
+    alerts.evaluate({"AAPL": 100.0})
+    # Le prix ne bouge pas, l'indicateur passe au-dessus : le prix a franchi le seuil à la baisse
+    assert fired(alerts.set_indicator_level(7, {"value": 105.0})) == [(1, "DOWN")]
+
+def test_band_breakout_uses_the_band_for_its_direction():
+    alerts = engine(rule(1, kind="BAND_BREAKOUT", indicator_id=3, repeat=True))
+    alerts.set_indicator_level(3, {"upper": 110.0, "basis": 100.0, "lower": 90.0})
+    alerts.evaluate({"AAPL": 100.0})
+    events = alerts.evaluate({"AAPL": 111.0})
+    assert fired(events) == [(1, "UP")] and events[0]["band"] == "upper"
+    events = alerts.evaluate({"AAPL": 89.0})
+    assert fired(events) == [(1, "DOWN")] and events[0]["band"] == "lower"
+
+def test_settle_keeps_one_event_per_rule():
+    alerts = engine(rule(1, 100.0, repeat=True), rule(2, 120.0))
+    alerts.evaluate({"AAPL": 110.0})
+    events = [alerts._event(1, None, 100.0, 99.0, -1), alerts._event(1, None, 100.0, 99.0, -1), alerts._event(2, None, 120.0, 121.0, 1)]
+    assert fired(alerts._settle(events)) == [(1, "DOWN"), (2, "UP")]
+    # Règle 2 non répétable : retirée, l'index du ticker ne garde que la règle 1
+    assert set(alerts.rules) == {1} and alerts.index["AAPL"].rule_ids.tolist() == [1]
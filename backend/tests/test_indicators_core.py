@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import sensitivity
+from app.services.indicators.core import calc_atr, calc_atr_multi, calc_ema, calc_ema_multi
+
+# EMA 3 et ATR 2 : alpha = 0.5 exactement (règle particulière de pandas pendant les trous)
+PERIODS = [2, 3, 5, 14, 30]
+
+def ohlc(n=300, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    df = pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.002, n)),
+        "High": close * (1 + np.abs(rng.normal(0, 0.005, n))),
+        "Low": close * (1 - np.abs(rng.normal(0, 0.005, n))),
+        "Close": close
+    })
+    # Trous : NaN en tête, isolés et en rafale
+    df.iloc[:3] = np.nan
+    df.iloc[[40, 41, 42, 100, 250]] = np.nan
+    return df
+
+def test_ema_multi_matches_calc_ema_with_nans():
+    close = ohlc()["Close"]
+    batched = calc_ema_multi(close, PERIODS)
+    for row, period in zip(batched, PERIODS):
+        np.testing.assert_allclose(row, calc_ema(close, period).to_numpy(), rtol=1e-12, atol=1e-12, equal_nan=True)
+
+def test_atr_multi_matches_calc_atr_with_nans():
+    df = ohlc()
+    batched = calc_atr_multi(df, PERIODS)
+    for row, period in zip(batched, PERIODS):
+        np.testing.assert_allclose(row, calc_atr(df, period).to_numpy(), rtol=1e-12, atol=1e-12, equal_nan=True)
+
+def test_optional_grid_all_or_nothing():
+    assert sensitivity.build_optional_grid(None, None, None, sensitivity.MAX_MULTIPLIERS, "mult") is None
+    grid = sensitivity.build_optional_grid(1.0, 2.0, 0.5, sensitivity.MAX_MULTIPLIERS, "mult")
+    np.testing.assert_allclose(grid, [1.0, 1.5, 2.0])
+    with pytest.raises(ValueError):
+        sensitivity.build_optional_grid(1.0, None, None, sensitivity.MAX_MULTIPLIERS, "mult")
+
+def test_grid_size_is_checked_before_allocation():
+    np.testing.assert_array_equal(sensitivity.build_grid(5, 20, 5, sensitivity.MAX_PERIODS), [5, 10, 15, 20])
+    np.testing.assert_allclose(sensitivity.build_grid(0.0, 1.0, 0.6, sensitivity.MAX_MULTIPLIERS), [0.0, 0.6])
+    with pytest.raises(ValueError):
+        sensitivity.build_grid(5, 10**13, 1, sensitivity.MAX_PERIODS)
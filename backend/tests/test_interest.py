@@ -0,0 +1,39 @@
+from app.database import get_db
+from app.services import interest
+from app.services.interest import InterestRegistry, WATCHLIST, POSITION
+
+def test_full_reload_keeps_updates_applied_after_its_read():
+    registry = InterestRegistry()
+    registry.apply(WATCHLIST, {"AAPL": 1, "MSFT": 1}, replace=True)
+    since = registry.seq
+    # Commits postérieurs à la lecture de l'instantané, appliqués avant lui
+    registry.apply(WATCHLIST, {"NVDA": 1})
+    registry.apply(WATCHLIST, {"MSFT": 0})
+    registry.apply(WATCHLIST, {"AAPL": 1, "MSFT": 1, "TSLA": 0}, replace=True, since=since)
+    assert registry.tickers(WATCHLIST) == {"AAPL", "NVDA"}
+    # Le rechargement suivant ne protège plus ces tickers
+    registry.apply(WATCHLIST, {"AAPL": 1}, replace=True, since=registry.seq)
+    assert registry.tickers(WATCHLIST) == {"AAPL"}
+
+def test_follower_forwards_its_state_when_forwarding_starts():
+    registry = InterestRegistry()
+    registry.apply(WATCHLIST, {"AAPL": 1})
+    registry.apply(POSITION, {"MSFT": 1})
+    registry.start_forwarding()
+    registry.apply(WATCHLIST, {"NVDA": 2})
+    assert registry.take_outbox() == [
+        [WATCHLIST, {"AAPL": 1}, False], [POSITION, {"MSFT": 1}, False], [WATCHLIST, {"NVDA": 2}, False]
+    ]
+    registry.stop_forwarding()
+    registry.apply(WATCHLIST, {"TSLA": 1})
+    assert registry.take_outbox() == []
+
+def test_load_reads_every_source(fresh_db, monkeypatch):
+    registry = InterestRegistry()
+    monkeypatch.setattr(interest, "interest_registry", registry)
+    with get_db() as conn:
+        conn.execute("INSERT INTO portfolios (name) VALUES ('Tech')")
+        conn.execute("INSERT INTO portfolio_items (portfolio_id, ticker) VALUES (1, 'AAPL')")
+    with get_db() as conn:
+        interest.load(conn)
+    assert registry.tickers(WATCHLIST) == {"AAPL"}
@@ -0,0 +1,118 @@
+import pytest
+
+from app.database import get_db
+from app.services import portfolio_service
+from app.services.order_book import OrderBook
+
+def order(oid, action, order_type, limit=None, stop=None, quantity=1.0, ticker="AAPL", status="OPEN"):
+    return {
+        "id": oid, "ticker": ticker, "action": action, "order_type": order_type, "quantity": quantity,
+        "limit_price": limit, "stop_price": stop, "status": status
+    }
+
+def book(*orders):
+    b = OrderBook()
+    b.apply(list(orders))
+    return b
+
+def filled(fills):
+    return sorted((f["order"]["id"], f["price"]) for f in fills)
+
+def test_buy_limit_fills_at_or_below_limit():
+    b = book(order(1, "BUY", "LIMIT", limit=100.0))
+    assert b.match({"AAPL": 100.5}) == []
+    assert filled(b.match({"AAPL": 100.0})) == [(1, 100.0)]
+    assert b.match({"AAPL": 90.0}) == [] # Sorti du carnet
+
+def test_sell_limit_fills_at_or_above_limit():
+    b = book(order(1, "SELL", "LIMIT", limit=100.0))
+    assert b.match({"AAPL": 99.0}) == []
+    assert filled(b.match({"AAPL": 101.0})) == [(1, 101.0)]
+
+def test_only_marketable_limits_are_popped():
+    b = book(order(1, "BUY", "LIMIT", limit=100.0), order(2, "BUY", "LIMIT", limit=98.0), order(3, "BUY", "LIMIT", limit=95.0))
+    assert filled(b.match({"AAPL": 97.0})) == [(1, 97.0), (2, 97.0)]
+    assert set(b.orders) == {3}
+
+def test_stops_trigger_through_their_level():
+    b = book(order(1, "BUY", "STOP", stop=105.0), order(2, "SELL", "STOP", stop=90.0))
+    assert b.match({"AAPL": 100.0}) == []
+    assert filled(b.match({"AAPL": 105.0})) == [(1, 105.0)]
+    assert filled(b.match({"AAPL": 89.0})) == [(2, 89.0)]
+    assert "AAPL" not in b.books
+
+def test_stop_limit_becomes_a_limit_once_triggered():
+    b = book(order(1, "BUY", "STOP_LIMIT", stop=105.0, limit=106.0))
+    assert filled(b.match({"AAPL": 107.0})) == [(1, None)] # Déclenché, pas exécutable
+    assert b.orders[1]["status"] == "TRIGGERED"
+    assert filled(b.match({"AAPL": 105.5})) == [(1, 105.5)]
+
+def test_triggered_stop_limit_is_reloaded_as_a_limit():
+    b = book(order(1, "SELL", "STOP_LIMIT", stop=95.0, limit=94.0, status="TRIGGERED"))
+    assert filled(b.match({"AAPL": 94.5})) == [(1, 94.5)]
+
+def test_reload_drops_cancelled_and_executing_orders():
+    b = book(order(1, "BUY", "LIMIT", limit=100.0), order(2, "BUY", "LIMIT", limit=90.0))
+    fills = b.match({"AAPL": 99.0})
+    # Rechargement pendant l'exécution : l'ordre 1 est encore OPEN en base, l'ordre 2 a été annulé
+    b.apply([order(1, "BUY", "LIMIT", limit=100.0)])
+    assert b.match({"AAPL": 80.0}) == []
+    b.settle(fills)
+    b.apply([order(1, "BUY", "LIMIT", limit=100.0)])
+    assert filled(b.match({"AAPL": 99.0})) == [(1, 99.0)]
+
+def test_execute_fills_persists_fills_and_rejections(fresh_db):
+    with get_db() as conn:
+        conn.executemany("""
+            INSERT INTO orders (ticker, action, order_type, quantity, limit_price, stop_price) VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            ("AAPL", "BUY", "LIMIT", 10, 100.0, None),
+            ("MSFT", "SELL", "LIMIT", 5, 50.0, None),     # Aucune position : rejeté
+            ("AAPL", "BUY", "LIMIT", 1, 100.0, None),     # Annulé entre le matching et l'exécution
+            ("NVDA", "BUY", "STOP_LIMIT", 1, 110.0, 105.0), # Déclenché seulement
+        ])
+
+    b = OrderBook()
+    with get_db() as conn:
+        b.apply(b.fetch_if_changed(conn))
+    fills = b.match({"AAPL": 99.0, "MSFT": 51.0, "NVDA": 120.0})
+    assert filled(fills) == [(1, 99.0), (2, 51.0), (3, 99.0), (4, None)]
+
+    with get_db() as conn:
+        conn.execute("UPDATE orders SET status = 'CANCELLED' WHERE id = 3")
+    with get_db() as conn:
+        events = b.execute_fills(conn, fills)
+    b.settle(fills)
+
+    assert sorted((e["id"], e["status"]) for e in events) == [(1, "FILLED"), (2, "REJECTED")]
+    with get_db() as conn:
+        statuses = {r["id"]: (r["status"], r["fill_price"]) for r in conn.execute("SELECT * FROM orders")}
+        position = conn.execute("SELECT quantity, avg_price FROM positions WHERE ticker = 'AAPL'").fetchone()
+        balance = conn.execute("SELECT balance FROM accounts").fetchone()[0]
+    assert statuses == {1: ("FILLED", 99.0), 2: ("REJECTED", None), 3: ("CANCELLED", None), 4: ("TRIGGERED", None)}
+    assert tuple(position) == (10, 99.0)
+    assert balance == 100000.0 - 990.0
+    assert not b._executing
+
+def test_failed_batch_puts_taken_orders_back(fresh_db, monkeypatch):
+    with get_db() as conn:
+        conn.execute("INSERT INTO orders (ticker, action, order_type, quantity, limit_price) VALUES ('AAPL', 'BUY', 'LIMIT', 1, 100.0)")
+
+    b = OrderBook()
+    with get_db() as conn:
+        b.apply(b.fetch_if_changed(conn))
+    fills = b.match({"AAPL": 99.0})
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk I/O error")
+    monkeypatch.setattr(portfolio_service, "execute_order", fail)
+    with pytest.raises(RuntimeError):
+        with get_db() as conn:
+            b.execute_fills(conn, fills)
+    b.settle(fills, committed=False)
+
+    with get_db() as conn:
+        rows = b.fetch_if_changed(conn) # Table inchangée : seul le flag force le rechargement
+    assert rows is not None
+    b.apply(rows)
+    assert filled(b.match({"AAPL": 99.0})) == [(1, 99.0)]
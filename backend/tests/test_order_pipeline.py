@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import db, get_db
+from app.models import OrderRequest
+from app.services.order_pipeline import OrderPipeline
+
+def hold_writer():
+    """Bloque le thread écrivain jusqu'au set() : les soumissions suivantes restent en vol et partagent un lot."""
+    gate = threading.Event()
+    db.write(lambda conn: gate.wait(5))
+    return gate
+
+def buy(quantity=1):
+    return OrderRequest(ticker="AAPL", action="BUY", quantity=quantity)
+
+def transactions(kind):
+    with get_db() as conn:
+        return conn.execute("SELECT COUNT(*) FROM transactions WHERE type = ?", (kind,)).fetchone()[0]
+
+def test_orders_of_a_batch_are_executed_together(fresh_db):
+    pipeline, gate = OrderPipeline(), hold_writer()
+    futures = [pipeline.submit(buy(), 100.0) for _ in range(5)]
+    gate.set()
+    assert all(f.result(5)["status"] == "executed" for f in futures)
+    assert transactions("BUY") == 5
+
+def test_inflight_key_is_shared_by_duplicates(fresh_db):
+    pipeline, gate = OrderPipeline(), hold_writer()
+    first, second = pipeline.submit(buy(), 100.0, "k"), pipeline.submit(buy(), 100.0, "k")
+    gate.set()
+    assert first is second
+    first.result(5)
+    assert pipeline.execute(buy(), 100.0, "k") == first.result()
+    assert transactions("BUY") == 1
+
+def test_inflight_key_reused_for_another_order_is_rejected(fresh_db):
+    pipeline, gate = OrderPipeline(), hold_writer()
+    future = pipeline.submit(buy(), 100.0, "k")
+    with pytest.raises(HTTPException) as e:
+        pipeline.submit(buy(quantity=2), 100.0, "k")
+    gate.set()
+    assert e.value.status_code == 409
+    future.result(5)
+    assert transactions("BUY") == 1
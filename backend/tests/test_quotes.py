@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from app.services import market_data, quotes
+from app.websockets import ConnectionManager, quote_topic
+
+class BulkProvider:
+    def __init__(self):
+        self.requested = []
+
+    def fetch_bulk_1m_status(self, tickers):
+        self.requested.append(list(tickers))
+        return {t: {"price": 42.0, "change_pct": 0.0, "is_open": True} for t in tickers}
+
+@pytest.fixture
+def cache(monkeypatch):
+    manager, provider = ConnectionManager(), BulkProvider()
+    monkeypatch.setattr(quotes, "manager", manager)
+    monkeypatch.setattr(market_data, "provider", provider)
+    return manager, provider
+
+def publish(manager, ticker, is_open=True, age=0):
+    asyncio.run(manager.publish(quote_topic(ticker), {"type": "PRICE_UPDATE", "price": 10.0, "is_open": is_open}))
+    manager.last_updated[quote_topic(ticker)] -= age
+
+def test_fresh_quote_is_served_from_cache(cache):
+    manager, provider = cache
+    publish(manager, "AAPL")
+    assert quotes.cached_quotes(["AAPL"])["AAPL"]["price"] == 10.0
+    assert provider.requested == []
+
+def test_stale_quote_is_refetched(cache):
+    manager, provider = cache
+    publish(manager, "AAPL", age=quotes.MAX_QUOTE_AGE_OPEN + 1)
+    publish(manager, "MSFT")
+    result = quotes.cached_quotes(["AAPL", "MSFT"])
+    assert provider.requested == [["AAPL"]]
+    assert result["AAPL"]["price"] == 42.0 and result["MSFT"]["price"] == 10.0
+
+def test_closed_session_tolerates_the_slow_cadence(cache):
+    manager, provider = cache
+    publish(manager, "AAPL", is_open=False, age=quotes.MAX_QUOTE_AGE_OPEN + 1)
+    quotes.cached_quotes(["AAPL"])
+    assert provider.requested == []
@@ -0,0 +1,20 @@
+import numpy as np
+
+from app.services.ticks import TickStore
+
+def test_high_prices_keep_their_cents():
+    store = TickStore(capacity=8)
+    store.seed("BTC-USD", np.array([1_700_000_000.0, 1_700_000_060.0]), np.array([98765.43, 123456.78]))
+    store.append("BTC-USD", 1_700_000_065.0, 123456.79)
+    times, prices = store._rings["BTC-USD"].series()
+    assert prices.tolist() == [98765.43, 123456.78, 123456.79]
+    assert times[-1] == 1_700_000_065.0
+    assert store.sparklines(["BTC-USD"], 2, 10.0)["BTC-USD"]["v"] == [123456.78, 123456.79]
+
+def test_ring_keeps_the_most_recent_points():
+    store = TickStore(capacity=3)
+    for i in range(5):
+        store.append("AAPL", 1_700_000_000.0 + i, 100.0 + i)
+    times, prices = store._rings["AAPL"].series()
+    assert prices.tolist() == [102.0, 103.0, 104.0]
+    assert np.all(np.diff(times) > 0)
@@ -0,0 +1,58 @@
+import asyncio
+
+from app import websockets
+from app.websockets import ClientSession, encode
+
+class SlowSocket:
+    """Socket bloquée jusqu'au release() : la file sortante de la session se remplit."""
+
+    def __init__(self):
+        self.sent, self.closed_with = [], None
+        self._open = asyncio.Event()
+
+    def release(self):
+        self._open.set()
+
+    async def send_text(self, text):
+        await self._open.wait()
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+def price(ticker, value=1.0):
+    return {"type": "PRICE_UPDATE", "ticker": ticker, "price": value}
+
+def test_backpressure_drops_quotes_not_events():
+    async def scenario():
+        socket = SlowSocket()
+        session = ClientSession(socket)
+        session.send({"type": "ALERT", "id": 1})
+        for i in range(websockets.SEND_QUEUE_SIZE * 2):
+            session.send(price(f"T{i}"))
+        session.send({"type": "ORDER_UPDATE", "id": 2})
+        socket.release()
+        await asyncio.sleep(0.05)
+        session.close()
+        return socket, session
+
+    socket, session = asyncio.run(scenario())
+    assert encode({"type": "ALERT", "id": 1}) in socket.sent
+    assert encode({"type": "ORDER_UPDATE", "id": 2}) in socket.sent
+    assert session.dropped > 0
+    assert len(socket.sent) <= websockets.SEND_QUEUE_SIZE + 1 # + la frame déjà en cours d'envoi
+
+def test_event_overflow_disconnects_the_client(monkeypatch):
+    monkeypatch.setattr(websockets, "EVENT_QUEUE_SIZE", 8)
+
+    async def scenario():
+        socket = SlowSocket()
+        session = ClientSession(socket)
+        for i in range(websockets.SEND_QUEUE_SIZE + 8):
+            session.send({"type": "ALERT", "id": i})
+        await asyncio.sleep(0.01)
+        return socket, session
+
+    socket, session = asyncio.run(scenario())
+    assert session.closed
+    assert socket.closed_with == websockets.SLOW_CLIENT_CLOSE_CODE
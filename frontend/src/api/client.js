@@ -8,14 +8,21 @@ export const marketApi = {
   getSnapshot: (ticker, period) => apiClient.get(`/api/snapshot/${ticker}?period=${period}`),
   getCompanyInfo: (ticker) => apiClient.get(`/api/company/${ticker}`),
   getSidebarData: () => apiClient.get('/api/watchlists/sidebar'),
+  getSparklines: (tickers, points = 60) => apiClient.get('/api/sparklines', { params: { tickers: tickers.join(','), points } }),
   createWatchlist: (name) => apiClient.post('/api/watchlists', { name }),
   deleteWatchlist: (id) => apiClient.delete(`/api/watchlists/${id}`),
   addTickerToWatchlist: (pid, ticker) => apiClient.post(`/api/watchlists/${pid}/items`, { ticker }),
   removeTickerFromWatchlist: (pid, ticker) => apiClient.delete(`/api/watchlists/${pid}/items/${ticker}`),
   getPortfolioSummary: () => apiClient.get('/api/portfolio/summary'),
   getOpenPositions: () => apiClient.get('/api/portfolio/positions'),
-  getHistory: () => apiClient.get('/api/portfolio/history'),
+  // Pagination par curseur : { limit, before_ts, before_id } (timestamp / id de la dernière ligne reçue)
+  getHistory: (params = {}) => apiClient.get('/api/portfolio/history', { params }),
+  getEquityCurve: (resolution = '1d', start) => apiClient.get('/api/portfolio/equity', { params: { resolution, start } }),
+  historyExportUrl: (format = 'csv') => `${API_BASE_URL}/api/portfolio/history/export?format=${format}`,
   placeOrder: (order) => apiClient.post('/api/portfolio/order', order),
+  getPendingOrders: (status) => apiClient.get('/api/portfolio/orders', { params: status ? { status } : {} }),
+  placePendingOrder: (order) => apiClient.post('/api/portfolio/orders', order),
+  cancelPendingOrder: (id) => apiClient.delete(`/api/portfolio/orders/${id}`),
   manageCash: (req) => apiClient.post('/api/portfolio/cash', req),
   nukePortfolio: () => apiClient.post('/api/portfolio/nuke'),
   getSavedIndicators: (ticker) => apiClient.get(`/api/indicators/${ticker}`),
@@ -30,5 +37,10 @@ export const marketApi = {
   calculateSmartEMA: (t, ta, l) => apiClient.post('/api/indicators/smart/ema', { ticker: t, target_up_percent: ta, lookback_days: l }),
   calculateSmartEnvelope: (t, ta, l) => apiClient.post('/api/indicators/smart/envelope', { ticker: t, target_inside_percent: ta, lookback_days: l }),
   calculateSmartBollinger: (t, ta, l) => apiClient.post('/api/indicators/smart/bollinger', { ticker: t, target_inside_percent: ta, lookback_days: l }),
+  getSensitivityMap: (req) => apiClient.post('/api/indicators/sensitivity', req),
+  getAlerts: (ticker) => apiClient.get('/api/alerts/', { params: ticker ? { ticker } : {} }),
+  createAlert: (alert) => apiClient.post('/api/alerts/', alert),
+  rearmAlert: (id) => apiClient.post(`/api/alerts/${id}/rearm`),
+  deleteAlert: (id) => apiClient.delete(`/api/alerts/${id}`),
   nukeDatabase: () => apiClient.delete('/api/database'),
 };
\ No newline at end of file
@@ -0,0 +1,92 @@
+// Connexion WebSocket unique multiplexée (/ws), partagée par tous les hooks temps réel.
+// Chaque hook s'abonne à des topics ; la connexion est ouverte au premier abonnement
+// et les topics actifs sont ré-abonnés automatiquement après une reconnexion.
+// Le serveur ne rejoue la dernière valeur qu'au premier abonnement d'un topic : les abonnés
+// suivants la reçoivent du cache local, sans attendre le prochain tick.
+
+const WS_URL = 'ws://localhost:8000/ws';
+const RECONNECT_DELAY_MS = 3000;
+// Messages dont la dernière valeur est rejouée à l'abonnement (comme SNAPSHOT_TYPES côté serveur)
+const SNAPSHOT_TYPES = new Set(['PRICE_UPDATE', 'CANDLE_UPDATE']);
+
+const handlers = new Map(); // topic -> Set(handler)
+const lastValues = new Map(); // topic -> dernier message rejouable
+let ws = null;
+let retryTimeout = null;
+
+const send = (action, topics) => {
+  if (topics.length && ws && ws.readyState === WebSocket.OPEN) {
+    ws.send(JSON.stringify({ action, topics }));
+  }
+};
+
+const connect = () => {
+  if (ws || !handlers.size) return;
+
+  ws = new WebSocket(WS_URL);
+
+  ws.onopen = () => send('subscribe', [...handlers.keys()]);
+
+  ws.onmessage = (event) => {
+    try {
+      const msg = JSON.parse(event.data);
+      if (msg.type === 'ERROR') {
+        console.warn('Stream Error', msg.errors || msg.message);
+        return;
+      }
+      if (SNAPSHOT_TYPES.has(msg.type) && handlers.has(msg.topic)) lastValues.set(msg.topic, msg);
+      handlers.get(msg.topic)?.forEach(handler => handler(msg));
+    } catch (e) { console.error('Stream Parse Error', e); }
+  };
+
+  ws.onclose = () => {
+    ws = null;
+    if (handlers.size) retryTimeout = setTimeout(connect, RECONNECT_DELAY_MS); // Reconnexion auto
+  };
+
+  ws.onerror = () => ws?.close();
+};
+
+// Abonne handler aux topics ('global', 'quote:AAPL', 'candle:AAPL:5m', 'indicator:12').
+// Retourne la fonction de désabonnement.
+export function subscribe(topics, handler) {
+  const added = [];
+  const replay = [];
+  topics.forEach(topic => {
+    if (!handlers.has(topic)) {
+      handlers.set(topic, new Set());
+      added.push(topic);
+    } else if (lastValues.has(topic)) {
+      replay.push(topic); // Topic déjà ouvert : le serveur ne renverra rien avant le prochain tick
+    }
+    handlers.get(topic).add(handler);
+  });
+
+  // Livraison différée : le handler est appelé après le retour de subscribe(), comme un message réseau
+  if (replay.length) queueMicrotask(() => replay.forEach(topic => {
+    const msg = lastValues.get(topic);
+    if (msg && handlers.get(topic)?.has(handler)) handler(msg);
+  }));
+
+  if (ws) send('subscribe', added);
+  else {
+    clearTimeout(retryTimeout);
+    connect();
+  }
+
+  return () => {
+    const removed = [];
+    topics.forEach(topic => {
+      const set = handlers.get(topic);
+      if (!set) return;
+      set.delete(handler);
+      if (!set.size) {
+        handlers.delete(topic);
+        lastValues.delete(topic); // Rejouée par le serveur au prochain abonnement
+        removed.push(topic);
+      }
+    });
+    send('unsubscribe', removed);
+    if (!handlers.size && ws) ws.close();
+  };
+}
@@ -4,7 +4,7 @@ import {
   Wallet, History, LayoutGrid, List, Settings, PlusCircle, AlertTriangle, ArrowUpRight
 } from 'lucide-react';
 import { usePortfolioStore } from '../hooks/usePortfolioStore';
-import { usePriceStore } from '../hooks/usePriceStore';
+import { subscribe } from '../api/stream';
 // Ensure OrderModal is imported correctly from its own file
 import OrderModal from './OrderModal';
 
@@ -15,11 +15,9 @@ const fmtPct = (val) => `${(val * 100).toFixed(2)}%`;
 export default function PortfolioView() {
   const { 
     cash, equity, positions, history, pnl_total, pnl_pct, 
-    fetchPortfolio, syncLivePrices, manageCash, nuke 
+    fetchPortfolio, applyPortfolioUpdate, manageCash, nuke 
   } = usePortfolioStore();
 
-  const { prices } = usePriceStore();
-
   // Navigation Tabs State
   const [activeTab, setActiveTab] = useState('DASHBOARD'); // DASHBOARD | POSITIONS | HISTORY | ADMIN
   
@@ -32,10 +30,12 @@ export default function PortfolioView() {
     fetchPortfolio();
   }, []);
 
-  // 2. Real-Time Sync
+  // 2. Real-Time Sync (valorisation poussée par le backend)
   useEffect(() => {
-    syncLivePrices(prices);
-  }, [prices, syncLivePrices]);
+    return subscribe(['global'], (update) => {
+      if (update.type === 'PORTFOLIO_UPDATE') applyPortfolioUpdate(update);
+    });
+  }, [applyPortfolioUpdate]);
 
   const openOrderModal = (ticker = '', side = 'BUY') => {
     setModalConfig({ ticker, side });
@@ -1,11 +1,35 @@
-import { useState } from 'react';
+import { useState, useEffect } from 'react';
 import { Folder, Plus, Trash2, ChevronRight, ChevronDown, TrendingUp, TrendingDown, Hash, Server, Shield } from 'lucide-react';
 import { marketApi } from '../api/client';
 import { usePriceStore } from '../hooks/usePriceStore';
 
+// Rafraîchissement des mini-graphiques (un seul appel pour toute la Sidebar)
+const SPARKLINE_REFRESH_MS = 60 * 1000;
+
+// --- SUB-COMPONENT: SPARKLINE ---
+// Série échantillonnée par le backend ({ t0, step, v }), tracée en SVG brut
+const Sparkline = ({ values, positive, width = 48, height = 14 }) => {
+  const points = values.filter(v => v !== null);
+  if (points.length < 2) return null;
+
+  const min = Math.min(...points);
+  const range = Math.max(...points) - min || 1;
+  const stepX = width / (values.length - 1);
+  const path = values
+    .map((v, i) => v === null ? null : `${(i * stepX).toFixed(1)},${(height - ((v - min) / range) * height).toFixed(1)}`)
+    .filter(Boolean)
+    .join(' ');
+
+  return (
+    <svg width={width} height={height} className="opacity-70">
+      <polyline points={path} fill="none" strokeWidth="1" className={positive ? 'stroke-neon-green' : 'stroke-neon-red'} />
+    </svg>
+  );
+};
+
 // --- SUB-COMPONENT: PORTFOLIO ITEM ---
 // Extrait pour éviter de re-render toute la sidebar quand un seul prix change
-const PortfolioItem = ({ item, isActive, onSelect, onDelete }) => {
+const PortfolioItem = ({ item, spark, isActive, onSelect, onDelete }) => {
   const { prices } = usePriceStore();
   
   // Récupération du prix live depuis le store global
@@ -35,6 +59,7 @@ const PortfolioItem = ({ item, isActive, onSelect, onDelete }) => {
       </div>
       
       <div className="flex items-center gap-3">
+        {spark && <Sparkline values={spark.v} positive={isPositive} />}
         <span className={`flex items-center gap-1 text-[10px] font-bold ${isPositive ? 'text-neon-green' : 'text-neon-red'}`}>
           {isPositive ? '+' : ''}{displayPct}%
           {isPositive ? <TrendingUp size={10} /> : <TrendingDown size={10} />}
@@ -61,6 +86,21 @@ export default function Sidebar({ data, onSelectTicker, onReload, currentTicker
   const [newWatchlistName, setNewWatchlistName] = useState('');
   const [isCreating, setIsCreating] = useState(false);
   const [expandedIds, setExpandedIds] = useState([]);
+  const [sparklines, setSparklines] = useState({});
+
+  // Mini-graphiques : un appel batch pour tous les tickers de la Sidebar
+  useEffect(() => {
+    const tickers = [...new Set(data.flatMap(w => w.items.map(i => i.ticker)))];
+    if (!tickers.length) return;
+
+    const load = () => marketApi.getSparklines(tickers)
+      .then(res => setSparklines(res.data))
+      .catch(err => console.error("Sparklines error", err));
+
+    load();
+    const interval = setInterval(load, SPARKLINE_REFRESH_MS);
+    return () => clearInterval(interval);
+  }, [data]);
 
   const toggleFolder = (id) => {
     setExpandedIds(prev => 
@@ -197,6 +237,7 @@ export default function Sidebar({ data, onSelectTicker, onReload, currentTicker
                       <PortfolioItem 
                         key={item.ticker}
                         item={item}
+                        spark={sparklines[item.ticker]}
                         isActive={currentTicker === item.ticker}
                         onSelect={onSelectTicker}
                         onDelete={(ticker) => handleDeleteItem(watchlist.id, ticker)}
@@ -1,26 +1,20 @@
-import { useEffect, useRef } from 'react';
-
-export function useGlobalStream(onUpdate) {
-  const wsRef = useRef(null);
+import { useEffect } from 'react';
+import { subscribe } from '../api/stream';
 
+export function useGlobalStream(onUpdate, onAlert, onOrder) {
   useEffect(() => {
-    const connect = () => {
-      const ws = new WebSocket('ws://localhost:8000/ws/global');
-      wsRef.current = ws;
-
-      ws.onmessage = (event) => {
-        try {
-          const update = JSON.parse(event.data);
-          if (update.type === 'PRICE_UPDATE') {
-            onUpdate(update.ticker, update);
-          }
-        } catch (e) { console.error("Global WS Error", e); }
-      };
-
-      ws.onclose = () => setTimeout(connect, 3000); // Reconnexion auto
-    };
-
-    connect();
-    return () => wsRef.current?.close();
-  }, [onUpdate]);
-}
\ No newline at end of file
+    // Topic 'global' sur la connexion partagée (reconnexion gérée par api/stream)
+    return subscribe(['global'], (update) => {
+      if (update.type === 'PRICE_BATCH') {
+        // Un seul message par cycle worker avec toutes les cotations
+        update.quotes.forEach(quote => onUpdate(quote.ticker, quote));
+      } else if (update.type === 'PRICE_UPDATE') {
+        onUpdate(update.ticker, update);
+      } else if (update.type === 'ALERT') {
+        onAlert?.(update); // Alerte serveur déclenchée
+      } else if (update.type === 'ORDER_UPDATE') {
+        onOrder?.(update); // Ordre en attente exécuté ou rejeté
+      }
+    });
+  }, [onUpdate, onAlert, onOrder]);
+}
@@ -1,8 +1,8 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
 import { marketApi } from '../api/client';
+import { subscribe } from '../api/stream';
 
 const VIEW_KEY = 'trading_view_pref';
-const WS_BASE_URL = 'ws://localhost:8000/ws';
 
 // Intervalle de synchronisation HTTP de secours (Background Sync)
 // Sert à corriger les éventuelles dérives du WebSocket sur le long terme (ex: volumes)
@@ -18,6 +18,32 @@ const getIntervalSeconds = (intervalStr) => {
   return map[intervalStr] || 86400; // Par défaut 1 jour si inconnu
 };
 
+// Résolutions dont le backend pousse les bougies (CANDLE_UPDATE / CANDLE_CLOSE)
+// Pour celles-ci, plus besoin de synthétiser les bougies côté client ni de recharger le snapshot
+const STREAMED_INTERVALS = ['1m', '5m', '1h'];
+
+// Fusionne une bougie poussée par le backend dans le tableau du graphique
+const mergeCandle = (chartData, candle) => {
+  const lastIndex = chartData.length - 1;
+  const lastTime = new Date(chartData[lastIndex].date).getTime() / 1000;
+  const bar = {
+    date: new Date(candle.time * 1000).toISOString(),
+    open: candle.open,
+    high: candle.high,
+    low: candle.low,
+    close: candle.close,
+    volume: candle.volume
+  };
+
+  if (candle.time > lastTime) return [...chartData, bar];
+  if (candle.time === lastTime) {
+    const next = [...chartData];
+    next[lastIndex] = bar;
+    return next;
+  }
+  return chartData; // Bougie plus ancienne que le snapshot : ignorée
+};
+
 export function useMarketStream(ticker, defaultPeriod = '1mo') {
   // Initialisation state
   const [data, setData] = useState(null);
@@ -27,10 +53,12 @@ export function useMarketStream(ticker, defaultPeriod = '1mo') {
   const [period, setPeriodState] = useState(() => localStorage.getItem(VIEW_KEY) || defaultPeriod);
 
   // Refs de sécurité
-  const wsRef = useRef(null);
-  const retryTimeoutRef = useRef(null);
   const isMountedRef = useRef(true); 
   const currentTickerRef = useRef(ticker); 
+  const chartIntervalRef = useRef(null); // Résolution du graphique affiché (ex: '1m', '1d')
+  const hasChartRef = useRef(false);
+  // Dernières valeurs reçues avant le snapshot HTTP (rejouées dès qu'il arrive)
+  const pendingUpdatesRef = useRef(new Map());
 
   const setPeriod = (p) => {
     setPeriodState(p);
@@ -68,8 +96,6 @@ export function useMarketStream(ticker, defaultPeriod = '1mo') {
       isMountedRef.current = true;
       return () => { 
           isMountedRef.current = false;
-          if (wsRef.current) wsRef.current.close();
-          if (retryTimeoutRef.current) clearTimeout(retryTimeoutRef.current);
       };
   }, []);
 
@@ -82,137 +108,155 @@ export function useMarketStream(ticker, defaultPeriod = '1mo') {
       fetchInitialSnapshot(ticker, period, false);
 
       // B. Background Re-validation (Toutes les 5 minutes)
+      // Inutile quand le backend streame les bougies de la résolution affichée
       const syncInterval = setInterval(() => {
-          fetchInitialSnapshot(ticker, period, true); // true = mode silencieux
+          if (!STREAMED_INTERVALS.includes(chartIntervalRef.current)) {
+              fetchInitialSnapshot(ticker, period, true); // true = mode silencieux
+          }
       }, SYNC_INTERVAL_MS);
 
       return () => clearInterval(syncInterval);
   }, [ticker, period, fetchInitialSnapshot]);
 
-  // 3. WEBSOCKET INTELLIGENT (Gestion temps réel des bougies)
-  useEffect(() => {
-    if (!ticker) return;
-
-    let isExpectedClose = false;
+  // Application d'un message temps réel sur l'état du graphique
+  const applyUpdate = useCallback((update) => {
+    if (update.type === 'CANDLE_UPDATE' || update.type === 'CANDLE_CLOSE') {
+      setData(prevData => {
+        if (!prevData || !prevData.chart || !prevData.chart.data.length) return prevData;
+        if (prevData.chart.meta.interval !== update.resolution) return prevData;
+        return {
+          ...prevData,
+          chart: {
+            ...prevData.chart,
+            data: mergeCandle(prevData.chart.data, update.candle)
+          }
+        };
+      });
+      return;
+    }
     
-    const connectWs = () => {
-      if (wsRef.current && wsRef.current.readyState !== WebSocket.CLOSED) return; 
+    if (update.type === 'PRICE_UPDATE') {
+      setData(prevData => {
+        // SÉCURITÉ : Si pas de données de base, on ne fait rien (on attend le snapshot)
+        if (!prevData || !prevData.chart || !prevData.chart.data.length) return prevData;
 
-      const ws = new WebSocket(`${WS_BASE_URL}/${ticker}`);
-      wsRef.current = ws;
+        // --- FIX LOGIQUE : SÉPARATION UI / CHART ---
+        const newLiveState = {
+            price: update.price,
+            change_pct: update.change_pct,
+            is_open: update.is_open
+        };
 
-      ws.onmessage = (event) => {
-        if (!isMountedRef.current) return;
-        
-        try {
-          const update = JSON.parse(event.data);
-          
-          if (update.type === 'PRICE_UPDATE') {
-            setData(prevData => {
-              // SÉCURITÉ : Si pas de données de base, on ne fait rien (on attend le snapshot)
-              if (!prevData || !prevData.chart || !prevData.chart.data.length) return prevData;
-
-              // --- FIX LOGIQUE : SÉPARATION UI / CHART ---
-              const newLiveState = {
-                  price: update.price,
-                  change_pct: update.change_pct,
-                  is_open: update.is_open
-              };
-
-              // 1. Si le marché est FERMÉ, on met à jour uniquement l'info header (prix/status)
-              // On ne touche PAS au tableau chart.data pour éviter de créer des "Zombie Candles"
-              // C'est ici que le flickering est stoppé net.
-              if (!update.is_open) {
-                  return {
-                      ...prevData,
-                      live: newLiveState
-                  };
-              }
-
-              // 2. Si le marché est OUVERT, on continue la logique standard de bougie
-              const currentPrice = update.price;
-              const updateTime = update.timestamp; // Timestamp Unix (secondes) venant du backend
-              
-              // A. Déterminer l'intervalle actuel (ex: 60s pour '1m')
-              const intervalStr = prevData.chart.meta.interval || "1d";
-              const intervalSec = getIntervalSeconds(intervalStr);
-
-              // B. Calculer le "Time Bucket" de la nouvelle donnée
-              // On aligne le temps sur la grille (ex: 10:01:45 -> 10:01:00 pour du 1m)
-              const bucketTime = Math.floor(updateTime / intervalSec) * intervalSec;
-              
-              // C. Récupérer la dernière bougie connue dans l'état local
-              const lastCandleIndex = prevData.chart.data.length - 1;
-              const lastCandle = prevData.chart.data[lastCandleIndex];
-              
-              // Conversion date ISO -> Unix timestamp pour comparaison
-              const lastCandleTime = new Date(lastCandle.date).getTime() / 1000;
-
-              // --- LOGIQUE DE BOUGIE ---
-              let newChartData = [...prevData.chart.data];
-
-              if (bucketTime > lastCandleTime) {
-                // CAS 1 : LE TEMPS A PASSÉ -> CRÉATION
-                // On fige la précédente et on push une nouvelle
-                const newCandle = {
-                    date: new Date(bucketTime * 1000).toISOString(),
-                    open: currentPrice,
-                    high: currentPrice,
-                    low: currentPrice,
-                    close: currentPrice,
-                    volume: 0 // Reset volume pour la nouvelle bougie
-                };
-                newChartData.push(newCandle);
-              } else {
-                // CAS 2 : MÊME INTERVALLE -> MISE À JOUR
-                // On met à jour les mèches (High/Low) et le corps (Close)
-                newChartData[lastCandleIndex] = {
-                    ...lastCandle,
-                    close: currentPrice,
-                    high: Math.max(lastCandle.high, currentPrice),
-                    low: Math.min(lastCandle.low, currentPrice),
-                    // Note: Sans flux volume tick-by-tick, on garde le volume existant
-                };
-              }
-
-              // On retourne le nouvel état complet (Live + Chart)
-              return {
+        // 1. Si le marché est FERMÉ, on met à jour uniquement l'info header (prix/status)
+        // On ne touche PAS au tableau chart.data pour éviter de créer des "Zombie Candles"
+        // C'est ici que le flickering est stoppé net.
+        if (!update.is_open) {
+            return {
                 ...prevData,
-                live: newLiveState,
-                chart: {
-                    ...prevData.chart,
-                    data: newChartData
-                }
-              };
-            });
-          }
-        } catch (e) {
-          console.error("WS Parse Error", e);
+                live: newLiveState
+            };
         }
-      };
 
-      ws.onclose = () => {
-        if (isExpectedClose) return;
-        // Reconnexion automatique intelligente si le composant est toujours monté
-        if (isMountedRef.current && currentTickerRef.current === ticker) {
-            retryTimeoutRef.current = setTimeout(connectWs, 3000);
+        // 2. Si le backend streame les bougies de cette résolution, on ne touche que le header
+        const intervalStr = prevData.chart.meta.interval || "1d";
+        if (STREAMED_INTERVALS.includes(intervalStr)) {
+            return {
+                ...prevData,
+                live: newLiveState
+            };
         }
-      };
-      
-      ws.onerror = () => ws.close();
-    };
 
-    connectWs();
+        // 3. Sinon, on continue la logique standard de bougie
+        const currentPrice = update.price;
+        const updateTime = update.timestamp; // Timestamp Unix (secondes) venant du backend
+        
+        // A. Déterminer l'intervalle actuel (ex: 86400s pour '1d')
+        const intervalSec = getIntervalSeconds(intervalStr);
+
+        // B. Calculer le "Time Bucket" de la nouvelle donnée
+        // On aligne le temps sur la grille (ex: 10:01:45 -> 10:01:00 pour du 1m)
+        const bucketTime = Math.floor(updateTime / intervalSec) * intervalSec;
+        
+        // C. Récupérer la dernière bougie connue dans l'état local
+        const lastCandleIndex = prevData.chart.data.length - 1;
+        const lastCandle = prevData.chart.data[lastCandleIndex];
+        
+        // Conversion date ISO -> Unix timestamp pour comparaison
+        const lastCandleTime = new Date(lastCandle.date).getTime() / 1000;
+
+        // --- LOGIQUE DE BOUGIE ---
+        let newChartData = [...prevData.chart.data];
+
+        if (bucketTime > lastCandleTime) {
+          // CAS 1 : LE TEMPS A PASSÉ -> CRÉATION
+          // On fige la précédente et on push une nouvelle
+          const newCandle = {
+              date: new Date(bucketTime * 1000).toISOString(),
+              open: currentPrice,
+              high: currentPrice,
+              low: currentPrice,
+              close: currentPrice,
+              volume: 0 // Reset volume pour la nouvelle bougie
+          };
+          newChartData.push(newCandle);
+        } else {
+          // CAS 2 : MÊME INTERVALLE -> MISE À JOUR
+          // On met à jour les mèches (High/Low) et le corps (Close)
+          newChartData[lastCandleIndex] = {
+              ...lastCandle,
+              close: currentPrice,
+              high: Math.max(lastCandle.high, currentPrice),
+              low: Math.min(lastCandle.low, currentPrice),
+              // Note: Sans flux volume tick-by-tick, on garde le volume existant
+          };
+        }
+
+        // On retourne le nouvel état complet (Live + Chart)
+        return {
+          ...prevData,
+          live: newLiveState,
+          chart: {
+              ...prevData.chart,
+              data: newChartData
+          }
+        };
+      });
+    }
+  }, []);
+
+  useEffect(() => {
+      chartIntervalRef.current = data?.chart?.meta?.interval || null;
+      hasChartRef.current = !!data?.chart?.data?.length;
+      if (hasChartRef.current && pendingUpdatesRef.current.size) {
+          const pending = [...pendingUpdatesRef.current.values()];
+          pendingUpdatesRef.current = new Map();
+          pending.forEach(applyUpdate);
+      }
+  }, [data, applyUpdate]);
+
+  // 3. FLUX TEMPS RÉEL (topics quote + bougies du ticker sur la connexion partagée)
+  useEffect(() => {
+    if (!ticker) return;
+
+    const topics = [
+      `quote:${ticker}`,
+      ...STREAMED_INTERVALS.map(interval => `candle:${ticker}:${interval}`)
+    ];
+
+    // Nouveau ticker : tout est mis en attente jusqu'à son snapshot
+    hasChartRef.current = false;
+    pendingUpdatesRef.current = new Map();
 
-    return () => {
-      isExpectedClose = true;
-      if (wsRef.current) {
-        wsRef.current.close();
-        wsRef.current = null;
+    return subscribe(topics, (update) => {
+      if (!isMountedRef.current) return;
+      if (!hasChartRef.current) {
+        // Valeur rejouée à l'abonnement, arrivée avant le snapshot : on la garde pour plus tard
+        pendingUpdatesRef.current.set(`${update.topic}:${update.type}`, update);
+        return;
       }
-      if (retryTimeoutRef.current) clearTimeout(retryTimeoutRef.current);
-    };
-  }, [ticker]); 
+      applyUpdate(update);
+    });
+  }, [ticker, applyUpdate]); 
 
   return {
     data,